@@ -0,0 +1,111 @@
+"""This file builds the inputs benchmarks run against"""
+
+from os import devnull, makedirs
+from os.path import abspath, dirname, join
+from subprocess import check_call
+
+ROOT = dirname(dirname(abspath(__file__)))
+
+SIZES = [
+    ('tiny', 1024),
+    ('medium', 64 * 1024),
+    ('large', 5 * 1024 * 1024),
+]
+
+JAVASCRIPT_SEED = '''\
+'use strict';
+
+const path = require('path');
+
+/**
+ * Collects every file under a directory that matches the filter
+ */
+function collect(directory, filter = () => true) {
+    return fs.readdirSync(directory)
+        .map((name) => path.join(directory, name))
+        .filter((file) => filter(file) && !file.startsWith('.'))
+        .reduce((found, file) => found.concat([file]), []);
+}
+
+module.exports = { collect, version: "1.0.0", retries: 3 };
+'''
+
+SQL_SEED = '''\
+-- Orders placed in the last week with their customers
+CREATE TABLE IF NOT EXISTS orders (
+    id SERIAL PRIMARY KEY,
+    customer_id INTEGER NOT NULL REFERENCES customers (id),
+    placed_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    total NUMERIC(10, 2) NOT NULL
+);
+
+INSERT INTO orders (customer_id, total) VALUES (1, 19.99), (2, 5.00);
+
+SELECT c.name, count(o.id) AS placed, sum(o.total) AS spent
+FROM customers c
+JOIN orders o ON o.customer_id = c.id
+WHERE o.placed_at > now() - INTERVAL '7 days'
+GROUP BY c.name
+ORDER BY spent DESC;
+'''
+
+
+def read(*parts):
+    """Reads a file from the repo"""
+    with open(join(ROOT, *parts), 'r') as source_file:
+        return source_file.read()
+
+
+def seeds():
+    """Returns (language, extension, seed text) for every corpus language"""
+    return [
+        ('python', 'py', read('wotw_highlighter', 'block.py')),
+        ('css', 'css', read('wotw_highlighter', 'data', 'pygments-monokai.css')),
+        ('rst', 'rst', read('README.rst')),
+        ('javascript', 'js', JAVASCRIPT_SEED),
+        ('sql', 'sql', SQL_SEED),
+    ]
+
+
+def grow(seed, size):
+    """Repeats seed up to size, ending on a line boundary"""
+    text = seed * (size // len(seed) + 1)
+    cut = text.rfind('\n', 0, size)
+    return text[:cut + 1 if cut > 0 else size]
+
+
+def build_corpus(directory, sizes=None):
+    """
+    Writes every language at every size under directory and commits them to
+    a fresh git repo there
+
+    Returns a list of dicts with language, size, path, and blob
+    """
+    sizes = sizes or SIZES
+    makedirs(directory)
+    corpus = []
+    for language, extension, seed in seeds():
+        for size_name, size in sizes:
+            blob = grow(seed, size)
+            name = '%s-%s.%s' % (language, size_name, extension)
+            with open(join(directory, name), 'w') as corpus_file:
+                corpus_file.write(blob)
+            corpus.append({
+                'blob': blob,
+                'language': language,
+                'path': name,
+                'size': size_name,
+            })
+    with open(devnull, 'w') as dev_null:
+        for command in (
+                ['git', 'init', '-q'],
+                ['git', 'add', '.'],
+                [
+                    'git',
+                    '-c', 'user.name=benchmarks',
+                    '-c', 'user.email=benchmarks@localhost',
+                    'commit', '-q', '-m', 'corpus',
+                ],
+        ):
+            check_call(command, cwd=directory, stdout=dev_null)
+    return corpus
@@ -0,0 +1,183 @@
+"""This file provides the timing, reporting, and baseline comparison benchmarks share"""
+
+from argparse import ArgumentParser
+from datetime import datetime
+from json import dump, load
+from platform import platform, python_version
+from sys import path as sys_path
+from os.path import abspath, dirname
+
+import gc
+import time
+
+sys_path.insert(0, dirname(dirname(abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+import pygments  # noqa: E402
+
+from wotw_highlighter import __version__  # noqa: E402
+
+CLOCK = time.perf_counter
+
+
+class Benchmark(object):
+    """This class times callables and collects the results"""
+
+    def __init__(self, repeat=5, min_time=0.2, max_number=1000):
+        """
+        Parameters:
+        repeat: How many timed rounds to run per case
+        min_time: How long a round should take; small cases loop until then
+        max_number: The most calls a round may make
+        """
+        self.repeat = repeat
+        self.min_time = min_time
+        self.max_number = max_number
+        self.results = dict()
+
+    def calibrate(self, function):
+        """Finds how many calls make a round last at least min_time"""
+        number = 1
+        while True:
+            elapsed = self.time_round(function, number)
+            if elapsed >= self.min_time or number >= self.max_number:
+                return number
+            number = min(self.max_number, number * 10)
+
+    @staticmethod
+    def time_round(function, number):
+        """Times number calls of function with the collector paused"""
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            start = CLOCK()
+            for _ in range(number):
+                function()
+            return CLOCK() - start
+        finally:
+            if collecting:
+                gc.enable()
+
+    def run(self, name, function, setup=None, size=None):
+        """
+        Times function, recording per-call seconds under name
+
+        Parameters:
+        name: The case's key in the results
+        function: The callable to time; it's given setup's return value
+        setup: An untimed callable run once before timing
+        size: The size of the input in bytes, if that's meaningful
+        """
+        argument = setup() if setup is not None else None
+        call = (lambda: function(argument)) if setup else function
+        call()
+        number = self.calibrate(call)
+        rounds = sorted(
+            self.time_round(call, number) / number
+            for _ in range(self.repeat)
+        )
+        result = {
+            'min': rounds[0],
+            'median': rounds[len(rounds) // 2],
+            'max': rounds[-1],
+            'number': number,
+            'repeat': self.repeat,
+        }
+        if size is not None:
+            result['bytes'] = size
+        self.results[name] = result
+        print(
+            '%-60s %12.6fs median %12.6fs min (%d x %d)'
+            % (name, result['median'], result['min'], self.repeat, number)
+        )
+        return result
+
+    def record(self, name, **values):
+        """Records a measurement that isn't a timing"""
+        self.results[name] = values
+        print('%-60s %s' % (name, values))
+
+    def report(self):
+        """Returns the results with enough context to compare runs"""
+        return {
+            'meta': {
+                'platform': platform(),
+                'pygments': pygments.__version__,
+                'python': python_version(),
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'wotw_highlighter': __version__,
+            },
+            'results': self.results,
+        }
+
+
+def compare(current, baseline, threshold):
+    """
+    Compares medians, returning (name, baseline, current, ratio) for every
+    case that slowed down by more than threshold
+    """
+    regressions = []
+    for name, result in sorted(current['results'].items()):
+        previous = baseline['results'].get(name)
+        if not previous or 'median' not in result or 'median' not in previous:
+            continue
+        if not previous['median']:
+            continue
+        ratio = result['median'] / previous['median']
+        if ratio > 1 + threshold:
+            regressions.append(
+                (name, previous['median'], result['median'], ratio)
+            )
+    return regressions
+
+
+def build_parser(description):
+    """Builds the options every benchmark script accepts"""
+    parser = ArgumentParser(description=description)
+    parser.add_argument(
+        '--output',
+        help='Write the results as JSON here'
+    )
+    parser.add_argument(
+        '--baseline',
+        help='Compare against results previously written with --output'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.10,
+        help='Flag cases whose median grew by more than this fraction'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=5,
+        help='Timed rounds per case'
+    )
+    parser.add_argument(
+        '--filter',
+        default='',
+        help='Only run cases whose name contains this'
+    )
+    return parser
+
+
+def finish(benchmark, arguments):
+    """Writes results, compares to the baseline, and returns an exit code"""
+    report = benchmark.report()
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            dump(report, output_file, indent=2, sort_keys=True)
+    if not arguments.baseline:
+        return 0
+    with open(arguments.baseline, 'r') as baseline_file:
+        baseline = load(baseline_file)
+    regressions = compare(report, baseline, arguments.threshold)
+    for name, previous, current, ratio in regressions:
+        print(
+            'REGRESSION %s: %.6fs -> %.6fs (%.0f%% slower)'
+            % (name, previous, current, (ratio - 1) * 100)
+        )
+    if not regressions:
+        print('No regressions over %.0f%%' % (arguments.threshold * 100))
+    return 1 if regressions else 0
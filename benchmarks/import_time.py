@@ -0,0 +1,100 @@
+"""
+This file times cold imports of the package in fresh interpreters
+
+Usage:
+    python benchmarks/import_time.py --output results.json
+    python benchmarks/import_time.py --runs 50 --filter block
+"""
+
+from json import loads
+from subprocess import check_output
+from sys import executable, exit as sys_exit
+
+from harness import Benchmark, build_parser, finish
+from corpus import ROOT
+
+STATEMENTS = [
+    ('import/package', 'import wotw_highlighter'),
+    ('import/loader', 'from wotw_highlighter import BlockLoader'),
+    ('import/block', 'from wotw_highlighter import Block'),
+    ('import/highlighter', 'from wotw_highlighter import BlockHighlighter'),
+    (
+        'import/everything',
+        'import wotw_highlighter as package\n'
+        'for name in package.__all__:\n'
+        '    getattr(package, name)'
+    ),
+]
+
+# The interpreter is already up when the clock starts, so only the
+# statement's own imports are counted
+PROBE = '''\
+import json, sys, time
+before = set(sys.modules)
+start = time.perf_counter()
+exec(%r)
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'seconds': elapsed,
+    'modules': len(set(sys.modules) - before),
+    'pygments_formatters': 'pygments.formatters' in sys.modules,
+}))
+'''
+
+
+def probe(statement):
+    """Runs statement in a new interpreter and returns what it loaded"""
+    output = check_output([executable, '-c', PROBE % (statement)], cwd=ROOT)
+    return loads(output.decode('utf-8'))
+
+
+def time_statement(benchmark, name, statement, runs):
+    """Records the spread of cold import times for statement"""
+    probes = [probe(statement) for _ in range(runs)]
+    seconds = sorted(result['seconds'] for result in probes)
+    benchmark.record(
+        name,
+        min=seconds[0],
+        median=seconds[len(seconds) // 2],
+        max=seconds[-1],
+        runs=runs,
+        modules=probes[-1]['modules'],
+        pygments_formatters=probes[-1]['pygments_formatters']
+    )
+    return seconds[len(seconds) // 2]
+
+
+def main():
+    """Times every statement and reports"""
+    parser = build_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--runs',
+        type=int,
+        default=20,
+        help='Fresh interpreters per statement'
+    )
+    arguments = parser.parse_args()
+    benchmark = Benchmark()
+    medians = dict()
+    for name, statement in STATEMENTS:
+        if arguments.filter not in name:
+            continue
+        medians[name] = time_statement(
+            benchmark,
+            name,
+            statement,
+            arguments.runs
+        )
+    if 'import/package' in medians and 'import/everything' in medians:
+        print(
+            'Lazy package import saves %.1f ms over importing everything'
+            % (
+                (medians['import/everything'] - medians['import/package'])
+                * 1000
+            )
+        )
+    return finish(benchmark, arguments)
+
+
+if __name__ == '__main__':
+    sys_exit(main())
@@ -0,0 +1,134 @@
+"""
+This file measures how much memory highlighting large blobs peaks at
+
+Usage:
+    python benchmarks/memory.py --output results.json
+    python benchmarks/memory.py --sizes large --filter tokens
+"""
+
+from json import loads
+from subprocess import check_output
+from sys import executable, exit as sys_exit
+
+from harness import Benchmark, build_parser, finish
+from corpus import ROOT, SIZES
+
+CASES = [
+    (
+        'tokens/tuples',
+        'kept = list(lexer.get_tokens(blob))',
+    ),
+    (
+        'tokens/stream',
+        'kept = TokenStream.encode(\n'
+        '    highlighter.preprocess(blob),\n'
+        '    lexer.get_tokens(blob)\n'
+        ')',
+    ),
+    (
+        'highlight/stream',
+        'highlight(outfile=NullWriter())',
+    ),
+    (
+        'highlight/token-cache-miss',
+        'highlight(outfile=NullWriter(), token_cache=token_cache)',
+    ),
+    (
+        'highlight/token-cache-hit',
+        'highlight(outfile=NullWriter(), token_cache=token_cache)',
+    ),
+]
+
+# Everything the case needs, including the blob, is allocated and the
+# high-water mark reset (where Linux allows) before the baseline is read,
+# so only the case's own peak is counted
+PROBE = '''\
+import json, resource, sys
+sys.path.insert(0, 'benchmarks')
+from corpus import grow, seeds
+from wotw_highlighter import BlockHighlighter, TokenCache
+from wotw_highlighter.token_cache import TokenStream
+
+class NullWriter(object):
+    def write(self, chunk):
+        pass
+
+def highlight(text=None, **options):
+    highlighter = BlockHighlighter(
+        blob=blob if text is None else text,
+        explicit_lexer_name='PythonLexer',
+        **options
+    )
+    highlighter.attach_and_highlight()
+
+def status(field):
+    with open('/proc/self/status') as status_file:
+        for line in status_file:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+def baseline():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return status('VmRSS'), lambda: status('VmHWM')
+    except (IOError, OSError):
+        def peak():
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss // 1024 if 'darwin' == sys.platform else rss
+        return peak(), peak
+
+blob = grow(dict((name, seed) for name, _, seed in seeds())['python'], %d)
+token_cache = TokenCache(max_size=2 ** 40)
+highlight(blob[:1024])
+highlighter = BlockHighlighter(blob=blob, explicit_lexer_name='PythonLexer')
+highlighter.attach_lexer()
+lexer = highlighter.lexer
+if %r:
+    highlight(outfile=NullWriter(), token_cache=token_cache)
+before, peak = baseline()
+exec(%r)
+print(json.dumps({'peak_kb': peak() - before, 'bytes': len(blob)}))
+'''
+
+
+def probe(statement, size, warm):
+    """Runs statement in a new interpreter and returns its peak RSS growth"""
+    output = check_output(
+        [executable, '-c', PROBE % (size, warm, statement)],
+        cwd=ROOT
+    )
+    return loads(output.decode('utf-8'))
+
+
+def main():
+    """Measures every case at every size and reports"""
+    parser = build_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--sizes',
+        nargs='+',
+        choices=[name for name, _ in SIZES],
+        default=['medium', 'large'],
+        help='Corpus sizes to run'
+    )
+    arguments = parser.parse_args()
+    benchmark = Benchmark()
+    for size_name, size in SIZES:
+        if size_name not in arguments.sizes:
+            continue
+        for stage, statement in CASES:
+            name = '%s/python/%s' % (stage, size_name)
+            if arguments.filter not in name:
+                continue
+            result = probe(statement, size, stage.endswith('-hit'))
+            benchmark.record(
+                name,
+                peak_kb=result['peak_kb'],
+                bytes=result['bytes'],
+                per_byte=float(result['peak_kb'] * 1024) / result['bytes']
+            )
+    return finish(benchmark, arguments)
+
+
+if __name__ == '__main__':
+    sys_exit(main())
@@ -0,0 +1,162 @@
+"""
+This file times every stage of the pipeline over corpora of several sizes
+and languages
+
+Usage:
+    python benchmarks/pipeline.py --output results.json
+    python benchmarks/pipeline.py --baseline results.json --sizes tiny medium
+"""
+
+from os.path import join
+from shutil import rmtree
+from sys import exit as sys_exit
+from tempfile import mkdtemp
+
+from harness import Benchmark, build_parser, finish
+from corpus import SIZES, build_corpus
+
+# pylint: disable=wrong-import-order
+from wotw_highlighter import (
+    Block,
+    BlockDecorator,
+    BlockHighlighter,
+    BlockLoader,
+    BlockStyler,
+    GitBackend,
+)
+
+EXPLICIT_LEXERS = {
+    'css': 'CssLexer',
+    'javascript': 'JavascriptLexer',
+    'python': 'PythonLexer',
+    'rst': 'RstLexer',
+    'sql': 'SqlLexer',
+}
+
+
+class NullWriter(object):
+    """Discards streamed output"""
+
+    def write(self, chunk):
+        """Drops chunk"""
+        pass
+
+
+def loader_cases(entry, directory):
+    """Yields (stage, function) for every way of loading entry"""
+    yield 'load/file', lambda: BlockLoader(
+        entry['path'],
+        blob_working_directory=directory
+    ).load()
+    yield 'load/raw', lambda: BlockLoader(entry['blob']).load()
+    for backend in sorted(BlockLoader.GIT_BACKENDS):
+        yield 'load/git-%s' % (backend), (
+            lambda backend=backend: BlockLoader(
+                'HEAD:%s' % (entry['path']),
+                blob_working_directory=directory,
+                git_backend=backend
+            ).load()
+        )
+
+
+def highlighter_cases(entry):
+    """Yields (stage, function) for explicit, filename, and guessed lexers"""
+    def run(**options):
+        highlighter = BlockHighlighter(blob=entry['blob'], **options)
+        highlighter.attach_and_highlight()
+        return highlighter.highlighted_blob
+    yield 'highlight/explicit', lambda: run(
+        explicit_lexer_name=EXPLICIT_LEXERS[entry['language']]
+    )
+    yield 'highlight/filename', lambda: run(blob_path=entry['path'])
+    yield 'highlight/guessed', lambda: run()
+
+
+def decorator_cases(entry):
+    """Yields (stage, function) for decorating with and without inlining"""
+    highlighted = dict()
+
+    def decorate(inline_css):
+        if not highlighted:
+            highlighter = BlockHighlighter(
+                blob=entry['blob'],
+                explicit_lexer_name=EXPLICIT_LEXERS[entry['language']]
+            )
+            highlighter.attach_and_highlight()
+            highlighted['blob'] = highlighter.highlighted_blob
+            highlighted['styles'] = BlockStyler.dump_styles()
+        BlockDecorator(
+            highlighted_blob=highlighted['blob'],
+            highlighted_blob_styles=highlighted['styles'],
+            inline_css=inline_css
+        ).decorate()
+    yield 'decorate/plain', lambda: decorate(False)
+    yield 'decorate/inline', lambda: decorate(True)
+
+
+def block_cases(entry, directory):
+    """Yields (stage, function) for full compiles"""
+    def compile_block(**options):
+        return Block(
+            entry['path'],
+            blob_working_directory=directory,
+            **options
+        ).highlighted_blob
+    yield 'block/plain', lambda: compile_block()
+    yield 'block/inline', lambda: compile_block(inline_css=True)
+    yield 'block/inline-token-styles', lambda: compile_block(
+        inline_css=True,
+        inline_token_styles=True
+    )
+    yield 'block/stream', lambda: compile_block(outfile=NullWriter())
+
+
+def main():
+    """Builds the corpus, runs every case, and reports"""
+    parser = build_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--sizes',
+        nargs='+',
+        choices=[name for name, _ in SIZES],
+        default=[name for name, _ in SIZES],
+        help='Corpus sizes to run'
+    )
+    parser.add_argument(
+        '--languages',
+        nargs='+',
+        help='Corpus languages to run'
+    )
+    arguments = parser.parse_args()
+    benchmark = Benchmark(repeat=arguments.repeat)
+    scratch = mkdtemp()
+    try:
+        directory = join(scratch, 'corpus')
+        corpus = build_corpus(
+            directory,
+            [size for size in SIZES if size[0] in arguments.sizes]
+        )
+        benchmark.run(
+            'style/set_styles',
+            lambda: BlockStyler().set_styles()
+        )
+        for entry in corpus:
+            if arguments.languages and entry['language'] not in arguments.languages:
+                continue
+            cases = []
+            cases.extend(loader_cases(entry, directory))
+            cases.extend(highlighter_cases(entry))
+            cases.extend(decorator_cases(entry))
+            cases.extend(block_cases(entry, directory))
+            for stage, function in cases:
+                name = '%s/%s/%s' % (stage, entry['language'], entry['size'])
+                if arguments.filter not in name:
+                    continue
+                benchmark.run(name, function, size=len(entry['blob']))
+    finally:
+        GitBackend.close_all()
+        rmtree(scratch)
+    return finish(benchmark, arguments)
+
+
+if __name__ == '__main__':
+    sys_exit(main())
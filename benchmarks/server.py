@@ -0,0 +1,209 @@
+"""
+This file measures the render server's throughput and latency against
+starting a fresh interpreter per snippet
+
+Usage:
+    python benchmarks/server.py --output results.json
+    python benchmarks/server.py --requests 2000 --clients 1 8 --workers 4
+"""
+
+from os.path import join
+from shutil import rmtree
+from signal import SIGINT
+from subprocess import PIPE, Popen
+from sys import executable, exit as sys_exit
+from tempfile import mkdtemp
+from threading import Thread
+from time import sleep
+
+from harness import CLOCK, build_parser, finish, Benchmark
+from corpus import ROOT, seeds
+
+# pylint: disable=wrong-import-order
+from wotw_highlighter import RenderClient
+
+EXTENSIONS = {
+    'css': 'site.css',
+    'javascript': 'main.js',
+    'python': 'main.py',
+    'rst': 'README.rst',
+    'sql': 'orders.sql',
+}
+
+SNIPPET_LINES = 30
+
+# What a docs build does when it shells out for every snippet
+SCRIPT = '''\
+import sys
+from wotw_highlighter.block import LoadedBlock
+LoadedBlock(blob=sys.stdin.read(), blob_path=%r).rendered
+'''
+
+
+def snippets(count):
+    """Cuts count snippets of a few dozen lines from the corpus seeds"""
+    pieces = []
+    for language, _, seed in seeds():
+        lines = seed.splitlines(True)
+        for start in range(0, len(lines), SNIPPET_LINES):
+            pieces.append({
+                'blob': ''.join(lines[start:start + SNIPPET_LINES]),
+                'blob_path': EXTENSIONS[language],
+            })
+    return [pieces[index % len(pieces)] for index in range(count)]
+
+
+def summarize(latencies, elapsed):
+    """Reduces per-request seconds to throughput and percentiles"""
+    latencies = sorted(latencies)
+    return {
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)],
+        'requests': len(latencies),
+        'requests_per_second': len(latencies) / elapsed,
+    }
+
+
+def time_subprocesses(specs):
+    """Renders each spec in its own interpreter, one after another"""
+    latencies = []
+    start = CLOCK()
+    for spec in specs:
+        began = CLOCK()
+        process = Popen(
+            [executable, '-c', SCRIPT % (spec['blob_path'])],
+            cwd=ROOT,
+            stdin=PIPE
+        )
+        process.communicate(spec['blob'].encode('utf-8'))
+        latencies.append(CLOCK() - began)
+    return summarize(latencies, CLOCK() - start)
+
+
+def connect(path, timeout=60):
+    """Waits for the server to come up and connects to it"""
+    deadline = CLOCK() + timeout
+    while True:
+        try:
+            return RenderClient.connect(path)
+        except (IOError, OSError):
+            if CLOCK() > deadline:
+                raise
+            sleep(0.05)
+
+
+def time_clients(path, specs, clients):
+    """Splits specs across clients, each rendering one at a time"""
+    connections = [connect(path) for _ in range(clients)]
+    latencies = []
+
+    def run(client, share):
+        for spec in share:
+            began = CLOCK()
+            result = client.render(**spec)
+            latencies.append(CLOCK() - began)
+            if result.error is not None:
+                raise result.error
+
+    threads = [
+        Thread(target=run, args=(client, specs[index::clients]))
+        for index, client in enumerate(connections)
+    ]
+    start = CLOCK()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = CLOCK() - start
+    for client in connections:
+        client.close()
+    return summarize(latencies, elapsed)
+
+
+def time_pipelined(path, specs):
+    """Sends every spec over one connection without waiting"""
+    client = connect(path)
+    sent = dict()
+    latencies = []
+    request_ids = [next(client.ids) for _ in specs]
+
+    def send_all():
+        for spec, request_id in zip(specs, request_ids):
+            sent[request_id] = CLOCK()
+            client.send(spec, request_id)
+
+    sending = Thread(target=send_all)
+    start = CLOCK()
+    sending.start()
+    for _ in specs:
+        request_id, result = client.receive()
+        latencies.append(CLOCK() - sent[request_id])
+        if result.error is not None:
+            raise result.error
+    elapsed = CLOCK() - start
+    sending.join()
+    client.close()
+    return summarize(latencies, elapsed)
+
+
+def main():
+    """Starts a server, runs every case, and reports"""
+    parser = build_parser(__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=500,
+        help='Snippets rendered per server case'
+    )
+    parser.add_argument(
+        '--subprocesses',
+        type=int,
+        default=20,
+        help='Snippets rendered by starting an interpreter apiece'
+    )
+    parser.add_argument(
+        '--clients',
+        type=int,
+        nargs='+',
+        default=[1, 4],
+        help='Concurrent connections to try'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Server worker processes; one per CPU if not given'
+    )
+    arguments = parser.parse_args()
+    benchmark = Benchmark()
+    specs = snippets(arguments.requests)
+    if arguments.filter in 'serve/subprocess':
+        benchmark.record(
+            'serve/subprocess',
+            **time_subprocesses(specs[:arguments.subprocesses])
+        )
+    scratch = mkdtemp()
+    path = join(scratch, 'highlighter.sock')
+    command = [
+        executable, '-m', 'wotw_highlighter.render_server',
+        '--socket', path,
+    ]
+    if arguments.workers:
+        command.extend(['--max-workers', str(arguments.workers)])
+    server = Popen(command, cwd=ROOT)
+    try:
+        connect(path).close()
+        for clients in arguments.clients:
+            name = 'serve/clients-%d' % (clients)
+            if arguments.filter in name:
+                benchmark.record(name, **time_clients(path, specs, clients))
+        if arguments.filter in 'serve/pipelined':
+            benchmark.record('serve/pipelined', **time_pipelined(path, specs))
+    finally:
+        server.send_signal(SIGINT)
+        server.wait()
+        rmtree(scratch)
+    return finish(benchmark, arguments)
+
+
+if __name__ == '__main__':
+    sys_exit(main())
@@ -0,0 +1,134 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for BlobFile"""
+
+from codecs import BOM_UTF8
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from mock import patch
+
+from wotw_highlighter.blob_file import BlobFile, detect_encoding
+
+
+class DetectEncodingUnitTests(TestCase):
+
+    def test_byte_order_marks(self):
+        self.assertEqual(detect_encoding(BOM_UTF8 + b'x'), ('utf-8', 3))
+        self.assertEqual(
+            detect_encoding(u'﻿x'.encode('utf-16-le')),
+            ('utf-16-le', 2)
+        )
+        self.assertEqual(
+            detect_encoding(u'﻿x'.encode('utf-32-le')),
+            ('utf-32-le', 4)
+        )
+
+    def test_coding_comment(self):
+        self.assertEqual(
+            detect_encoding(b'#!/usr/bin/env python\n# coding: cp1252\n'),
+            ('cp1252', 0)
+        )
+        self.assertEqual(
+            detect_encoding(b'\n\n# coding: cp1252\n'),
+            ('utf-8', 0)
+        )
+
+    def test_unknown_coding_comment(self):
+        self.assertEqual(detect_encoding(b'# coding: nope\n'), ('utf-8', 0))
+
+    def test_utf_8(self):
+        self.assertEqual(detect_encoding(u'é'.encode('utf-8')), ('utf-8', 0))
+
+    def test_cut_off_character(self):
+        self.assertEqual(
+            detect_encoding(u'é'.encode('utf-8')[:1]),
+            ('utf-8', 0)
+        )
+
+    def test_fallback(self):
+        self.assertEqual(detect_encoding(b'caf\xe9\n'), ('latin-1', 0))
+
+
+class BlobFileTestCase(TestCase):
+
+    LINES = [u'line %d é\n' % (number) for number in range(1, 201)]
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.addCleanup(rmtree, self.directory)
+
+    def write(self, contents, name='blob.txt'):
+        path = join(self.directory, name)
+        with open(path, 'wb') as blob_file:
+            blob_file.write(contents)
+        return BlobFile(path)
+
+
+class ReadUnitTests(BlobFileTestCase):
+
+    def test_whole_file(self):
+        blob_file = self.write(u''.join(self.LINES).encode('utf-8'))
+        self.assertEqual(blob_file.read(), u''.join(self.LINES))
+
+    def test_empty_file(self):
+        self.assertEqual(self.write(b'').read(1, 2), u'')
+
+    def test_line_range(self):
+        blob_file = self.write(u''.join(self.LINES).encode('utf-8'))
+        self.assertEqual(
+            blob_file.read(120, 126),
+            u''.join(self.LINES[119:126])
+        )
+        self.assertEqual(blob_file.read(199, None), u''.join(self.LINES[198:]))
+        self.assertEqual(blob_file.read(None, 1), self.LINES[0])
+
+    def test_lead_in(self):
+        blob_file = self.write(u''.join(self.LINES).encode('utf-8'))
+        self.assertEqual(
+            blob_file.read_excerpt(120, 121, 118),
+            (u''.join(self.LINES[117:119]), u''.join(self.LINES[119:121]))
+        )
+        self.assertEqual(
+            blob_file.read_excerpt(120, 121),
+            (u'', u''.join(self.LINES[119:121]))
+        )
+
+    def test_memory_mapped(self):
+        blob_file = self.write(u''.join(self.LINES).encode('utf-8'))
+        with patch.object(BlobFile, 'MMAP_THRESHOLD', 16):
+            with patch.object(BlobFile, 'SAMPLE_SIZE', 16):
+                self.assertEqual(
+                    blob_file.read(120, 126),
+                    u''.join(self.LINES[119:126])
+                )
+                self.assertEqual(blob_file.read(), u''.join(self.LINES))
+
+    def test_utf_16(self):
+        blob_file = self.write(
+            (u'﻿' + u''.join(self.LINES)).encode('utf-16-le')
+        )
+        self.assertEqual(blob_file.read(3, 4), u''.join(self.LINES[2:4]))
+        self.assertEqual(blob_file.read(), u''.join(self.LINES))
+
+    def test_fallback(self):
+        blob_file = self.write(b'caf\xe9\n')
+        self.assertEqual(blob_file.read(), u'café\n')
+
+    def test_newlines(self):
+        blob_file = self.write(b'a\r\nb\rc\n')
+        self.assertEqual(blob_file.read(), u'a\nb\nc\n')
+        self.assertEqual(blob_file.read(2, 2), u'b\nc\n')
+
+    def test_changed_file(self):
+        blob_file = self.write(b'a\nb\n')
+        self.assertEqual(blob_file.read(2, 2), u'b\n')
+        self.write(b'a\nbb\nc\n')
+        self.assertEqual(blob_file.read(2, 2), u'bb\n')
+
+    def test_missing_file(self):
+        with self.assertRaises(IOError):
+            BlobFile(join(self.directory, 'missing')).read()
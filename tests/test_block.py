@@ -3,11 +3,17 @@
 # pylint: disable=W0613
 # pylint: disable=W0201
 
+from concurrent.futures import Future, ThreadPoolExecutor
+from os import getcwd
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
 from unittest import TestCase
 
 from mock import call, MagicMock, patch
 
-from wotw_highlighter import Block
+from wotw_highlighter import Block, MemoryRenderCache
+from wotw_highlighter.block import DeferredBlock, LoadedBlock
 
 
 class BlockTestCase(TestCase):
@@ -48,16 +54,10 @@ class BlockTestCase(TestCase):
         )
         self.mock_full_options = full_options_patcher.start()
         self.addCleanup(full_options_patcher.stop)
-        move_patcher = patch.object(
-            Block,
-            'move_to_working_directory'
-        )
-        move_patcher.start()
         validate_patcher = patch.object(Block, 'validate')
         validate_patcher.start()
         self.block = Block(*args, **kwargs)
         validate_patcher.stop()
-        move_patcher.stop()
         self.mock_update.reset_mock()
         self.mock_full_options.reset_mock()
         self.addCleanup(self.wipe_block)
@@ -80,41 +80,41 @@ class LoadUnitTests(BlockTestCase):
         'wotw_highlighter.block.BlockLoader'
     )
     def test_load(self, mock_loader):
-        mock_loader.return_value = MagicMock(
-            load=MagicMock(),
-            full_options=MagicMock(
-                return_value=BlockTestCase.CHILD_OPTIONS
-            )
-        )
         self.block.load()
         mock_loader.assert_has_calls([
-            call(**BlockTestCase.PARENT_OPTIONS),
-            call().load(),
-            call().full_options()
+            call.for_context(self.block.context),
+            call.for_context().load()
         ])
-        self.mock_update.assert_called_once_with(**BlockTestCase.CHILD_OPTIONS)
+        self.assertFalse(self.mock_update.called)
 
 
 class HighlightUnitTests(BlockTestCase):
 
     @patch(
-        'wotw_highlighter.block.BlockHighlighter'
+        'wotw_highlighter.block_highlighter.BlockHighlighter'
     )
     def test_highlight(self, mock_highlighter):
-        mock_highlighter.return_value = MagicMock(
-            full_options=MagicMock(
-                return_value=BlockTestCase.CHILD_OPTIONS
-            )
-        )
         self.block.highlight()
         mock_highlighter.assert_has_calls([
-            call(**BlockTestCase.PARENT_OPTIONS),
-            call().attach_lexer(),
-            call().attach_formatter(),
-            call().highlight(),
-            call().full_options()
+            call.for_context(self.block.context),
+            call.for_context().attach_lexer(),
+            call.for_context().attach_formatter(),
+            call.for_context().highlight()
+        ])
+        self.assertFalse(self.mock_update.called)
+
+    @patch(
+        'wotw_highlighter.diff_highlighter.DiffHighlighter'
+    )
+    def test_highlight_diff(self, mock_highlighter):
+        self.block.base_blob = 'base'
+        self.block.highlight()
+        mock_highlighter.assert_has_calls([
+            call.for_context(self.block.context),
+            call.for_context().attach_lexer(),
+            call.for_context().attach_formatter(),
+            call.for_context().highlight()
         ])
-        self.mock_update.assert_called_once_with(**BlockTestCase.CHILD_OPTIONS)
 
 
 class StyleUnitTests(BlockTestCase):
@@ -123,38 +123,26 @@ class StyleUnitTests(BlockTestCase):
         'wotw_highlighter.block.BlockStyler'
     )
     def test_style(self, mock_styler):
-        mock_styler.return_value = MagicMock(
-            full_options=MagicMock(
-                return_value=BlockTestCase.CHILD_OPTIONS
-            )
-        )
         self.block.style()
         mock_styler.assert_has_calls([
-            call(**BlockTestCase.PARENT_OPTIONS),
-            call().set_styles(),
-            call().full_options()
+            call.for_context(self.block.context),
+            call.for_context().set_styles()
         ])
-        self.mock_update.assert_called_once_with(**BlockTestCase.CHILD_OPTIONS)
+        self.assertFalse(self.mock_update.called)
 
 
 class DecorateUnitTests(BlockTestCase):
 
     @patch(
-        'wotw_highlighter.block.BlockDecorator'
+        'wotw_highlighter.block_decorator.BlockDecorator'
     )
     def test_decorate(self, mock_decorator):
-        mock_decorator.return_value = MagicMock(
-            full_options=MagicMock(
-                return_value=BlockTestCase.CHILD_OPTIONS
-            )
-        )
         self.block.decorate()
         mock_decorator.assert_has_calls([
-            call(**BlockTestCase.PARENT_OPTIONS),
-            call().decorate(),
-            call().full_options()
+            call.for_context(self.block.context),
+            call.for_context().decorate()
         ])
-        self.mock_update.assert_called_once_with(**BlockTestCase.CHILD_OPTIONS)
+        self.assertFalse(self.mock_update.called)
 
 
 class CompileUnitTests(BlockTestCase):
@@ -183,6 +171,145 @@ class CompileUnitTests(BlockTestCase):
         ])
 
 
+class ObservedStagesUnitTests(BlockTestCase):
+
+    def setUp(self):
+        self.patch_ctor_methods()
+        self.build_block()
+        self.ctor_patch_cleanup()
+        self.block.observer = self.mock_observer = MagicMock()
+
+    @patch('wotw_highlighter.block.BlockStyler')
+    def test_stage_is_timed(self, mock_styler):
+        self.block.style()
+        self.mock_observer.started.assert_called_once_with('style')
+        self.assertEqual(
+            self.mock_observer.finished.call_args[0][0],
+            'style'
+        )
+
+    @patch('wotw_highlighter.block.BlockLoader')
+    def test_failures_are_timed(self, mock_loader):
+        mock_loader.for_context.return_value.load.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            self.block.load()
+        self.assertEqual(self.mock_observer.finished.call_count, 1)
+
+    def test_cache_counters(self):
+        self.block.render_cache = mock_cache = MagicMock()
+        mock_cache.get.return_value = None
+        self.block.load_cached('key')
+        mock_cache.get.return_value = ('highlighted', 'styles')
+        self.block.load_cached('key')
+        self.mock_observer.counted.assert_has_calls([
+            call('cache.miss'),
+            call('cache.hit'),
+        ])
+
+
+class RenderCacheKeyUnitTests(BlockTestCase):
+
+    def test_without_cache(self):
+        self.block.render_cache = None
+        self.block.git_blob_hash = 'qqq'
+        self.assertIsNone(self.block.render_cache_key())
+
+    def test_without_blob_hash(self):
+        self.block.render_cache = MagicMock()
+        self.block.git_blob_hash = None
+        self.assertIsNone(self.block.render_cache_key())
+
+    def test_without_base_blob_hash(self):
+        self.block.render_cache = MagicMock()
+        self.block.git_blob_hash = 'qqq'
+        self.block.base_blob = 'base'
+        self.assertIsNone(self.block.render_cache_key())
+
+    @patch(
+        'wotw_highlighter.block.BlockStyler.dump_styles',
+        return_value='styles'
+    )
+    def test_with_cache_and_hash(self, mock_dump):
+        self.block.render_cache = mock_cache = MagicMock()
+        self.block.git_blob_hash = 'qqq'
+        self.assertEqual(
+            self.block.render_cache_key(),
+            mock_cache.key_for.return_value
+        )
+        mock_cache.key_for.assert_called_once_with(
+            BlockTestCase.PARENT_OPTIONS,
+            'styles'
+        )
+
+
+class CompileStagesTestCase(BlockTestCase):
+
+    RENDERED = ('highlighted', 'styles')
+
+    def setUp(self):
+        self.patch_ctor_methods()
+        self.build_block()
+        self.ctor_patch_cleanup()
+        self.block.render_cache = self.mock_cache = MagicMock()
+        for method in ['load', 'highlight', 'style', 'decorate']:
+            patcher = patch.object(Block, method)
+            setattr(self, 'mock_%s' % (method), patcher.start())
+            self.addCleanup(patcher.stop)
+        key_patcher = patch.object(
+            Block,
+            'render_cache_key',
+            return_value='key'
+        )
+        key_patcher.start()
+        self.addCleanup(key_patcher.stop)
+
+
+class CachedCompileUnitTests(CompileStagesTestCase):
+
+    def test_hit_skips_rendering(self):
+        self.mock_cache.get.return_value = self.RENDERED
+        self.block.compile()
+        self.mock_load.assert_called_once_with()
+        self.mock_cache.get.assert_called_once_with('key')
+        self.assertFalse(self.mock_highlight.called)
+        self.assertFalse(self.mock_style.called)
+        self.assertFalse(self.mock_decorate.called)
+        self.assertEqual(self.block.highlighted_blob, 'highlighted')
+        self.assertEqual(self.block.highlighted_blob_styles, 'styles')
+
+    def test_miss_renders_and_stores(self):
+        self.mock_cache.get.return_value = None
+        self.block.highlighted_blob = 'highlighted'
+        self.block.highlighted_blob_styles = 'styles'
+        self.block.compile()
+        self.mock_highlight.assert_called_once_with()
+        self.mock_style.assert_called_once_with()
+        self.mock_decorate.assert_called_once_with()
+        self.mock_cache.set.assert_called_once_with('key', self.RENDERED)
+
+
+class StreamedCompileUnitTests(CompileStagesTestCase):
+
+    def setUp(self):
+        super(StreamedCompileUnitTests, self).setUp()
+        self.block.outfile = self.outfile = MagicMock()
+
+    def test_hit_is_written(self):
+        self.mock_cache.get.return_value = self.RENDERED
+        self.block.compile()
+        self.outfile.write.assert_called_once_with('highlighted')
+
+    def test_miss_styles_before_highlighting(self):
+        self.mock_cache.get.return_value = None
+        runner = MagicMock()
+        runner.attach_mock(self.mock_highlight, 'highlight')
+        runner.attach_mock(self.mock_style, 'style')
+        self.block.compile()
+        runner.assert_has_calls([call.style(), call.highlight()])
+        self.assertFalse(self.mock_decorate.called)
+        self.assertFalse(self.mock_cache.set.called)
+
+
 class RenderedUnitTests(BlockTestCase):
 
     BLOB = 'qqq'
@@ -191,3 +318,181 @@ class RenderedUnitTests(BlockTestCase):
         self.block.highlighted_blob = self.BLOB
         self.assertEquals(self.block.rendered, self.BLOB)
         self.assertEquals(self.block.highlighted_blob, self.block.rendered)
+
+
+class SynchronousExecutor(object):
+    """Runs submissions immediately so batches are deterministic"""
+
+    def __init__(self):
+        self.submissions = []
+
+    def submit(self, function, *args):
+        self.submissions.append(args)
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:  # pylint: disable=broad-except
+            future.set_exception(error)
+        return future
+
+
+class RenderManyUnitTests(TestCase):
+
+    PYTHON = {
+        'raw': 'x = 1\ny = 2',
+        'explicit_lexer_name': 'PythonLexer',
+    }
+    BROKEN = {
+        'raw': 'x = 1\ny = 2',
+        'explicit_lexer_name': 'qqq',
+    }
+    TEXT = {
+        'raw': 'raw\nis war',
+        'explicit_lexer_name': 'TextLexer',
+    }
+
+    def test_results_in_input_order(self):
+        executor = SynchronousExecutor()
+        results = Block.render_many(
+            [self.PYTHON, self.BROKEN, self.TEXT],
+            executor=executor
+        )
+        self.assertEqual(results[0].rendered, Block(**self.PYTHON).rendered)
+        self.assertIsNone(results[0].error)
+        self.assertIsNone(results[1].rendered)
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertEqual(results[2].rendered, Block(**self.TEXT).rendered)
+        self.assertEqual(len(executor.submissions), 3)
+
+    def test_load_failures_are_per_block(self):
+        results = Block.render_many(
+            [{}, self.TEXT],
+            executor=SynchronousExecutor()
+        )
+        self.assertIsInstance(results[0].error, ValueError)
+        self.assertIsNone(results[1].error)
+
+    @patch.object(Block, 'render_cache_key', return_value='key')
+    def test_cache_hits_skip_the_pool(self, mock_key):
+        cache = MemoryRenderCache()
+        cache.set('key', ('highlighted', 'styles'))
+        executor = SynchronousExecutor()
+        spec = dict(self.PYTHON)
+        spec['render_cache'] = cache
+        results = Block.render_many([spec], executor=executor)
+        self.assertEqual(results[0].rendered, 'highlighted')
+        self.assertEqual(executor.submissions, [])
+
+    @patch.object(
+        Block,
+        'render_cache_key',
+        autospec=True,
+        side_effect=lambda block: 'key' if block.render_cache else None
+    )
+    def test_misses_are_cached(self, mock_key):
+        cache = MemoryRenderCache()
+        spec = dict(self.PYTHON)
+        spec['render_cache'] = cache
+        results = Block.render_many([spec], executor=SynchronousExecutor())
+        self.assertEqual(cache.get('key')[0], results[0].rendered)
+
+    def test_worker_failures_fail_the_chunk(self):
+        executor = MagicMock()
+        executor.submit.return_value.result.side_effect = OSError
+        results = Block.render_many([self.PYTHON], executor=executor)
+        self.assertIsInstance(results[0].error, OSError)
+
+    def test_process_pool(self):
+        results = Block.render_many([self.PYTHON, self.TEXT], max_workers=2)
+        self.assertEqual(results[0].rendered, Block(**self.PYTHON).rendered)
+        self.assertEqual(results[1].rendered, Block(**self.TEXT).rendered)
+
+
+class BatchChunksUnitTests(TestCase):
+
+    @staticmethod
+    def fake_block(directory, path, lexer=None):
+        block = MagicMock()
+        block.full_options.return_value = {
+            'blob_working_directory': directory,
+            'blob_path': path,
+            'explicit_lexer_name': lexer,
+        }
+        return block
+
+    def test_grouped_by_repo_and_lexer(self):
+        pending = [
+            (0, self.fake_block('/a', 'one.py')),
+            (1, self.fake_block('/b', 'two.py')),
+            (2, self.fake_block('/a', 'three.js')),
+            (3, self.fake_block('/a', 'four.py')),
+        ]
+        chunks = Block.batch_chunks(pending * 4, max_workers=1)
+        self.assertEqual(
+            [[index for index, _ in chunk] for chunk in chunks],
+            [[2, 2, 2, 2], [0, 3, 0, 3], [0, 3, 0, 3], [1, 1, 1, 1]]
+        )
+
+    def test_groups_are_never_mixed(self):
+        pending = [
+            (0, self.fake_block('/a', 'one.py')),
+            (1, self.fake_block('/a', 'two.js')),
+        ]
+        chunks = Block.batch_chunks(pending * 8, max_workers=1)
+        self.assertEqual(
+            [[index for index, _ in chunk] for chunk in chunks],
+            [[1, 1, 1, 1], [1, 1, 1, 1], [0, 0, 0, 0], [0, 0, 0, 0]]
+        )
+
+    def test_large_groups_are_split(self):
+        pending = [
+            (index, self.fake_block('/a', 'file.py'))
+            for index in range(16)
+        ]
+        chunks = Block.batch_chunks(pending, max_workers=2)
+        self.assertEqual(len(chunks), 8)
+
+
+class DeferredBlockUnitTests(TestCase):
+
+    @patch.object(Block, 'prepare', return_value=False)
+    def test_stops_after_prepare(self, mock_prepare):
+        block = DeferredBlock(render_cache='cache', token_cache='cache')
+        self.assertFalse(block.cache_hit)
+        self.assertIsNone(block.worker_options()['render_cache'])
+        self.assertIsNone(block.worker_options()['token_cache'])
+
+
+class LoadedBlockUnitTests(TestCase):
+
+    @patch('wotw_highlighter.block.BlockLoader')
+    def test_load_is_skipped(self, mock_loader):
+        block = LoadedBlock(blob='x = 1', explicit_lexer_name='PythonLexer')
+        self.assertFalse(mock_loader.called)
+        self.assertIsNotNone(block.rendered)
+
+
+class ThreadedRenderingUnitTests(TestCase):
+
+    def setUp(self):
+        self.directories = []
+        for contents in ['first = 1', 'second = 2']:
+            directory = mkdtemp()
+            self.addCleanup(rmtree, directory)
+            with open(join(directory, 'snippet.py'), 'w') as snippet:
+                snippet.write(contents)
+            self.directories.append(directory)
+
+    def render(self, directory):
+        return Block(
+            'snippet.py',
+            blob_working_directory=directory,
+            no_header=True
+        ).blob
+
+    def test_blocks_from_different_directories(self):
+        launch_directory = getcwd()
+        with ThreadPoolExecutor(4) as executor:
+            blobs = list(executor.map(self.render, self.directories * 20))
+        self.assertEqual(blobs, ['first = 1', 'second = 2'] * 20)
+        self.assertEqual(getcwd(), launch_directory)
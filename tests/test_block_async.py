@@ -0,0 +1,325 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+# pylint: disable=W0613
+"""This file collects tests for the asyncio front end"""
+
+from os.path import join
+from shutil import rmtree
+from subprocess import check_call, check_output
+from tempfile import mkdtemp
+from threading import Event, Lock, current_thread, main_thread
+from unittest import TestCase
+
+import asyncio
+
+from mock import MagicMock, patch
+
+from wotw_highlighter import (
+    AsyncRenderer,
+    Block,
+    BlockLoader,
+    GitBackend,
+    MemoryRenderCache,
+)
+from wotw_highlighter.blob_file import BlobFile
+from wotw_highlighter.block import render_loaded_group
+from wotw_highlighter.block_async import AsyncGitChannel
+
+
+class BlockAsyncTestCase(TestCase):
+    """Builds a scratch repo and a fresh loop per test"""
+
+    CONTENTS = 'def main():\n    return 42\n'
+
+    @classmethod
+    def git(cls, *args):
+        return check_output(
+            ('git',) + args,
+            cwd=cls.repository,
+        ).decode('utf-8').strip()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.repository = mkdtemp()
+        check_call(['git', 'init', '-q', cls.repository])
+        cls.git('config', 'user.email', 'test@example.com')
+        cls.git('config', 'user.name', 'test')
+        with open(join(cls.repository, 'main.py'), 'w') as blob_file:
+            blob_file.write(cls.CONTENTS)
+        cls.git('add', '-A')
+        cls.git('commit', '-q', '-m', 'main')
+        cls.blob_hash = cls.git('rev-parse', 'HEAD:main.py')
+
+    @classmethod
+    def tearDownClass(cls):
+        GitBackend.close_all()
+        rmtree(cls.repository)
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def run_async(self, awaitable):
+        return self.loop.run_until_complete(awaitable)
+
+
+class AsyncGitChannelUnitTests(BlockAsyncTestCase):
+
+    def setUp(self):
+        super(AsyncGitChannelUnitTests, self).setUp()
+        self.channel = AsyncGitChannel(self.repository)
+        self.run_async(self.channel.discover_git_dir())
+        self.addCleanup(self.run_async, self.channel.close())
+
+    def test_git_dir(self):
+        self.assertEqual(self.channel.git_dir, join(self.repository, '.git'))
+
+    def test_not_a_repo(self):
+        scratch = mkdtemp()
+        self.addCleanup(rmtree, scratch)
+        with self.assertRaisesRegexp(ValueError, 'is not a git repo'):
+            self.run_async(AsyncGitChannel(scratch).discover_git_dir())
+
+    def test_object_info(self):
+        self.assertEqual(
+            self.run_async(self.channel.object_info('HEAD:main.py')),
+            (self.blob_hash, 'blob', len(self.CONTENTS))
+        )
+
+    def test_read_object(self):
+        self.assertEqual(
+            self.run_async(self.channel.read_object(self.blob_hash)),
+            (self.blob_hash, 'blob', self.CONTENTS.encode('utf-8'))
+        )
+
+    def test_missing_object(self):
+        self.assertIsNone(
+            self.run_async(self.channel.object_info('HEAD:missing.py'))
+        )
+
+    def test_newlines_are_never_sent(self):
+        self.assertIsNone(
+            self.run_async(self.channel.object_info('HEAD\nHEAD'))
+        )
+
+    def test_processes_are_reused(self):
+        self.run_async(self.channel.object_info('HEAD'))
+        process = self.channel.processes[AsyncGitChannel.BATCH_CHECK]
+        self.run_async(self.channel.object_info('HEAD:main.py'))
+        self.assertIs(
+            self.channel.processes[AsyncGitChannel.BATCH_CHECK],
+            process
+        )
+
+    def test_cancellation_discards_the_process(self):
+        self.run_async(self.channel.read_object('HEAD'))
+        process = self.channel.processes[AsyncGitChannel.BATCH]
+
+        async def cancel_midway():
+            task = asyncio.ensure_future(
+                self.channel.read_object(self.blob_hash)
+            )
+            await asyncio.sleep(0)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        self.run_async(cancel_midway())
+        self.assertNotIn(AsyncGitChannel.BATCH, self.channel.processes)
+        self.run_async(process.wait())
+        self.assertEqual(
+            self.run_async(self.channel.read_object(self.blob_hash))[0],
+            self.blob_hash
+        )
+
+
+class RenderUnitTests(BlockAsyncTestCase):
+
+    def setUp(self):
+        super(RenderUnitTests, self).setUp()
+        self.renderer = AsyncRenderer()
+        self.addCleanup(self.run_async, self.renderer.close())
+
+    def test_raw_matches_block(self):
+        block = self.run_async(self.renderer.render(
+            self.CONTENTS,
+            explicit_lexer_name='PythonLexer'
+        ))
+        self.assertEqual(
+            block.rendered,
+            Block(self.CONTENTS, explicit_lexer_name='PythonLexer').rendered
+        )
+
+    def test_git_matches_block(self):
+        for backend in sorted(BlockLoader.GIT_BACKENDS):
+            block = self.run_async(self.renderer.render(
+                'HEAD:main.py',
+                blob_working_directory=self.repository,
+                git_backend=backend
+            ))
+            expected = Block(
+                'HEAD:main.py',
+                blob_working_directory=self.repository,
+                git_backend=backend
+            )
+            self.assertEqual(block.git_blob_hash, self.blob_hash)
+            self.assertEqual(block.rendered, expected.rendered)
+
+    def test_files_are_read_off_the_loop(self):
+        threads = []
+        read_excerpt = BlobFile.read_excerpt
+
+        def record(blob_file, *args):
+            threads.append(current_thread())
+            return read_excerpt(blob_file, *args)
+
+        with patch.object(BlobFile, 'read_excerpt', record):
+            block = self.run_async(self.renderer.render(
+                'main.py',
+                blob_working_directory=self.repository,
+                end_line=1
+            ))
+        self.assertNotIn(main_thread(), threads)
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(
+            block.rendered,
+            Block(
+                'main.py',
+                blob_working_directory=self.repository,
+                end_line=1
+            ).rendered
+        )
+
+    def test_missing_files_fall_back_to_raw(self):
+        block = self.run_async(self.renderer.render(
+            'x = 42',
+            blob_working_directory=self.repository
+        ))
+        self.assertEqual(block.blob, 'x = 42')
+
+    def test_bad_ref(self):
+        with self.assertRaisesRegexp(ValueError, 'is not a valid git ref'):
+            self.run_async(self.renderer.render(
+                'main.py',
+                blob_working_directory=self.repository,
+                git_ref_name='nope'
+            ))
+
+    def test_outfile_is_refused(self):
+        with self.assertRaisesRegexp(ValueError, 'outfile'):
+            self.run_async(self.renderer.render(
+                self.CONTENTS,
+                outfile=MagicMock()
+            ))
+
+    def test_cache_hits_skip_the_executor(self):
+        cache = MemoryRenderCache()
+        observer = MagicMock()
+        options = {
+            'blob_working_directory': self.repository,
+            'render_cache': cache,
+            'observer': observer,
+        }
+        first = self.run_async(self.renderer.render('HEAD:main.py', **options))
+        with patch(
+            'wotw_highlighter.block_async.render_loaded_group'
+        ) as mock_render:
+            second = self.run_async(
+                self.renderer.render('HEAD:main.py', **options)
+            )
+        self.assertFalse(mock_render.called)
+        self.assertEqual(second.rendered, first.rendered)
+        observer.counted.assert_any_call('cache.hit')
+
+    def test_concurrency_is_limited(self):
+        renderer = AsyncRenderer(max_concurrency=2)
+        lock = Lock()
+        running = [0, 0]
+
+        def tracked(group):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            try:
+                Event().wait(0.02)
+                return render_loaded_group(group)
+            finally:
+                with lock:
+                    running[0] -= 1
+
+        async def render_all():
+            return await asyncio.gather(*[
+                renderer.render(
+                    'line %d\n' % (index),
+                    explicit_lexer_name='TextLexer'
+                )
+                for index in range(6)
+            ])
+
+        with patch(
+            'wotw_highlighter.block_async.render_loaded_group',
+            side_effect=tracked
+        ):
+            blocks = self.run_async(render_all())
+        self.assertEqual(len(blocks), 6)
+        self.assertEqual(running[1], 2)
+
+    def test_cancellation(self):
+        started = Event()
+        release = Event()
+
+        def stalled(group):
+            started.set()
+            release.wait(5)
+            return render_loaded_group(group)
+
+        async def cancel_midway():
+            task = asyncio.ensure_future(self.renderer.render(self.CONTENTS))
+            while not started.is_set():
+                await asyncio.sleep(0.001)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        with patch(
+            'wotw_highlighter.block_async.render_loaded_group',
+            side_effect=stalled
+        ):
+            self.assertTrue(self.run_async(cancel_midway()))
+        release.set()
+        self.assertEqual(self.renderer.limit()._value, 8)
+
+
+class BlockRenderAsyncUnitTests(BlockAsyncTestCase):
+
+    def test_default_renderer(self):
+        async def render():
+            block = await Block.render_async(self.CONTENTS)
+            renderer = AsyncRenderer.default()
+            await AsyncRenderer.close_default()
+            return block, renderer
+
+        block, renderer = self.run_async(render())
+        self.assertIsInstance(renderer, AsyncRenderer)
+        self.assertEqual(block.rendered, Block(self.CONTENTS).rendered)
+
+    def test_awaited_after_being_built(self):
+        rendering = Block.render_async(self.CONTENTS)
+        block = self.run_async(rendering)
+        self.run_async(AsyncRenderer.close_default())
+        self.assertEqual(block.rendered, Block(self.CONTENTS).rendered)
+
+    def test_explicit_renderer(self):
+        renderer = MagicMock()
+        renderer.render.return_value = 'awaitable'
+        self.assertEqual(
+            Block.render_async(self.CONTENTS, renderer=renderer, title='t'),
+            'awaitable'
+        )
+        renderer.render.assert_called_once_with(self.CONTENTS, title='t')
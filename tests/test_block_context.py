@@ -0,0 +1,53 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""Collects tests for BlockContext"""
+
+from unittest import TestCase
+
+from wotw_highlighter.block_context import (
+    BlockContext,
+    OPTION_DEFAULTS,
+    context_option,
+)
+
+
+class ConstructorUnitTests(TestCase):
+
+    def test_defaults(self):
+        context = BlockContext()
+        for option, default in OPTION_DEFAULTS:
+            self.assertEqual(getattr(context, option), default)
+        self.assertEqual(context.validated, set())
+
+    def test_unknown_options_are_refused(self):
+        context = BlockContext()
+        with self.assertRaises(AttributeError):
+            context.zzz = 'qqq'
+
+
+class OptionsUnitTests(TestCase):
+
+    def test_every_option(self):
+        context = BlockContext()
+        context.title = 'title'
+        options = context.options()
+        self.assertEqual(sorted(options), sorted(BlockContext.OPTIONS))
+        self.assertEqual(options['title'], 'title')
+
+
+class ContextOptionUnitTests(TestCase):
+
+    class Holder(object):
+        title = context_option('title')
+
+        def __init__(self, context):
+            self.context = context
+
+    def test_reads_and_writes_the_context(self):
+        context = BlockContext()
+        holder = self.Holder(context)
+        holder.title = 'title'
+        self.assertEqual(context.title, 'title')
+        context.title = 'other'
+        self.assertEqual(holder.title, 'other')
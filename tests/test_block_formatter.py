@@ -0,0 +1,247 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for BlockFormatter"""
+
+from io import StringIO
+from unittest import TestCase
+
+from pygments import highlight
+from pygments.formatters.html import HtmlFormatter
+from pygments.lexers.python import PythonLexer
+
+from wotw_highlighter import BlockFormatter, CssInliner
+from wotw_highlighter.block_formatter import DiffFormatter
+
+
+class CountLinesUnitTests(TestCase):
+
+    SAMPLES = [
+        u'',
+        u'\n',
+        u'\r\n\r\nx',
+        u'a\r\nb\rc\n\n',
+        u'\ufeff\n\nx\n',
+        u'  \n x \n ',
+        u'x',
+    ]
+
+    LEXER_OPTIONS = [
+        {'stripnl': True},
+        {'stripnl': False},
+        {'stripall': True},
+        {'stripnl': False, 'ensurenl': False},
+    ]
+
+    def test_matches_pygments(self):
+        for options in self.LEXER_OPTIONS:
+            lexer = PythonLexer(**options)
+            for sample in self.SAMPLES:
+                self.assertEqual(
+                    BlockFormatter.count_lines(sample, lexer),
+                    sum(
+                        1
+                        for code, _ in HtmlFormatter()._format_lines(  # pylint: disable=W0212
+                            lexer.get_tokens(sample)
+                        )
+                        if code
+                    ),
+                    '%r with %r' % (sample, options)
+                )
+
+
+class BlockFormatterTestCase(TestCase):
+    """Collects common items and defaults across test cases"""
+
+    BLOB = u'import os\n\nprint(os)\n'
+
+    def setUp(self):
+        self.lexer = PythonLexer(stripnl=True)
+
+    def render(self, **options):
+        outfile = StringIO()
+        highlight(
+            self.BLOB,
+            self.lexer,
+            BlockFormatter(lineseparator='<br />', **options),
+            outfile
+        )
+        return outfile.getvalue()
+
+    def expected(self, **options):
+        return highlight(
+            self.BLOB,
+            self.lexer,
+            HtmlFormatter(linenos=True, lineseparator='<br />', **options)
+        )
+
+
+class WrapTableLinenosUnitTests(BlockFormatterTestCase):
+
+    def test_matches_pygments(self):
+        self.assertEqual(
+            self.render(line_count=3),
+            self.expected()
+        )
+
+    def test_counts_when_unknown(self):
+        self.assertEqual(self.render(), self.expected())
+
+    def test_matches_pygments_without_classes(self):
+        self.assertEqual(
+            self.render(line_count=3, noclasses=True),
+            self.expected(noclasses=True)
+        )
+
+    def test_special_lines_without_classes(self):
+        self.assertEqual(
+            self.render(line_count=3, noclasses=True, linenospecial=2),
+            self.expected(noclasses=True, linenospecial=2)
+        )
+
+    def test_header(self):
+        self.assertIn(
+            '<table class="highlighttable"><tr>header</tr><tr><td',
+            self.render(line_count=3, block_header='<tr>header</tr>')
+        )
+
+    def test_without_linenos(self):
+        rendered = self.render(line_count=3, block_linenos=False)
+        self.assertNotIn('linenos', rendered)
+        self.assertIn(
+            '<table class="highlighttable"><tr><td class="code"><div><pre>',
+            rendered
+        )
+
+    def test_batched_linenos(self):
+        formatter = BlockFormatter()
+        formatter.LINENOS_PER_WRITE = 2
+        self.assertEqual(
+            list(formatter.render_linenos(3)),
+            [
+                '<span class="normal">1</span>\n<span class="normal">2</span>',
+                '<span class="normal">3</span>',
+            ]
+        )
+
+
+class FormatUnencodedUnitTests(BlockFormatterTestCase):
+
+    STYLES = '.highlight .kn { color: red }'
+
+    def test_inlined(self):
+        self.assertEqual(
+            self.render(
+                line_count=3,
+                inliner=CssInliner.for_stylesheet(self.STYLES)
+            ),
+            CssInliner(self.STYLES).inline(self.expected())
+        )
+
+
+class FormattedLinesUnitTests(BlockFormatterTestCase):
+
+    def test_format_code_lines(self):
+        lines = BlockFormatter().format_code_lines(
+            self.lexer.get_tokens(self.BLOB)
+        )
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(all(line.endswith('\n') for line in lines))
+        self.assertEqual(lines[1], '\n')
+
+    def test_lays_out_formatted_lines(self):
+        lines = BlockFormatter(lineseparator='<br />').format_code_lines(
+            self.lexer.get_tokens(self.BLOB)
+        )
+        outfile = StringIO()
+        BlockFormatter(
+            lineseparator='<br />',
+            formatted_lines=lines,
+            line_count=3
+        ).format([], outfile)
+        self.assertEqual(outfile.getvalue(), self.expected())
+
+
+class SkipLinesUnitTests(BlockFormatterTestCase):
+
+    def test_skips_lead_in(self):
+        lexer = PythonLexer(stripnl=False)
+        outfile = StringIO()
+        highlight(
+            u'"""\nlead in\n' + u'still a string\n"""\n',
+            lexer,
+            BlockFormatter(skip_lines=2, linenostart=3, line_count=2),
+            outfile
+        )
+        rendered = outfile.getvalue()
+        self.assertNotIn('lead in', rendered)
+        self.assertIn('<span class="sd">still a string</span>', rendered)
+        self.assertIn('<span class="normal">3</span>', rendered)
+        self.assertIn('<span class="normal">4</span>', rendered)
+        self.assertNotIn('<span class="normal">5</span>', rendered)
+
+
+class DiffFormatterUnitTests(TestCase):
+
+    ROWS = [
+        ('equal', 1, 'same\n', 1, 'same\n'),
+        ('delete', 2, 'old\n', None, None),
+        ('insert', None, None, 2, 'new\n'),
+        ('equal', 3, 'end\n', 3, 'end\n'),
+    ]
+
+    SIDE_BY_SIDE_ROWS = [
+        ('equal', 1, 'same\n', 1, 'same\n'),
+        ('replace', 2, 'old\n', 2, 'new\n'),
+        ('insert', None, None, 3, 'more\n'),
+    ]
+
+    def render(self, **options):
+        outfile = StringIO()
+        DiffFormatter(**options).format([], outfile)
+        return outfile.getvalue()
+
+    def test_unified(self):
+        rendered = self.render(diff_rows=self.ROWS)
+        self.assertIn('<table class="highlighttable diff-unified">', rendered)
+        self.assertIn(
+            '<span></span>same\n'
+            '<span class="diff-deleted">old\n</span>'
+            '<span class="diff-inserted">new\n</span>'
+            'end\n',
+            rendered
+        )
+        self.assertIn(
+            '<span class="normal">1 1  </span>\n'
+            '<span class="normal">2   -</span>\n'
+            '<span class="normal">  2 +</span>\n'
+            '<span class="normal">3 3  </span>',
+            rendered
+        )
+
+    def test_side_by_side(self):
+        rendered = self.render(
+            diff_rows=self.SIDE_BY_SIDE_ROWS,
+            diff_view='side-by-side',
+            lineseparator='<br />'
+        )
+        self.assertIn('diff-side-by-side', rendered)
+        self.assertEqual(rendered.count('<td class="linenos">'), 2)
+        self.assertIn(
+            '<span></span>same\n<span class="diff-deleted">old\n</span><br />',
+            rendered
+        )
+        self.assertIn(
+            '<span></span>same\n'
+            '<span class="diff-inserted">new\n</span>'
+            '<span class="diff-inserted">more\n</span>',
+            rendered
+        )
+        self.assertIn(
+            '<span class="normal">2</span>\n<span class="normal"> </span>',
+            rendered
+        )
+
+    def test_without_linenos(self):
+        rendered = self.render(diff_rows=self.ROWS, block_linenos=False)
+        self.assertNotIn('linenos', rendered)
@@ -86,6 +86,13 @@ class RenderVcsBranchTabUnitTestss(BlockHeaderTestCase):
         self.block_header.render_git_ref_name_tab()
         self.mock_construct.assert_called_with(self.branch)
 
+    def test_with_base_branch(self):
+        """Tests rendering the range of a diff"""
+        self.block_header.git_ref_name = self.branch
+        self.block_header.git_base_ref_name = 'base'
+        self.block_header.render_git_ref_name_tab()
+        self.mock_construct.assert_called_with('base..qqq')
+
     def test_without_branch(self):
         """Tests rendering without a branch"""
         self.assertEqual(
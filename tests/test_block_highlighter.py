@@ -8,10 +8,16 @@ from unittest import TestCase
 from mock import call, MagicMock, patch
 from pygments.formatters.html import HtmlFormatter
 from pygments.lexer import Lexer
+from pygments import lexers
 from pygments.lexers.python import PythonLexer
-from pygments.util import ClassNotFound
+from pygments.lexers.special import TextLexer
 
-from wotw_highlighter import BlockHighlighter
+from wotw_highlighter import (
+    BlockHighlighter,
+    BlockStyler,
+    CssInliner,
+    TokenCache,
+)
 
 
 class BlockHighlighterTestCase(TestCase):
@@ -27,14 +33,10 @@ class BlockHighlighterTestCase(TestCase):
         """Constructs a basic loader using only the defaults"""
         # if not kwargs:
         #     kwargs = self.DEFAULT_KWARGS
-        move_patcher = patch.object(
-            BlockHighlighter, 'move_to_working_directory')
-        move_patcher.start()
         validate_patcher = patch.object(BlockHighlighter, 'validate')
         validate_patcher.start()
         self.block_highlighter = BlockHighlighter(*args, **kwargs)
         validate_patcher.stop()
-        move_patcher.stop()
         self.addCleanup(self.wipe_highlighter)
 
 
@@ -62,6 +64,12 @@ class ValidateUnitTests(BlockHighlighterTestCase):
         with self.assertRaisesRegexp(ValueError, 'lexer'):
             self.block_highlighter.validate()
 
+    def test_validate_nonexistent_candidate(self):
+        self.block_highlighter.blob = 'blob'
+        self.block_highlighter.guess_lexer_names = ['PythonLexer', 'qqq']
+        with self.assertRaisesRegexp(ValueError, 'candidate lexer'):
+            self.block_highlighter.validate()
+
 
 class AttachLexerUnitTests(BlockHighlighterTestCase):
 
@@ -84,9 +92,10 @@ class AttachLexerUnitTests(BlockHighlighterTestCase):
         self.block_highlighter.attach_lexer()
         self.assertIsInstance(self.block_highlighter.lexer, Lexer)
 
-    @patch(
-        'wotw_highlighter.block_highlighter.lexers.get_lexer_for_filename',
-        side_effect=ClassNotFound,
+    @patch.object(
+        BlockHighlighter,
+        'find_lexer_class_for_filename',
+        return_value=None
     )
     def test_guess_lexer(self, mock_lexer_call):
         self.block_highlighter.blob = (
@@ -100,26 +109,226 @@ class AttachLexerUnitTests(BlockHighlighterTestCase):
         self.assertIsInstance(self.block_highlighter.lexer, Lexer)
 
 
-class AttachFormatterUnitTests(BlockHighlighterTestCase):
+class FindLexerClassForFilenameUnitTests(BlockHighlighterTestCase):
+
+    FILENAMES = [
+        'test.py',
+        'Makefile',
+        'CMakeLists.txt',
+        'header.h',
+        'archive.tar.gz',
+        'README',
+        'UPPER.PY',
+        'noextension',
+    ]
+
+    def setUp(self):
+        self.build_highlighter()
+        BlockHighlighter.lexer_classes_by_filename.clear()
+
+    def test_matches_pygments(self):
+        for filename in self.FILENAMES:
+            self.assertIs(
+                BlockHighlighter.find_lexer_class_for_filename(
+                    '/some/dir/%s' % (filename)
+                ),
+                lexers.find_lexer_class_for_filename(filename)
+            )
+
+    def test_memoized_by_filename(self):
+        BlockHighlighter.find_lexer_class_for_filename('a/test.py')
+        with patch.object(lexers, 'find_lexer_class') as mock_find:
+            self.assertIs(
+                BlockHighlighter.find_lexer_class_for_filename('b/test.py'),
+                PythonLexer
+            )
+            mock_find.assert_not_called()
+
+
+class GuessLexerClassUnitTests(BlockHighlighterTestCase):
 
     @patch(
-        'wotw_highlighter.block_highlighter.HtmlFormatter'
+        'wotw_highlighter.block_highlighter.lexers.guess_lexer',
+        return_value=PythonLexer()
     )
+    def test_prefix_only(self, mock_guess):
+        self.block_highlighter.blob = 'q' * (
+            BlockHighlighter.GUESS_PREFIX_LENGTH + 10
+        )
+        self.assertIs(self.block_highlighter.guess_lexer_class(), PythonLexer)
+        mock_guess.assert_called_once_with(
+            'q' * BlockHighlighter.GUESS_PREFIX_LENGTH
+        )
+
+    @patch('wotw_highlighter.block_highlighter.lexers.guess_lexer')
+    def test_candidates(self, mock_guess):
+        self.block_highlighter.blob = '#!/usr/bin/env python\nimport os\n'
+        self.block_highlighter.guess_lexer_names = [
+            'JavascriptLexer',
+            'PythonLexer',
+        ]
+        self.assertIs(self.block_highlighter.guess_lexer_class(), PythonLexer)
+        mock_guess.assert_not_called()
+
+    def test_no_candidate_matches(self):
+        self.block_highlighter.blob = 'qqq'
+        self.block_highlighter.guess_lexer_names = ['PythonLexer']
+        self.assertIs(self.block_highlighter.guess_lexer_class(), TextLexer)
+
+
+class LexerInstanceUnitTests(BlockHighlighterTestCase):
+
+    def test_instances_are_shared(self):
+        self.assertIs(
+            BlockHighlighter.lexer_instance(PythonLexer),
+            BlockHighlighter.lexer_instance(PythonLexer)
+        )
+        self.assertTrue(BlockHighlighter.lexer_instance(PythonLexer).stripnl)
+
+    def test_excerpts_keep_blank_lines(self):
+        excerpt_lexer = BlockHighlighter.lexer_instance(PythonLexer, True)
+        self.assertIsNot(
+            excerpt_lexer,
+            BlockHighlighter.lexer_instance(PythonLexer)
+        )
+        self.assertFalse(excerpt_lexer.stripnl)
+
+
+class AttachFormatterUnitTests(BlockHighlighterTestCase):
+
+    def setUp(self):
+        options_patcher = patch.object(
+            BlockHighlighter,
+            'formatter_options',
+            return_value={'line_count': 2}
+        )
+        options_patcher.start()
+        self.addCleanup(options_patcher.stop)
+        self.build_highlighter()
+
+    @patch.object(BlockHighlighter, 'formatter_class')
     def test_formatter(self, mock_formatter):
         self.block_highlighter.attach_formatter()
-        mock_formatter.assert_called_once_with(
-            **BlockHighlighter.DEFAULT_HTMLFORMATTER_OPTIONS
+        options = dict(BlockHighlighter.DEFAULT_HTMLFORMATTER_OPTIONS)
+        options['line_count'] = 2
+        mock_formatter.assert_called_once_with(**options)
+
+    @patch.object(BlockHighlighter, 'formatter_class')
+    def test_inline_token_styles(self, mock_formatter):
+        self.block_highlighter.inline_token_styles = True
+        self.block_highlighter.attach_formatter()
+        options = dict(BlockHighlighter.DEFAULT_HTMLFORMATTER_OPTIONS)
+        options['line_count'] = 2
+        options['noclasses'] = True
+        options['style'] = BlockStyler.dump_token_style()
+        mock_formatter.assert_called_once_with(**options)
+
+
+class CompileHeaderUnitTests(BlockHighlighterTestCase):
+
+    def setUp(self):
+        self.build_highlighter()
+        self.block_highlighter.linenos = True
+        self.block_highlighter.no_header = False
+        self.block_highlighter.blob_path = 'some/path'
+        self.block_highlighter.title = 'title'
+
+    @patch(
+        'wotw_highlighter.block_highlighter.BlockHeader.render_full_header',
+        return_value='<tr>header</tr>'
+    )
+    def test_with_everything(self, mock_header):
+        self.assertEqual(
+            self.block_highlighter.compile_header(),
+            '<tr>header</tr>'
+        )
+
+    def test_without_linenos(self):
+        self.block_highlighter.linenos = False
+        self.assertIsNone(self.block_highlighter.compile_header())
+
+    def test_without_header(self):
+        self.block_highlighter.no_header = True
+        self.assertIsNone(self.block_highlighter.compile_header())
+
+    def test_without_any_title(self):
+        self.block_highlighter.blob_path = None
+        self.block_highlighter.title = None
+        self.assertIsNone(self.block_highlighter.compile_header())
+
+
+class FormatterOptionsUnitTests(BlockHighlighterTestCase):
+
+    def setUp(self):
+        self.build_highlighter()
+        self.block_highlighter.blob = 'one\ntwo\n'
+        self.block_highlighter.lexer = PythonLexer(stripnl=True)
+        header_patcher = patch.object(
+            BlockHighlighter,
+            'compile_header',
+            return_value='<tr>header</tr>'
+        )
+        header_patcher.start()
+        self.addCleanup(header_patcher.stop)
+
+    def test_layout(self):
+        self.block_highlighter.linenos = False
+        self.assertEqual(
+            self.block_highlighter.formatter_options(),
+            {
+                'block_header': '<tr>header</tr>',
+                'block_linenos': False,
+                'line_count': 2,
+            }
         )
 
+    def test_excerpt(self):
+        self.block_highlighter.start_line = 40
+        self.block_highlighter.blob_lead_in = 'lead\r\nin\n'
+        options = self.block_highlighter.formatter_options()
+        self.assertEqual(options['linenostart'], 40)
+        self.assertEqual(options['skip_lines'], 2)
+
+    def test_without_lexer(self):
+        self.block_highlighter.lexer = None
+        self.assertNotIn(
+            'line_count',
+            self.block_highlighter.formatter_options()
+        )
+
+    def test_inline_without_outfile(self):
+        self.block_highlighter.inline_css = True
+        self.block_highlighter.highlighted_blob_styles = 'p { color: red }'
+        self.assertNotIn(
+            'inliner',
+            self.block_highlighter.formatter_options()
+        )
+
+    def test_inliner(self):
+        self.block_highlighter.outfile = MagicMock()
+        self.block_highlighter.inline_css = True
+        self.block_highlighter.highlighted_blob_styles = 'p { color: red }'
+        self.assertIs(
+            self.block_highlighter.formatter_options()['inliner'],
+            CssInliner.for_stylesheet('p { color: red }')
+        )
+
+    def test_inline_without_styles(self):
+        self.block_highlighter.outfile = MagicMock()
+        self.block_highlighter.inline_css = True
+        self.block_highlighter.highlighted_blob_styles = None
+        with self.assertRaisesRegexp(ValueError, 'No styles to inline'):
+            self.block_highlighter.formatter_options()
+
 
 class HighlightUnitTests(BlockHighlighterTestCase):
 
     @patch(
-        'wotw_highlighter.block_highlighter.highlight'
+        'wotw_highlighter.block_highlighter.format_tokens'
     )
-    def test_highlight_call(self, mock_highlight):
+    def test_highlight_call(self, mock_format):
         highlight_ret_val = 'your token string'
-        mock_highlight.return_value = highlight_ret_val
+        mock_format.return_value = highlight_ret_val
         self.block_highlighter.blob = fake_blob = 'qqq'
         self.block_highlighter.lexer = mock_lexer = MagicMock(spec=Lexer)
         self.block_highlighter.formatter = mock_formatter = MagicMock(
@@ -130,12 +339,96 @@ class HighlightUnitTests(BlockHighlighterTestCase):
             self.block_highlighter.highlighted_blob,
             highlight_ret_val
         )
-        mock_highlight.assert_called_once_with(
-            fake_blob,
-            mock_lexer,
+        mock_lexer.get_tokens.assert_called_once_with(fake_blob)
+        mock_format.assert_called_once_with(
+            mock_lexer.get_tokens.return_value,
             mock_formatter
         )
 
+    @patch(
+        'wotw_highlighter.block_highlighter.format_tokens'
+    )
+    def test_highlight_to_outfile(self, mock_format):
+        self.block_highlighter.blob = fake_blob = 'qqq'
+        self.block_highlighter.lexer = mock_lexer = MagicMock(spec=Lexer)
+        self.block_highlighter.formatter = mock_formatter = MagicMock(
+            spec=HtmlFormatter
+        )
+        self.block_highlighter.outfile = mock_outfile = MagicMock()
+        self.block_highlighter.highlighted_blob = None
+        self.block_highlighter.highlight()
+        self.assertIsNone(self.block_highlighter.highlighted_blob)
+        mock_lexer.get_tokens.assert_called_once_with(fake_blob)
+        mock_format.assert_called_once_with(
+            mock_lexer.get_tokens.return_value,
+            mock_formatter,
+            mock_outfile
+        )
+
+    @patch(
+        'wotw_highlighter.block_highlighter.format_tokens'
+    )
+    def test_highlight_lead_in(self, mock_format):
+        self.block_highlighter.blob = 'qqq'
+        self.block_highlighter.blob_lead_in = 'lead in\n'
+        self.block_highlighter.lexer = mock_lexer = MagicMock(spec=Lexer)
+        self.block_highlighter.formatter = MagicMock(spec=HtmlFormatter)
+        self.block_highlighter.highlight()
+        mock_lexer.get_tokens.assert_called_once_with('lead in\nqqq')
+
+
+class TokensUnitTests(BlockHighlighterTestCase):
+
+    BLOB = u'import os\n\n\nprint(os.sep)\n'
+
+    def setUp(self):
+        self.build_highlighter()
+        self.block_highlighter.blob = self.BLOB
+        self.block_highlighter.token_cache = TokenCache()
+        self.block_highlighter.lexer = BlockHighlighter.lexer_instance(
+            PythonLexer
+        )
+
+    def test_misses_then_hits(self):
+        expected = list(self.block_highlighter.lexer.get_tokens(self.BLOB))
+        self.assertEqual(list(self.block_highlighter.tokens()), expected)
+        with patch.object(PythonLexer, 'get_tokens') as mock_get_tokens:
+            self.assertEqual(list(self.block_highlighter.tokens()), expected)
+        mock_get_tokens.assert_not_called()
+
+    def test_hits_match_unnormalized_blobs(self):
+        self.block_highlighter.blob = blob = u'\ufeff\tx = 1\r\n\r\ny = 2'
+        expected = list(self.block_highlighter.lexer.get_tokens(blob))
+        list(self.block_highlighter.tokens())
+        self.assertEqual(list(self.block_highlighter.tokens()), expected)
+
+    def test_misses_are_stored_once_consumed(self):
+        tokens = self.block_highlighter.tokens()
+        self.assertEqual(self.block_highlighter.token_cache.entries, dict())
+        list(tokens)
+        self.assertEqual(len(self.block_highlighter.token_cache.entries), 1)
+
+    def test_observed(self):
+        self.block_highlighter.observer = observer = MagicMock()
+        list(self.block_highlighter.tokens())
+        self.block_highlighter.tokens()
+        self.assertEqual(
+            observer.counted.call_args_list,
+            [call('tokens.miss'), call('tokens.hit')]
+        )
+
+    def test_keyed_by_blob_hash(self):
+        self.block_highlighter.git_blob_hash = 'qqq'
+        self.assertEqual(
+            self.block_highlighter.token_cache_key(self.BLOB)[0],
+            'qqq'
+        )
+        self.block_highlighter.start_line = 2
+        self.assertNotEqual(
+            self.block_highlighter.token_cache_key(self.BLOB)[0],
+            'qqq'
+        )
+
 
 class AttachAndHighlightUnitTests(BlockHighlighterTestCase):
 
@@ -162,3 +455,30 @@ class AttachAndHighlightUnitTests(BlockHighlighterTestCase):
             call.formatter(),
             call.highlight()
         ])
+
+
+class PreprocessUnitTests(BlockHighlighterTestCase):
+
+    TEXTS = [
+        u'',
+        u'\n\nx = 1\n\n',
+        u'\ufeffx = 1\r\ny = 2\rz = 3',
+        u'  \tindented\t\n\n  ',
+    ]
+
+    OPTIONS = [
+        dict(),
+        dict(stripnl=False),
+        dict(stripall=True),
+        dict(tabsize=4, ensurenl=False),
+    ]
+
+    def test_matches_the_lexer(self):
+        for options in self.OPTIONS:
+            self.block_highlighter.lexer = lexer = TextLexer(**options)
+            for text in self.TEXTS:
+                self.assertEqual(
+                    self.block_highlighter.preprocess(text),
+                    u''.join(value for _, value in lexer.get_tokens(text)),
+                    (options, text)
+                )
@@ -4,11 +4,11 @@
 # pylint: disable=W0613
 """This file collects tests for Loader"""
 
-from subprocess import CalledProcessError
 from unittest import TestCase
 from mock import call, MagicMock, patch
 
 from wotw_highlighter import BlockLoader
+from wotw_highlighter.line_index import LineIndex
 
 
 class BlockLoaderTestCase(TestCase):
@@ -28,48 +28,129 @@ class BlockLoaderTestCase(TestCase):
         """Constructs a basic loader using only the defaults"""
         if not kwargs:
             kwargs = self.DEFAULT_KWARGS
-        move_patcher = patch.object(BlockLoader, 'move_to_working_directory')
-        move_patcher.start()
         validate_patcher = patch.object(BlockLoader, 'validate')
         validate_patcher.start()
         self.block_loader = BlockLoader(*args, **kwargs)
         validate_patcher.stop()
-        move_patcher.stop()
         self.addCleanup(self.wipe_loader)
 
+    @staticmethod
+    def skip_ref_cache(mock_repository):
+        """Sends object_info lookups straight to the mocked backend"""
+        mock_repository.return_value.ref_cache.object_info.side_effect = (
+            lambda object_name, resolve: resolve(object_name)
+        )
+
+
+class GitRepositoryUnitTests(BlockLoaderTestCase):
+
+    def setUp(self):
+        self.build_loader()
+
+    @patch('wotw_highlighter.block_loader.GitChannel.for_repository')
+    def test_default_backend(self, mock_for_repository):
+        self.assertEqual(
+            self.block_loader.git_repository(),
+            mock_for_repository.return_value
+        )
+        mock_for_repository.assert_called_once_with(
+            self.BLOB_WORKING_DIRECTORY
+        )
+
+    @patch('wotw_highlighter.block_loader.GitObjectStore.for_repository')
+    def test_python_backend(self, mock_for_repository):
+        self.block_loader.git_backend = 'python'
+        self.assertEqual(
+            self.block_loader.git_repository(),
+            mock_for_repository.return_value
+        )
+        mock_for_repository.assert_called_once_with(
+            self.BLOB_WORKING_DIRECTORY
+        )
+
 
 class ValidateGitDirectory(BlockLoaderTestCase):
 
     def setUp(self):
         self.build_loader()
 
-    @patch('wotw_highlighter.block_loader.check_call')
-    def test_ref_name_that_exists(self, mock_call):  # pylint: disable=W0613
+    @patch.object(BlockLoader, 'git_repository')
+    def test_ref_name_that_exists(self, mock_repository):  # pylint: disable=W0613
+        self.skip_ref_cache(mock_repository)
         self.assertIsNone(self.block_loader.validate_git_directory())
 
-    @patch(
-        'wotw_highlighter.block_loader.check_call',
-        side_effect=CalledProcessError(cmd='', returncode=1)
-    )
-    def test_ref_name_that_doesnt_exist(self, mock_call):  # pylint: disable=W0613
+    @patch.object(BlockLoader, 'git_repository', side_effect=ValueError)
+    def test_ref_name_that_doesnt_exist(self, mock_repository):  # pylint: disable=W0613
         with self.assertRaises(ValueError):
             self.block_loader.validate_git_directory()
 
 
+class QueryGitUnitTests(BlockLoaderTestCase):
+
+    def setUp(self):
+        self.build_loader()
+
+    @patch.object(BlockLoader, 'git_repository')
+    def test_without_observer(self, mock_repository):
+        self.skip_ref_cache(mock_repository)
+        self.assertEqual(
+            self.block_loader.query_git('object_info', 'HEAD'),
+            mock_repository.return_value.object_info.return_value
+        )
+
+    @patch.object(BlockLoader, 'git_repository')
+    def test_object_info_is_cached(self, mock_repository):
+        ref_cache = mock_repository.return_value.ref_cache
+        self.assertEqual(
+            self.block_loader.query_git('object_info', 'HEAD'),
+            ref_cache.object_info.return_value
+        )
+        self.assertEqual(ref_cache.object_info.call_args[0][0], 'HEAD')
+        self.assertFalse(mock_repository.return_value.object_info.called)
+
+    @patch.object(BlockLoader, 'git_repository')
+    def test_with_observer(self, mock_repository):
+        self.skip_ref_cache(mock_repository)
+        repository = mock_repository.return_value
+        repository.process_starts = 1
+
+        def read_object(object_name):
+            repository.process_starts = 2
+            return ('hash', 'blob', b'')
+        repository.read_object.side_effect = read_object
+        self.block_loader.observer = mock_observer = MagicMock()
+        self.assertEqual(
+            self.block_loader.query_git('read_object', 'hash'),
+            ('hash', 'blob', b'')
+        )
+        mock_observer.started.assert_called_once_with('git.read_object')
+        self.assertEqual(
+            mock_observer.finished.call_args[1],
+            {'processes_started': 1}
+        )
+
+
 class ValidateGitRefNameUnitTests(BlockLoaderTestCase):
 
     def setUp(self):
         self.build_loader()
+        self.block_loader.git_ref_name = 'git_ref_name'
 
-    @patch('wotw_highlighter.block_loader.check_call')
-    def test_ref_name_that_exists(self, mock_call):  # pylint: disable=W0613
+    @patch.object(BlockLoader, 'git_repository')
+    def test_ref_name_that_exists(self, mock_repository):  # pylint: disable=W0613
+        self.skip_ref_cache(mock_repository)
+        mock_repository.return_value.object_info.return_value = (
+            'hash', 'commit', 1
+        )
         self.assertIsNone(self.block_loader.validate_git_ref_name())
+        mock_repository.return_value.object_info.assert_called_once_with(
+            'git_ref_name'
+        )
 
-    @patch(
-        'wotw_highlighter.block_loader.check_call',
-        side_effect=CalledProcessError(cmd='', returncode=1)
-    )
-    def test_ref_name_that_doesnt_exist(self, mock_call):  # pylint: disable=W0613
+    @patch.object(BlockLoader, 'git_repository')
+    def test_ref_name_that_doesnt_exist(self, mock_repository):  # pylint: disable=W0613
+        self.skip_ref_cache(mock_repository)
+        mock_repository.return_value.object_info.return_value = None
         with self.assertRaises(ValueError):
             self.block_loader.validate_git_ref_name()
 
@@ -79,15 +160,18 @@ class ValidateGitHashUnitTests(BlockLoaderTestCase):
     def setUp(self):
         self.build_loader()
 
-    @patch('wotw_highlighter.block_loader.check_call')
-    def test_ref_name_that_exists(self, mock_call):  # pylint: disable=W0613
+    @patch.object(BlockLoader, 'git_repository')
+    def test_ref_name_that_exists(self, mock_repository):  # pylint: disable=W0613
+        self.skip_ref_cache(mock_repository)
+        mock_repository.return_value.object_info.return_value = (
+            'some hash', 'blob', 1
+        )
         self.assertIsNone(self.block_loader.validate_git_hash('some hash'))
 
-    @patch(
-        'wotw_highlighter.block_loader.check_call',
-        side_effect=CalledProcessError(cmd='', returncode=1)
-    )
-    def test_ref_name_that_doesnt_exist(self, mock_call):  # pylint: disable=W0613
+    @patch.object(BlockLoader, 'git_repository')
+    def test_ref_name_that_doesnt_exist(self, mock_repository):  # pylint: disable=W0613
+        self.skip_ref_cache(mock_repository)
+        mock_repository.return_value.object_info.return_value = None
         with self.assertRaises(ValueError):
             self.block_loader.validate_git_hash('some hash')
 
@@ -118,6 +202,11 @@ class ValidateUnitTests(BlockLoaderTestCase):
         ):
             self.block_loader.validate()
 
+    def test_unknown_backend(self):
+        self.block_loader.git_backend = 'qqq'
+        with self.assertRaisesRegexp(ValueError, 'is not a git backend'):
+            self.block_loader.validate()
+
     def test_ref_only(self):
         self.block_loader.blob_path = None
         self.block_loader.git_ref_name = 'qqq'
@@ -139,6 +228,18 @@ class ValidateUnitTests(BlockLoaderTestCase):
         self.block_loader.validate()
         self.mock_ref_name.assert_called_once_with()
 
+    def test_git_base_ref_name(self):
+        self.block_loader.git_base_ref_name = 'base'
+        self.block_loader.validate()
+        self.mock_directory.assert_called_once_with()
+        self.mock_ref_name.assert_called_once_with('base')
+
+    def test_git_base_ref_name_with_line_range(self):
+        self.block_loader.git_base_ref_name = 'base'
+        self.block_loader.start_line = 2
+        with self.assertRaisesRegexp(ValueError, 'covers the whole file'):
+            self.block_loader.validate()
+
     def test_git_hash(self):
         self.block_loader.git_ref_hash = 'git_ref_hash'
         self.block_loader.git_blob_hash = 'git_blob_hash'
@@ -155,87 +256,205 @@ class LoadFromFileUnitTests(BlockLoaderTestCase):
 
     def setUp(self):
         self.build_loader()
+        self.block_loader.blob_path = 'path/to/file'
 
-    @patch(
-        'wotw_highlighter.block_loader.open',
-        return_value=MagicMock(
-            read=MagicMock(return_value=FILE_CONTENTS)
-        )
-    )
-    def test_existing_file(self, mock_open):  # pylint: disable=W0613
+    @patch('wotw_highlighter.block_loader.BlobFile')
+    def test_existing_file(self, mock_blob_file):
+        read_excerpt = mock_blob_file.return_value.read_excerpt
+        read_excerpt.return_value = ('', self.FILE_CONTENTS)
         self.block_loader.load_from_file()
         self.assertEqual(self.block_loader.blob, self.FILE_CONTENTS)
+        self.assertIsNone(self.block_loader.blob_lead_in)
+        mock_blob_file.assert_called_once_with(
+            'blob/working/directory/path/to/file'
+        )
+        read_excerpt.assert_called_once_with(None, None, None)
+
+    @patch('wotw_highlighter.block_loader.BlobFile')
+    def test_line_range(self, mock_blob_file):
+        read_excerpt = mock_blob_file.return_value.read_excerpt
+        read_excerpt.return_value = ('lead in', self.FILE_CONTENTS)
+        self.block_loader.start_line = 12
+        self.block_loader.end_line = 60
+        self.block_loader.context_lines = 5
+        self.block_loader.load_from_file()
+        read_excerpt.assert_called_once_with(12, 60, 7)
+        self.assertEqual(self.block_loader.blob_lead_in, 'lead in')
 
-    @patch(
-        'wotw_highlighter.block_loader.open',
-        side_effect=IOError,
-    )
-    def test_nonexistant_file(self, mock_open):  # pylint: disable=W0613
+    @patch('wotw_highlighter.block_loader.BlobFile')
+    def test_nonexistant_file(self, mock_blob_file):
+        mock_blob_file.return_value.read_excerpt.side_effect = IOError
         with self.assertRaises(IOError):
             self.block_loader.load_from_file()
 
 
+class ValidateLineRangeUnitTests(BlockLoaderTestCase):
+
+    def setUp(self):
+        self.build_loader()
+
+    def test_no_range(self):
+        self.block_loader.validate_line_range()
+
+    def test_range(self):
+        self.block_loader.start_line = 2
+        self.block_loader.end_line = 2
+        self.block_loader.validate_line_range()
+
+    def test_not_a_line_number(self):
+        for line in (0, -1, '3'):
+            self.block_loader.start_line = line
+            with self.assertRaisesRegexp(ValueError, 'start_line must be'):
+                self.block_loader.validate_line_range()
+
+    def test_context_lines(self):
+        self.block_loader.context_lines = -1
+        with self.assertRaisesRegexp(ValueError, 'context_lines must be'):
+            self.block_loader.validate()
+
+    def test_out_of_order(self):
+        self.block_loader.start_line = 4
+        self.block_loader.end_line = 3
+        with self.assertRaisesRegexp(ValueError, 'is past end_line'):
+            self.block_loader.validate_line_range()
+
+
+class LeadInLineUnitTests(BlockLoaderTestCase):
+
+    def setUp(self):
+        self.build_loader()
+
+    def lead_in_line(self, start_line, context_lines):
+        self.block_loader.start_line = start_line
+        self.block_loader.context_lines = context_lines
+        return self.block_loader.lead_in_line()
+
+    def test_from_the_top(self):
+        self.assertIsNone(self.lead_in_line(None, None))
+        self.assertIsNone(self.lead_in_line(1, None))
+
+    def test_every_earlier_line(self):
+        self.assertEqual(self.lead_in_line(40, None), 1)
+
+    def test_bounded(self):
+        self.assertEqual(self.lead_in_line(40, 10), 30)
+        self.assertEqual(self.lead_in_line(4, 10), 1)
+
+    def test_no_context(self):
+        self.assertIsNone(self.lead_in_line(40, 0))
+
+
+class SelectLinesUnitTests(BlockLoaderTestCase):
+
+    TEXT = 'one\ntwo\nthree\n'
+
+    def setUp(self):
+        self.build_loader()
+
+    def select(self, start_line, end_line, context_lines=0):
+        self.block_loader.start_line = start_line
+        self.block_loader.end_line = end_line
+        self.block_loader.context_lines = context_lines
+        return self.block_loader.select_lines(self.TEXT)
+
+    def test_everything(self):
+        self.assertEqual(self.select(None, None), self.TEXT)
+        self.assertIsNone(self.block_loader.blob_lead_in)
+
+    def test_ranges(self):
+        self.assertEqual(self.select(2, 2), 'two\n')
+        self.assertEqual(self.select(2, None), 'two\nthree\n')
+        self.assertEqual(self.select(None, 1), 'one\n')
+        self.assertEqual(self.select(3, 9), 'three\n')
+
+    def test_past_the_end(self):
+        self.assertEqual(self.select(9, None), '')
+
+    def test_lead_in(self):
+        self.assertEqual(self.select(3, 3, None), 'three\n')
+        self.assertEqual(self.block_loader.blob_lead_in, 'one\ntwo\n')
+        self.assertEqual(self.select(3, 3, 1), 'three\n')
+        self.assertEqual(self.block_loader.blob_lead_in, 'two\n')
+
+    def test_decoded(self):
+        self.block_loader.start_line = 2
+        self.block_loader.context_lines = None
+        self.assertEqual(
+            self.block_loader.select_lines(
+                b'one\ntwo\n',
+                LineIndex(),
+                lambda contents: contents.decode('utf-8')
+            ),
+            u'two\n'
+        )
+        self.assertEqual(self.block_loader.blob_lead_in, u'one\n')
+
+
+class TreePathUnitTests(BlockLoaderTestCase):
+
+    def setUp(self):
+        self.build_loader()
+
+    def test_relative_path(self):
+        self.block_loader.blob_path = 'path/to/file'
+        self.assertEqual(self.block_loader.tree_path(), './path/to/file')
+
+    def test_absolute_path(self):
+        self.block_loader.blob_working_directory = '/repo'
+        self.block_loader.blob_path = '/repo/path/to/file'
+        self.assertEqual(self.block_loader.tree_path(), 'path/to/file')
+
+
 class DiscoverBlobHashUnitTests(BlockLoaderTestCase):
 
     GIT_HASH = 'qqq'
 
     def setUp(self):
+        repository_patcher = patch.object(BlockLoader, 'git_repository')
+        self.mock_repository = repository_patcher.start()
+        self.addCleanup(repository_patcher.stop)
+        self.skip_ref_cache(self.mock_repository)
+        self.mock_object_info = self.mock_repository.return_value.object_info
+        self.mock_object_info.return_value = (self.GIT_HASH, 'blob', 10)
         self.build_loader()
         self.block_loader.git_ref_name = None
         self.block_loader.git_ref_hash = None
         self.block_loader.git_blob_hash = None
         self.block_loader.blob_path = None
 
-    @patch(
-        'wotw_highlighter.block_loader.check_output',
-    )
-    def test_with_blob_hash(self, mock_check_output):
+    def test_with_blob_hash(self):
         self.block_loader.git_blob_hash = self.GIT_HASH
         self.block_loader.discover_blob_hash()
-        self.assertFalse(mock_check_output.called)
+        self.assertFalse(self.mock_object_info.called)
         self.assertEqual(self.block_loader.git_blob_hash, self.GIT_HASH)
 
-    @patch(
-        'wotw_highlighter.block_loader.check_output',
-        return_value='mode type %s' % (GIT_HASH)
-    )
-    def test_with_ref_name_and_blob_path(self, mock_check_output):
+    def test_with_ref_name_and_blob_path(self):
         self.block_loader.git_ref_name = 'git_ref_name'
         self.block_loader.blob_path = 'blob_path'
         self.block_loader.discover_blob_hash()
-        mock_check_output.assert_called_once_with(
-            ['git', 'ls-tree', 'git_ref_name', 'blob_path'],
+        self.mock_object_info.assert_called_once_with(
+            'git_ref_name:./blob_path'
         )
         self.assertEqual(self.block_loader.git_blob_hash, self.GIT_HASH)
 
-    @patch(
-        'wotw_highlighter.block_loader.check_output',
-        return_value='mode type %s' % (GIT_HASH)
-    )
-    def test_with_ref_hash_and_blob_path(self, mock_check_output):
+    def test_with_ref_hash_and_blob_path(self):
         self.block_loader.git_ref_hash = 'git_ref_hash'
         self.block_loader.blob_path = 'blob_path'
         self.block_loader.discover_blob_hash()
-        mock_check_output.assert_called_once_with(
-            ['git', 'ls-tree', 'git_ref_hash', 'blob_path'],
+        self.mock_object_info.assert_called_once_with(
+            'git_ref_hash:./blob_path'
         )
         self.assertEqual(self.block_loader.git_blob_hash, self.GIT_HASH)
 
-    @patch(
-        'wotw_highlighter.block_loader.check_output',
-        side_effect=CalledProcessError(cmd='', returncode=1)
-    )
-    def test_failed_process(self, mock_check_output):
+    def test_missing_blob(self):
+        self.mock_object_info.return_value = None
         self.block_loader.git_ref_hash = 'git_ref_hash'
         self.block_loader.blob_path = 'blob_path'
         with self.assertRaisesRegexp(ValueError, 'Ref.*?does not contain'):
             self.block_loader.discover_blob_hash()
 
-    @patch(
-        'wotw_highlighter.block_loader.check_output',
-        return_value='',
-    )
-    def test_empty_ls_tree(self, mock_check_output):
+    def test_path_is_not_a_blob(self):
+        self.mock_object_info.return_value = (self.GIT_HASH, 'tree', 10)
         self.block_loader.git_ref_hash = 'git_ref_hash'
         self.block_loader.blob_path = 'blob_path'
         with self.assertRaisesRegexp(ValueError, 'Ref.*?does not contain'):
@@ -258,26 +477,48 @@ class LoadFromGitUnitTests(BlockLoaderTestCase):
         )
         self.mock_discover = discover_patcher.start()
         self.addCleanup(discover_patcher.stop)
+        repository_patcher = patch.object(BlockLoader, 'git_repository')
+        self.mock_repository = repository_patcher.start()
+        self.addCleanup(repository_patcher.stop)
+        self.mock_read = self.mock_repository.return_value.read_object
+        self.mock_read.return_value = (
+            self.BLOB_HASH,
+            'blob',
+            self.BLOB_CONTENTS.encode('utf-8')
+        )
         self.build_loader()
         self.block_loader.git_blob_hash = None
 
-    @patch(
-        'wotw_highlighter.block_loader.check_output',
-    )
-    def test_blob_hash_discovery(self, mock_check_output):
+    def test_blob_hash_discovery(self):
         self.assertIsNone(self.block_loader.git_blob_hash)
         self.block_loader.load_from_git()
         self.assertEqual(self.block_loader.git_blob_hash, self.BLOB_HASH)
+        self.mock_read.assert_called_once_with(self.BLOB_HASH)
 
-    @patch(
-        'wotw_highlighter.block_loader.check_output',
-        return_value=BLOB_CONTENTS,
-    )
-    def test_blob_assignment(self, mock_check_output):
+    def test_blob_assignment(self):
         self.assertIsNone(self.block_loader.blob)
         self.block_loader.load_from_git()
         self.assertEqual(self.block_loader.blob, self.BLOB_CONTENTS)
 
+    def test_unreadable_blob(self):
+        self.mock_read.return_value = None
+        with self.assertRaisesRegexp(ValueError, 'Unable to read'):
+            self.block_loader.load_from_git()
+
+    @patch.object(LineIndex, 'for_key', return_value=LineIndex())
+    def test_line_range(self, mock_for_key):
+        self.mock_read.return_value = (
+            self.BLOB_HASH,
+            'blob',
+            b'one\ntwo\nthree\n'
+        )
+        self.block_loader.start_line = 2
+        self.block_loader.end_line = 2
+        self.block_loader.load_from_git()
+        self.assertEqual(self.block_loader.blob, u'two\n')
+        self.assertEqual(self.block_loader.blob_lead_in, u'one\n')
+        mock_for_key.assert_called_once_with(('git', self.BLOB_HASH))
+
 
 class ParseRawAsOptionsUnitTests(BlockLoaderTestCase):
 
@@ -340,6 +581,50 @@ class ParseRawAsOptionsUnitTests(BlockLoaderTestCase):
         self.assertEqual(self.block_loader.blob, raw_code)
 
 
+class LoadBaseFromGitUnitTests(BlockLoaderTestCase):
+
+    def setUp(self):
+        self.build_loader()
+        self.block_loader.blob_path = 'main.py'
+        self.block_loader.git_base_ref_name = 'v1.0.0'
+        query_patcher = patch.object(BlockLoader, 'query_git')
+        self.mock_query = query_patcher.start()
+        self.addCleanup(query_patcher.stop)
+
+    def test_loads_base(self):
+        self.mock_query.side_effect = [
+            ('base hash', 'blob', 3),
+            ('base hash', 'blob', b'old'),
+        ]
+        self.assertEqual(self.block_loader.load_base_from_git(), u'old')
+        self.assertEqual(self.block_loader.git_base_blob_hash, 'base hash')
+        self.assertEqual(
+            self.mock_query.call_args_list,
+            [
+                call('object_info', 'v1.0.0:./main.py'),
+                call('read_object', 'base hash'),
+            ]
+        )
+
+    def test_new_file(self):
+        self.mock_query.return_value = None
+        self.assertEqual(self.block_loader.load_base_from_git(), u'')
+        self.assertEqual(
+            self.block_loader.git_base_blob_hash,
+            BlockLoader.EMPTY_BLOB_HASH
+        )
+
+    def test_not_a_blob(self):
+        self.mock_query.return_value = ('tree hash', 'tree', 3)
+        with self.assertRaisesRegexp(ValueError, 'does not contain blob'):
+            self.block_loader.load_base_from_git()
+
+    def test_needs_a_path(self):
+        self.block_loader.blob_path = None
+        with self.assertRaisesRegexp(ValueError, 'needs a blob path'):
+            self.block_loader.load_base_from_git()
+
+
 class LoadUnitTests(BlockLoaderTestCase):
 
     RAW_INPUT = 'raw is war'
@@ -404,6 +689,13 @@ class LoadUnitTests(BlockLoaderTestCase):
         self.mock_load_git.assert_called_once_with()
         self.mock_load_file.assert_called_once_with()
 
+    @patch.object(BlockLoader, 'load_base_from_git')
+    def test_loads_base_after_blob(self, mock_load_base):
+        self.block_loader.blob = self.RAW_INPUT
+        self.block_loader.git_base_ref_name = 'base'
+        self.assertEqual(self.block_loader.load(), self.RAW_INPUT)
+        mock_load_base.assert_called_once_with()
+
     def test_everything_failed(self):
         self.block_loader.raw = None
         self.mock_load_git.side_effect = ValueError
@@ -0,0 +1,83 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for BlockObserver and TimingAggregator"""
+
+from io import StringIO
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from wotw_highlighter import BlockObserver, TimingAggregator
+from wotw_highlighter.block_observer import observed
+
+
+class ObservedUnitTests(TestCase):
+
+    def test_without_observer(self):
+        with observed(None, 'load', bytes_in=1) as details:
+            details['bytes_out'] = 2
+        self.assertEqual(details, {'bytes_in': 1, 'bytes_out': 2})
+
+    @patch(
+        'wotw_highlighter.block_observer.CLOCK',
+        side_effect=[10.0, 12.5]
+    )
+    def test_with_observer(self, mock_clock):
+        observer = MagicMock(spec=BlockObserver)
+        with observed(observer, 'load') as details:
+            details['bytes_in'] = 3
+        observer.started.assert_called_once_with('load')
+        observer.finished.assert_called_once_with('load', 2.5, bytes_in=3)
+
+    def test_failures_are_still_reported(self):
+        observer = MagicMock(spec=BlockObserver)
+        with self.assertRaises(ValueError):
+            with observed(observer, 'load'):
+                raise ValueError
+        self.assertEqual(observer.finished.call_count, 1)
+
+
+class BlockObserverUnitTests(TestCase):
+
+    def test_no_op(self):
+        observer = BlockObserver()
+        self.assertIsNone(observer.started('load'))
+        self.assertIsNone(observer.finished('load', 1.0, bytes_in=1))
+        self.assertIsNone(observer.counted('cache.hit'))
+
+
+class TimingAggregatorUnitTests(TestCase):
+
+    def setUp(self):
+        self.aggregator = TimingAggregator()
+        for duration in range(1, 101):
+            self.aggregator.finished('highlight', duration / 1000.0, bytes_out=2)
+        self.aggregator.counted('cache.hit')
+        self.aggregator.counted('cache.hit')
+
+    def test_summary(self):
+        summary = self.aggregator.summary()['highlight']
+        self.assertEqual(summary['count'], 100)
+        self.assertAlmostEqual(summary['p50'], 0.05)
+        self.assertAlmostEqual(summary['p90'], 0.09)
+        self.assertAlmostEqual(summary['p99'], 0.099)
+        self.assertAlmostEqual(summary['max'], 0.1)
+
+    def test_counters(self):
+        self.assertEqual(
+            self.aggregator.counters,
+            {'cache.hit': 2, 'highlight.bytes_out': 200}
+        )
+
+    def test_percentile_of_one(self):
+        self.assertEqual(TimingAggregator.percentile([3], 99), 3)
+
+    def test_print_summary(self):
+        output = StringIO()
+        self.aggregator.print_summary(output)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith('event'))
+        self.assertTrue(lines[1].startswith('highlight'))
+        self.assertIn('50.000', lines[1])
+        self.assertTrue(lines[2].startswith('cache.hit'))
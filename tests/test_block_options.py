@@ -27,17 +27,11 @@ class BlockOptionsTestCase(TestCase):
         self.mock_update = self.update_patch.start()
         self.validate_patch = patch.object(BlockOptions, 'validate')
         self.mock_validate = self.validate_patch.start()
-        self.move_patch = patch.object(
-            BlockOptions,
-            'move_to_working_directory'
-        )
-        self.mock_move = self.move_patch.start()
 
     def schedule_ctor_patch_cleanup(self):
         """Defers removing the patch"""
         self.addCleanup(self.update_patch.stop)
         self.addCleanup(self.validate_patch.stop)
-        self.addCleanup(self.move_patch.stop)
 
     def construct_options(self, *args, **kwargs):
         getcwd_patch = patch(
@@ -57,7 +51,6 @@ class BlockOptionsTestCase(TestCase):
         self.construct_options(*args, **kwargs)
         self.update_patch.stop()
         self.validate_patch.stop()
-        self.move_patch.stop()
 
     def build_options_retain_mocks(self, *args, **kwargs):
         """
@@ -71,19 +64,35 @@ class BlockOptionsTestCase(TestCase):
 class ConstructorUnitTests(BlockOptionsTestCase):
     """Tests the constructor"""
 
-    def test_move_then_validate(self):
+    def test_update_then_validate(self):
         """Ensures the validate method is called"""
         mock_holder = MagicMock()
         self.patch_ctor_methods()
-        mock_holder.attach_mock(self.mock_move, 'move')
+        mock_holder.attach_mock(self.mock_update, 'update')
         mock_holder.attach_mock(self.mock_validate, 'validate')
-        self.construct_options()
+        self.construct_options(title='title')
         self.schedule_ctor_patch_cleanup()
         mock_holder.assert_has_calls([
-            call.move(),
+            call.update(title='title'),
             call.validate()
         ])
 
+    @patch('os.chdir')
+    def test_working_directory_is_untouched(self, mock_chdir):
+        self.construct_options(blob_working_directory='elsewhere')
+        self.assertFalse(mock_chdir.called)
+        self.assertEqual(
+            self.block_options.blob_working_directory,
+            'elsewhere'
+        )
+
+    def test_default_working_directory(self):
+        self.construct_options()
+        self.assertEqual(
+            self.block_options.blob_working_directory,
+            self.LAUNCH_DIRECTORY
+        )
+
     def test_setting_raw(self):
         raw_args = 'raw is war'
         self.build_options_retain_mocks(raw_args)
@@ -93,9 +102,6 @@ class ConstructorUnitTests(BlockOptionsTestCase):
 class UpdateOptionsUnitTests(BlockOptionsTestCase):
 
     def setUp(self):
-        chdir_patch = patch('wotw_highlighter.block_options.chdir')
-        self.mock_chdir = chdir_patch.start()
-        self.addCleanup(chdir_patch.stop)
         self.build_options()
 
     def test_consumed_options(self):
@@ -118,19 +124,6 @@ class UpdateOptionsUnitTests(BlockOptionsTestCase):
         self.assertFalse(hasattr(self.block_options, ignored_option))
 
 
-class MoveToWorkingDirectoryUnitTests(BlockOptionsTestCase):
-
-    def setUp(self):
-        chdir_patch = patch('wotw_highlighter.block_options.chdir')
-        self.mock_chdir = chdir_patch.start()
-        self.addCleanup(chdir_patch.stop)
-        self.build_options()
-
-    def test_proper_directory_applied(self):
-        self.block_options.return_to_launch_directory()
-        self.mock_chdir.assert_called_once_with(self.LAUNCH_DIRECTORY)
-
-
 class ValidateUnitTests(BlockOptionsTestCase):
     """Tests the empty validate method"""
 
@@ -160,14 +153,30 @@ class FullOptionsUnitTests(BlockOptionsTestCase):
         self.assertEqual(returned_options['title'], self.DEFAULT_VALUE)
 
 
-class ReturnToOriginalDirectoryUnitTests(BlockOptionsTestCase):
+class ForContextUnitTests(BlockOptionsTestCase):
 
     def setUp(self):
-        chdir_patch = patch('wotw_highlighter.block_options.chdir')
-        self.mock_chdir = chdir_patch.start()
-        self.addCleanup(chdir_patch.stop)
-        self.build_options()
-
-    def test_proper_directory_applied(self):
-        self.block_options.return_to_launch_directory()
-        self.mock_chdir.assert_called_once_with(self.LAUNCH_DIRECTORY)
+        self.build_options(title='title')
+
+    def test_shares_the_context(self):
+        shared = BlockOptions.for_context(self.block_options.context)
+        self.assertIs(shared.context, self.block_options.context)
+        shared.title = self.DEFAULT_VALUE
+        self.assertEqual(self.block_options.title, self.DEFAULT_VALUE)
+
+    @patch.object(BlockOptions, 'validate')
+    def test_validates_once_per_context(self, mock_validate):
+        context = self.block_options.context
+        context.validated.clear()
+        BlockOptions.for_context(context)
+        BlockOptions.for_context(context)
+        mock_validate.assert_called_once_with()
+
+    @patch.object(BlockOptions, 'validate', side_effect=ValueError)
+    def test_failures_are_not_remembered(self, mock_validate):
+        context = self.block_options.context
+        context.validated.clear()
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                BlockOptions.for_context(context)
+        self.assertEqual(mock_validate.call_count, 2)
@@ -6,9 +6,11 @@
 
 # from subprocess import CalledProcessError
 from unittest import TestCase
-from mock import MagicMock, patch
+from mock import patch
 
-from wotw_highlighter import BlockStyler
+from pygments.token import Comment, Generic, Name
+
+from wotw_highlighter import BlockStyler, CssInliner
 
 
 class BlockStylerTestCase(TestCase):
@@ -23,13 +25,10 @@ class BlockStylerTestCase(TestCase):
 
     def build_styler(self, *args, **kwargs):
         """Constructs a basic styler using only the defaults"""
-        move_patcher = patch.object(BlockStyler, 'move_to_working_directory')
-        move_patcher.start()
         validate_patcher = patch.object(BlockStyler, 'validate')
         validate_patcher.start()
         self.block_styler = BlockStyler(*args, **kwargs)
         validate_patcher.stop()
-        move_patcher.stop()
         self.addCleanup(self.wipe_styler)
 
 
@@ -37,62 +36,61 @@ class DumpPygmentsStyles(BlockStylerTestCase):
     FILE_CONTENTS = 'qqq'
 
     @patch(
-        'wotw_highlighter.block_styler.open',
-        return_value=MagicMock(
-            __enter__=MagicMock(
-                return_value=MagicMock(
-                    read=MagicMock(return_value=FILE_CONTENTS)
-                )
-            )
-        )
+        'wotw_highlighter.block_styler.StylesheetRegistry.stylesheet',
+        return_value=FILE_CONTENTS
     )
     @patch(
         'wotw_highlighter.block_styler.dirname',
         return_value=''
     )
-    def test_pygments_dump(self, mock_dirname, mock_open):  # pylint: disable=W0613
+    def test_pygments_dump(self, mock_dirname, mock_stylesheet):  # pylint: disable=W0613
         self.assertEqual(
             BlockStyler.dump_pygments_styles(),
             self.FILE_CONTENTS
         )
-        mock_open.assert_called_once_with('data/pygments-monokai.css', 'r')
+        mock_stylesheet.assert_called_once_with('data/pygments-monokai.css')
 
 
 class DumpAdditionalStyles(BlockStylerTestCase):
     FILE_CONTENTS = 'qqq'
 
     @patch(
-        'wotw_highlighter.block_styler.open',
-        return_value=MagicMock(
-            __enter__=MagicMock(
-                return_value=MagicMock(
-                    read=MagicMock(return_value=FILE_CONTENTS)
-                )
-            )
-        )
+        'wotw_highlighter.block_styler.StylesheetRegistry.stylesheet',
+        return_value=FILE_CONTENTS
     )
     @patch(
         'wotw_highlighter.block_styler.dirname',
         return_value=''
     )
-    def test_additions_dump(self, mock_dirname, mock_open):  # pylint: disable=W0613
+    def test_additions_dump(self, mock_dirname, mock_stylesheet):  # pylint: disable=W0613
         self.assertEqual(
             BlockStyler.dump_additional_styles(),
             self.FILE_CONTENTS
         )
-        mock_open.assert_called_once_with(
-            'data/pygments-monokai-additions.css', 'r')
+        mock_stylesheet.assert_called_once_with(
+            'data/pygments-monokai-additions.css')
 
 
 class DumpStyles(BlockStylerTestCase):
     FILE_CONTENTS = 'qqq'
 
-    @patch.object(BlockStyler, 'dump_additional_styles')
-    @patch.object(BlockStyler, 'dump_pygments_styles')
-    def test_full_dump(self, mock_pygment, mock_additional):  # pylint: disable=W0613
-        BlockStyler.dump_styles()
-        mock_pygment.assert_called_once_with()
-        mock_additional.assert_called_once_with()
+    @patch(
+        'wotw_highlighter.block_styler.StylesheetRegistry.stylesheet',
+        return_value=FILE_CONTENTS
+    )
+    @patch(
+        'wotw_highlighter.block_styler.dirname',
+        return_value=''
+    )
+    def test_full_dump(self, mock_dirname, mock_stylesheet):  # pylint: disable=W0613
+        self.assertEqual(BlockStyler.dump_styles(), self.FILE_CONTENTS)
+        mock_stylesheet.assert_called_once_with(
+            'data/pygments-monokai.css',
+            'data/pygments-monokai-additions.css'
+        )
+
+    def test_same_object_every_time(self):
+        self.assertIs(BlockStyler.dump_styles(), BlockStyler.dump_styles())
 
 
 class SetStyles(BlockStylerTestCase):
@@ -107,3 +105,67 @@ class SetStyles(BlockStylerTestCase):
             self.block_styler.highlighted_blob_styles,
             self.STYLES
         )
+
+    @patch.object(BlockStyler, 'dump_additional_styles', return_value=STYLES)
+    @patch.object(BlockStyler, 'dump_styles')
+    def test_inline_token_styles(self, mock_dump, mock_additional):  # pylint: disable=W0613
+        self.block_styler.inline_token_styles = True
+        self.block_styler.set_styles()
+        mock_dump.assert_not_called()
+        self.assertEqual(
+            self.block_styler.highlighted_blob_styles,
+            self.STYLES
+        )
+
+
+class ConvertDeclarationUnitTests(BlockStylerTestCase):
+
+    def test_conversions(self):
+        self.assertEqual(
+            BlockStyler.convert_declaration('color', '#fff'),
+            '#fff'
+        )
+        self.assertEqual(
+            BlockStyler.convert_declaration('background-color', '#fff'),
+            'bg:#fff'
+        )
+        self.assertEqual(
+            BlockStyler.convert_declaration('font-weight', 'bold'),
+            'bold'
+        )
+        self.assertIsNone(
+            BlockStyler.convert_declaration('border', 'none')
+        )
+
+
+class BuildTokenStyleUnitTests(BlockStylerTestCase):
+    STYLESHEET = (
+        '.highlight .c1 { color: #75715e }'
+        '.highlight .gh, .highlight .gs { font-weight: bold }'
+        '.highlight .gh { color: #66d9ef }'
+        '.highlight .hll { background-color: #49483e }'
+        'div.highlight { color: #f8f8f2 }'
+    )
+
+    def test_token_styles(self):
+        style = BlockStyler.build_token_style(
+            CssInliner(self.STYLESHEET).rules
+        )
+        self.assertEqual(style.style_for_token(Comment.Single)['color'], '75715e')
+        self.assertEqual(
+            style.style_for_token(Generic.Heading)['color'],
+            '66d9ef'
+        )
+        self.assertTrue(style.style_for_token(Generic.Heading)['bold'])
+        self.assertTrue(style.style_for_token(Generic.Strong)['bold'])
+        self.assertIsNone(style.style_for_token(Name)['color'])
+        self.assertEqual(
+            style.background_color,
+            BlockStyler.TOKEN_STYLE_BACKGROUND
+        )
+
+    def test_bundled_style_is_built_once(self):
+        self.assertIs(
+            BlockStyler.dump_token_style(),
+            BlockStyler.dump_token_style()
+        )
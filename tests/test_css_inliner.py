@@ -0,0 +1,174 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for CssInliner"""
+
+from re import sub
+from unittest import TestCase, skipIf
+
+from wotw_highlighter import BlockStyler, CssInliner
+
+try:
+    from lxml.html import fromstring
+    from premailer import Premailer
+except ImportError:
+    Premailer = None
+
+
+class CssInlinerTestCase(TestCase):
+    """Collects common items and defaults across test cases"""
+
+    STYLESHEET = (
+        '/* comment */'
+        'p { color: #888888; margin: 0px }'
+        '.outer p { color: red }'
+        'div > .inner { font-family: a,"b c" ,d; font-size: .9em }'
+        'td.code { width: 100px; text-align: left }'
+        'p:hover { color: blue }'
+        '* { color: green }'
+        '#only { color: black !important }'
+    )
+
+    def setUp(self):
+        self.inliner = CssInliner(self.STYLESHEET)
+
+
+class NormalizeValueUnitTests(TestCase):
+
+    def test_hex_is_shortened(self):
+        self.assertEqual(CssInliner.normalize_value('#888888'), '#888')
+        self.assertEqual(CssInliner.normalize_value('#888889'), '#888889')
+
+    def test_commas_are_spaced(self):
+        self.assertEqual(
+            CssInliner.normalize_value('a,"b,c" ,d'),
+            'a, "b,c", d'
+        )
+
+    def test_numbers(self):
+        self.assertEqual(CssInliner.normalize_value('.9em'), '0.9em')
+        self.assertEqual(CssInliner.normalize_value('0px 10px'), '0 10px')
+        self.assertEqual(CssInliner.normalize_value('10px'), '10px')
+
+
+class ParseStylesheetUnitTests(CssInlinerTestCase):
+
+    def test_uninlinable_rules_are_dropped(self):
+        self.assertEqual(len(self.inliner.rules), 5)
+
+    def test_specificity_order(self):
+        self.assertEqual(
+            [pairs[0] for _, pairs in self.inliner.rules],
+            [
+                ('color', '#888'),
+                ('color', 'red'),
+                ('font-family', 'a, "b c", d'),
+                ('width', '100px'),
+                ('color', 'black !important'),
+            ]
+        )
+
+
+class InlineUnitTests(CssInlinerTestCase):
+
+    def test_merging(self):
+        self.assertEqual(
+            self.inliner.inline('<div class="outer"><p>text</p></div>'),
+            '<div class="outer"><p style="color:red; margin:0">text</p></div>'
+        )
+
+    def test_child_combinator(self):
+        self.assertEqual(
+            self.inliner.inline(
+                '<div><span class="inner">a</span></div>'
+                '<p><span class="inner">b</span></p>'
+            ),
+            '<div><span class="inner" '
+            'style=\'font-family:a, "b c", d; font-size:0.9em\'>a</span></div>'
+            '<p style="color:#888; margin:0"><span class="inner">b</span></p>'
+        )
+
+    def test_existing_style_wins(self):
+        self.assertEqual(
+            self.inliner.inline('<p style="color: blue">text</p>'),
+            '<p style="color:blue; margin:0">text</p>'
+        )
+
+    def test_basic_attributes(self):
+        self.assertEqual(
+            self.inliner.inline('<td class="code">a</td>'),
+            '<td class="code" style="width:100px; text-align:left" '
+            'width="100" align="left">a</td>'
+        )
+
+    def test_important(self):
+        self.assertEqual(
+            self.inliner.inline('<p id="only">text</p>'),
+            '<p id="only" style="color:black !important; margin:0">text</p>'
+        )
+
+    def test_void_elements_are_not_ancestors(self):
+        self.assertEqual(
+            self.inliner.inline('<div><br /><span class="inner">a</span></div>'),
+            self.inliner.inline('<div><span class="inner">a</span></div>')
+            .replace('<div>', '<div><br />')
+        )
+
+
+class StreamUnitTests(CssInlinerTestCase):
+
+    def test_split_tags(self):
+        markup = '<div class="outer"><p>text</p></div>'
+        stream = self.inliner.stream()
+        chunks = [
+            stream.feed(markup[index:index + 5])
+            for index in range(0, len(markup), 5)
+        ]
+        chunks.append(stream.close())
+        self.assertEqual(''.join(chunks), self.inliner.inline(markup))
+
+
+class ForStylesheetUnitTests(TestCase):
+
+    def test_compiled_once(self):
+        self.assertIs(
+            CssInliner.for_stylesheet('p { color: red }'),
+            CssInliner.for_stylesheet('p { color: red }')
+        )
+
+
+@skipIf(Premailer is None, 'premailer is not installed')
+class PremailerParityUnitTests(TestCase):
+
+    BLOB = (
+        '<div class="highlight"><table class="highlighttable"><tr>'
+        '<td class="linenos"><div class="linenodiv"><pre>'
+        '<span class="normal">1</span></pre></div></td>'
+        '<td class="code"><div><pre><span></span>'
+        '<span class="kn">import</span> <span class="nn">os</span><br />'
+        '<span class="c1"># &quot;quoted&quot;</span>'
+        '</pre></div></td></tr></table></div>'
+    )
+
+    @staticmethod
+    def elements(markup):
+        return [
+            (element.tag, sorted(element.attrib.items()))
+            for element in fromstring('<div>%s</div>' % (markup)).iter()
+        ]
+
+    def test_bundled_styles(self):
+        styles = BlockStyler.dump_styles()
+        expected = sub(
+            r'^[\s\S]*?<body>([\s\S]*?)</body>[\s\S]*$',
+            r'\1',
+            Premailer(
+                '<html><head><style>%s</style></head><body>%s</body></html>'
+                % (styles, self.BLOB),
+                disable_validation=True
+            ).transform()
+        )
+        self.assertEqual(
+            self.elements(CssInliner(styles).inline(self.BLOB)),
+            self.elements(expected)
+        )
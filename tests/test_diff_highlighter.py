@@ -0,0 +1,256 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for DiffHighlighter"""
+
+from os.path import join
+from shutil import rmtree
+from subprocess import check_call, check_output
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from mock import patch
+
+from wotw_highlighter import Block, BlockHighlighter, MemoryRenderCache
+from wotw_highlighter.diff_highlighter import DiffHighlighter
+
+
+class DiffHighlighterTestCase(TestCase):
+    """Collects common items and defaults across test cases"""
+
+    BASE = (
+        'import os\n'
+        '\n'
+        'def main():\n'
+        '    print(os.getcwd())\n'
+    )
+
+    BLOB = (
+        'import os\n'
+        'x = """\n'
+        '\n'
+        'def main():\n'
+        '    print(os.getcwd())\n'
+    )
+
+    LEXER = 'PythonLexer'
+
+    def build(self, base_blob=None, blob=None, **kwargs):
+        self.highlighter = DiffHighlighter(
+            base_blob=self.BASE if base_blob is None else base_blob,
+            blob=self.BLOB if blob is None else blob,
+            explicit_lexer_name=self.LEXER,
+            **kwargs
+        )
+        self.highlighter.attach_lexer()
+        self.highlighter.attach_formatter()
+        return self.highlighter
+
+    @classmethod
+    def lines(cls, blob):
+        highlighter = BlockHighlighter(
+            blob=blob,
+            explicit_lexer_name=cls.LEXER,
+            start_line=1
+        )
+        highlighter.attach_and_highlight()
+        return highlighter.formatter.format_code_lines(
+            highlighter.lexer.get_tokens(blob)
+        )
+
+
+class ValidateUnitTests(DiffHighlighterTestCase):
+
+    def test_needs_base(self):
+        with self.assertRaisesRegexp(ValueError, 'No base_blob'):
+            DiffHighlighter(blob=self.BLOB)
+
+    def test_unknown_view(self):
+        with self.assertRaisesRegexp(ValueError, 'is not a diff view'):
+            self.build(diff_view='qqq')
+
+
+class DiffRowsUnitTests(DiffHighlighterTestCase):
+
+    def test_unified(self):
+        highlighter = self.build()
+        rows = highlighter.diff_rows(*highlighter.formatted_versions())
+        self.assertEqual(
+            [(tag, base, line) for tag, base, _, line, _ in rows],
+            [
+                ('equal', 1, 1),
+                ('insert', None, 2),
+                ('equal', 2, 3),
+                ('equal', 3, 4),
+                ('equal', 4, 5),
+            ]
+        )
+
+    def test_unchanged_lines_take_the_new_state(self):
+        highlighter = self.build()
+        rows = highlighter.diff_rows(*highlighter.formatted_versions())
+        self.assertEqual(
+            [row[4] for row in rows],
+            self.lines(self.BLOB)
+        )
+        self.assertEqual(
+            [row[2] for row in rows if row[2] is not None],
+            self.lines(self.BASE)
+        )
+
+    def test_side_by_side(self):
+        highlighter = self.build(
+            blob=self.BASE.replace('os.getcwd()', 'os.sep') + 'main()\n',
+            diff_view='side-by-side'
+        )
+        rows = highlighter.diff_rows(*highlighter.formatted_versions())
+        self.assertEqual(
+            [(tag, base, line) for tag, base, _, line, _ in rows],
+            [
+                ('equal', 1, 1),
+                ('equal', 2, 2),
+                ('equal', 3, 3),
+                ('replace', 4, 4),
+                ('insert', None, 5),
+            ]
+        )
+
+    def test_new_file(self):
+        highlighter = self.build(base_blob='')
+        rows = highlighter.diff_rows(*highlighter.formatted_versions())
+        self.assertEqual(set(row[0] for row in rows), set(['insert']))
+        self.assertEqual(len(rows), 5)
+
+
+class JavascriptDiffUnitTests(DiffHighlighterTestCase):
+    """JavascriptLexer's root state starts with zero-width rules"""
+
+    BASE = '/function f(a){\nvar x = 1;\n'
+    BLOB = '/function f(a)*/{\nvar x = 1;\n'
+    LEXER = 'JavascriptLexer'
+
+    def test_changed_lines_match_a_fresh_lex(self):
+        base_html, html = self.build().formatted_versions()
+        self.assertEqual(base_html, self.lines(self.BASE))
+        self.assertEqual(html, self.lines(self.BLOB))
+        self.assertNotIn('class="err"', html[0])
+
+
+class FormattedVersionsUnitTests(DiffHighlighterTestCase):
+
+    def setUp(self):
+        self.render_cache = MemoryRenderCache()
+
+    def build_cached(self):
+        return self.build(
+            render_cache=self.render_cache,
+            git_base_blob_hash='base',
+            git_blob_hash='blob'
+        )
+
+    def test_relexes_only_the_change(self):
+        highlighter = self.build()
+        with patch.object(
+            DiffHighlighter,
+            'update',
+            wraps=highlighter.update
+        ) as mock_update:
+            base_html, html = highlighter.formatted_versions()
+        mock_update.assert_called_once_with(self.BLOB)
+        self.assertEqual(base_html, self.lines(self.BASE))
+        self.assertEqual(html, self.lines(self.BLOB))
+        self.assertEqual(highlighter.blob, self.BLOB)
+
+    def test_cached_versions_are_reused(self):
+        expected = self.build_cached().formatted_versions()
+        self.assertEqual(len(self.render_cache.entries), 2)
+        highlighter = self.build_cached()
+        with patch.object(DiffHighlighter, 'relex_all') as mock_relex:
+            self.assertEqual(highlighter.formatted_versions(), expected)
+        mock_relex.assert_not_called()
+
+    def test_shared_version(self):
+        self.build_cached().formatted_versions()
+        highlighter = self.build(
+            base_blob=self.BLOB,
+            blob=self.BLOB + 'main()\n',
+            render_cache=self.render_cache,
+            git_base_blob_hash='blob',
+            git_blob_hash='next'
+        )
+        with patch.object(
+            DiffHighlighter,
+            'relex_all',
+            wraps=highlighter.relex_all
+        ) as mock_relex:
+            base_html, html = highlighter.formatted_versions()
+        mock_relex.assert_called_once_with()
+        self.assertEqual(base_html, self.lines(self.BLOB))
+        self.assertEqual(html, self.lines(self.BLOB + 'main()\n'))
+
+
+class BlockDiffUnitTests(TestCase):
+    """Renders diffs between tags of a scratch repo"""
+
+    def git(self, *args):
+        return check_output(
+            ('git',) + args,
+            cwd=self.repository,
+        ).decode('utf-8').strip()
+
+    def commit(self, contents, tag):
+        with open(join(self.repository, 'main.py'), 'w') as blob_file:
+            blob_file.write(contents)
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', tag)
+        self.git('tag', tag)
+
+    def setUp(self):
+        self.repository = mkdtemp()
+        self.addCleanup(rmtree, self.repository)
+        check_call(['git', 'init', '-q', self.repository])
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'test')
+        self.commit(DiffHighlighterTestCase.BASE, 'v1.0.0')
+        self.commit(DiffHighlighterTestCase.BLOB, 'v2.0.0')
+
+    def render(self, **kwargs):
+        return Block(
+            'v2.0.0:main.py',
+            git_base_ref_name='v1.0.0',
+            blob_working_directory=self.repository,
+            **kwargs
+        )
+
+    def test_unified(self):
+        block = self.render()
+        self.assertEqual(
+            block.git_base_blob_hash,
+            self.git('rev-parse', 'v1.0.0:main.py')
+        )
+        self.assertIn('diff-unified', block.rendered)
+        self.assertEqual(block.rendered.count('class="diff-inserted"'), 1)
+        self.assertIn('v1.0.0..v2.0.0', block.rendered)
+
+    def test_side_by_side(self):
+        self.assertIn(
+            'diff-side-by-side',
+            self.render(diff_view='side-by-side').rendered
+        )
+
+    def test_render_cache(self):
+        render_cache = MemoryRenderCache()
+        rendered = self.render(render_cache=render_cache).rendered
+        with patch.object(DiffHighlighter, 'highlight') as mock_highlight:
+            self.assertEqual(
+                self.render(render_cache=render_cache).rendered,
+                rendered
+            )
+        mock_highlight.assert_not_called()
+        self.assertNotEqual(
+            self.render(
+                render_cache=render_cache,
+                diff_view='side-by-side'
+            ).rendered,
+            rendered
+        )
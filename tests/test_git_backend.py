@@ -0,0 +1,71 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0613
+"""This file collects tests for GitBackend"""
+
+from unittest import TestCase
+
+from mock import patch
+
+from wotw_highlighter import GitBackend
+
+
+class FakeBackend(GitBackend):
+
+    def discover_git_dir(self):
+        return '%s/.git' % (self.working_directory)
+
+
+class OtherFakeBackend(FakeBackend):
+    pass
+
+
+class ForRepositoryUnitTests(TestCase):
+
+    def setUp(self):
+        backends_patcher = patch.object(GitBackend, 'backends', {})
+        backends_patcher.start()
+        self.addCleanup(backends_patcher.stop)
+
+    def test_backends_are_shared(self):
+        first = FakeBackend.for_repository('/repo')
+        second = FakeBackend.for_repository('/repo/')
+        self.assertIs(first, second)
+        self.assertEqual(first.git_dir, '/repo/.git')
+
+    def test_backends_are_per_class(self):
+        self.assertIsNot(
+            FakeBackend.for_repository('/repo'),
+            OtherFakeBackend.for_repository('/repo')
+        )
+
+    @patch.object(FakeBackend, 'close')
+    def test_close_all(self, mock_close):
+        FakeBackend.for_repository('/repo')
+        GitBackend.close_all()
+        mock_close.assert_called_once_with()
+        self.assertEqual(GitBackend.backends, {})
+
+
+class InterfaceUnitTests(TestCase):
+
+    def test_children_must_override(self):
+        with self.assertRaises(NotImplementedError):
+            GitBackend('/repo')
+        backend = FakeBackend('/repo')
+        with self.assertRaises(NotImplementedError):
+            backend.object_info('HEAD')
+        with self.assertRaises(NotImplementedError):
+            backend.read_object('HEAD')
+        with self.assertRaises(NotImplementedError):
+            backend.list_tree('HEAD')
+        self.assertIsNone(backend.close())
+
+    @patch.object(FakeBackend, 'read_object', side_effect=['first', None])
+    def test_read_objects_defaults_to_read_object(self, mock_read):
+        backend = FakeBackend('/repo')
+        self.assertEqual(
+            list(backend.read_objects(['HEAD', 'qqq'])),
+            ['first', None]
+        )
+        self.assertEqual(mock_read.call_count, 2)
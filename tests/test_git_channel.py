@@ -0,0 +1,277 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+# pylint: disable=W0613
+"""This file collects tests for GitChannel"""
+
+from io import BytesIO
+from subprocess import CalledProcessError
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from wotw_highlighter import GitChannel
+
+
+class FakeProcess(object):
+    """Replays canned cat-file output"""
+
+    def __init__(self, output):
+        self.stdin = MagicMock()
+        self.stdout = BytesIO(output)
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+
+    def wait(self):
+        return self.returncode
+
+
+class GitChannelTestCase(TestCase):
+    """Collects common items and defaults across test cases"""
+
+    WORKING_DIRECTORY = '/repo'
+
+    def setUp(self):
+        self.build_channel()
+
+    def wipe_channel(self):
+        del self.git_channel
+
+    def build_channel(self):
+        discover_patcher = patch.object(
+            GitChannel,
+            'discover_git_dir',
+            return_value='/repo/.git'
+        )
+        discover_patcher.start()
+        self.git_channel = GitChannel(self.WORKING_DIRECTORY)
+        discover_patcher.stop()
+        self.addCleanup(self.wipe_channel)
+
+
+class ConstructorUnitTests(GitChannelTestCase):
+
+    def test_git_dir_discovery(self):
+        self.assertEqual(self.git_channel.git_dir, '/repo/.git')
+        self.assertEqual(self.git_channel.processes, {})
+
+
+class DiscoverGitDirUnitTests(GitChannelTestCase):
+
+    @patch(
+        'wotw_highlighter.git_channel.check_output',
+        return_value=b'.git\n'
+    )
+    def test_relative_git_dir(self, mock_check_output):
+        self.assertEqual(self.git_channel.discover_git_dir(), '/repo/.git')
+
+    @patch(
+        'wotw_highlighter.git_channel.check_output',
+        return_value=b'/elsewhere/.git\n'
+    )
+    def test_absolute_git_dir(self, mock_check_output):
+        self.assertEqual(
+            self.git_channel.discover_git_dir(),
+            '/elsewhere/.git'
+        )
+
+    @patch(
+        'wotw_highlighter.git_channel.check_output',
+        side_effect=CalledProcessError(cmd='', returncode=128)
+    )
+    def test_not_a_repo(self, mock_check_output):
+        with self.assertRaisesRegexp(ValueError, 'is not a git repo'):
+            self.git_channel.discover_git_dir()
+
+
+class ObjectInfoUnitTests(GitChannelTestCase):
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_existing_object(self, mock_popen):
+        mock_popen.return_value = FakeProcess(b'abc123 blob 42\n')
+        self.assertEqual(
+            self.git_channel.object_info('HEAD:./file'),
+            ('abc123', 'blob', 42)
+        )
+        mock_popen.return_value.stdin.write.assert_called_once_with(
+            b'HEAD:./file\n'
+        )
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_missing_object(self, mock_popen):
+        mock_popen.return_value = FakeProcess(b'HEAD:./file missing\n')
+        self.assertIsNone(self.git_channel.object_info('HEAD:./file'))
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_process_is_reused(self, mock_popen):
+        mock_popen.return_value = FakeProcess(
+            b'abc123 blob 42\n'
+            b'def456 commit 7\n'
+        )
+        self.git_channel.object_info('HEAD:./file')
+        self.assertEqual(
+            self.git_channel.object_info('HEAD'),
+            ('def456', 'commit', 7)
+        )
+        mock_popen.assert_called_once()
+
+    def test_newlines_are_never_sent(self):
+        self.assertIsNone(self.git_channel.object_info('HEAD\nHEAD'))
+
+
+class ReadObjectUnitTests(GitChannelTestCase):
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_existing_object(self, mock_popen):
+        mock_popen.return_value = FakeProcess(b'abc123 blob 7\nraw war\n')
+        self.assertEqual(
+            self.git_channel.read_object('abc123'),
+            ('abc123', 'blob', b'raw war')
+        )
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_missing_object(self, mock_popen):
+        mock_popen.return_value = FakeProcess(b'abc123 missing\n')
+        self.assertIsNone(self.git_channel.read_object('abc123'))
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_restart_after_death(self, mock_popen):
+        mock_popen.side_effect = [
+            FakeProcess(b''),
+            FakeProcess(b'abc123 blob 3\nwar\n'),
+        ]
+        self.assertEqual(
+            self.git_channel.read_object('abc123'),
+            ('abc123', 'blob', b'war')
+        )
+        self.assertEqual(mock_popen.call_count, 2)
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_truncated_contents(self, mock_popen):
+        mock_popen.side_effect = [
+            FakeProcess(b'abc123 blob 30\nwar\n'),
+            FakeProcess(b'abc123 blob 30\nwar\n'),
+        ]
+        with self.assertRaisesRegexp(ValueError, 'Unable to query'):
+            self.git_channel.read_object('abc123')
+        self.assertEqual(self.git_channel.processes, {})
+
+
+class ReadObjectsUnitTests(GitChannelTestCase):
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_streams_in_order(self, mock_popen):
+        process = mock_popen.return_value = FakeProcess(
+            b'abc123 blob 3\nwar\n'
+            b'qqq missing\n'
+            b'def456 blob 3\nraw\n'
+        )
+        self.assertEqual(
+            list(self.git_channel.read_objects(['abc123', 'qqq', 'a\nb', 'def456'])),
+            [
+                ('abc123', 'blob', b'war'),
+                None,
+                None,
+                ('def456', 'blob', b'raw'),
+            ]
+        )
+        self.assertEqual(
+            [call[0][0] for call in process.stdin.write.call_args_list],
+            [b'abc123\n', b'qqq\n', b'def456\n']
+        )
+        mock_popen.assert_called_once()
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_abandoned_stream_stops_the_process(self, mock_popen):
+        process = mock_popen.return_value = FakeProcess(
+            b'abc123 blob 3\nwar\n'
+            b'def456 blob 3\nraw\n'
+        )
+        objects = self.git_channel.read_objects(['abc123', 'def456'])
+        next(objects)
+        objects.close()
+        self.assertEqual(process.returncode, -15)
+        self.assertEqual(self.git_channel.processes, {})
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_lookups_while_streaming(self, mock_popen):
+        stream = FakeProcess(
+            b'abc123 blob 3\nwar\n'
+            b'def456 blob 3\nraw\n'
+        )
+        mock_popen.side_effect = [
+            stream,
+            FakeProcess(b'abc123 blob 3\n'),
+        ]
+        objects = self.git_channel.read_objects(['abc123', 'def456'])
+        self.assertEqual(next(objects), ('abc123', 'blob', b'war'))
+        self.assertEqual(
+            self.git_channel.object_info('abc123'),
+            ('abc123', 'blob', 3)
+        )
+        self.assertEqual(next(objects), ('def456', 'blob', b'raw'))
+        self.assertEqual(list(objects), [])
+        stream.stdin.close.assert_called_once()
+        self.assertNotIn(GitChannel.BATCH, self.git_channel.processes)
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_truncated_stream(self, mock_popen):
+        mock_popen.return_value = FakeProcess(b'abc123 blob 30\nwar\n')
+        with self.assertRaisesRegexp(ValueError, 'Unable to stream'):
+            list(self.git_channel.read_objects(['abc123']))
+        self.assertEqual(self.git_channel.processes, {})
+
+
+class ListTreeUnitTests(GitChannelTestCase):
+
+    @patch(
+        'wotw_highlighter.git_channel.check_output',
+        return_value=(
+            b'100644 blob abc123\tREADME.md\0'
+            b'160000 commit def456\tvendor/lib\0'
+            b'100755 blob 789abc\tbin/run me\0'
+        )
+    )
+    def test_entries(self, mock_check_output):
+        self.assertEqual(
+            self.git_channel.list_tree('HEAD'),
+            [
+                ('100644', 'blob', 'abc123', 'README.md'),
+                ('160000', 'commit', 'def456', 'vendor/lib'),
+                ('100755', 'blob', '789abc', 'bin/run me'),
+            ]
+        )
+        self.assertEqual(
+            mock_check_output.call_args[0][0],
+            ['git', 'ls-tree', '-r', '-z', '--full-tree', 'HEAD', '--']
+        )
+
+    @patch(
+        'wotw_highlighter.git_channel.check_output',
+        side_effect=CalledProcessError(128, 'git')
+    )
+    def test_not_a_tree(self, mock_check_output):
+        self.assertIsNone(self.git_channel.list_tree('qqq'))
+
+    @patch('wotw_highlighter.git_channel.check_output')
+    def test_options_are_never_passed(self, mock_check_output):
+        self.assertIsNone(self.git_channel.list_tree('--output=x'))
+        mock_check_output.assert_not_called()
+
+
+class CloseUnitTests(GitChannelTestCase):
+
+    @patch('wotw_highlighter.git_channel.Popen')
+    def test_close(self, mock_popen):
+        process = mock_popen.return_value = FakeProcess(b'abc123 blob 1\n')
+        self.git_channel.object_info('abc123')
+        self.git_channel.close()
+        process.stdin.close.assert_called_once_with()
+        self.assertEqual(process.returncode, -15)
+        self.assertEqual(self.git_channel.processes, {})
+        self.assertIsNone(self.git_channel.dev_null)
@@ -0,0 +1,220 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for GitObjectStore"""
+
+from os import makedirs
+from os.path import join
+from shutil import rmtree
+from subprocess import check_call, check_output
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from wotw_highlighter import GitObjectStore
+
+
+class GitObjectStoreTestCase(TestCase):
+    """Builds a scratch repo with loose objects, a pack, deltas, and tags"""
+
+    @classmethod
+    def git(cls, *args):
+        return check_output(
+            ('git',) + args,
+            cwd=cls.repository,
+        ).decode('utf-8').strip()
+
+    @classmethod
+    def commit_version(cls, version):
+        with open(join(cls.repository, 'sub', 'file.txt'), 'w') as blob_file:
+            for line in range(500 + version):
+                blob_file.write('line %d of version %d\n' % (line, version % 3))
+        with open(join(cls.repository, 'top.txt'), 'w') as blob_file:
+            blob_file.write('version %d\n' % (version))
+        cls.git('add', '-A')
+        cls.git('commit', '-q', '-m', 'version %d' % (version))
+
+    @classmethod
+    def setUpClass(cls):
+        cls.repository = mkdtemp()
+        makedirs(join(cls.repository, 'sub'))
+        check_call(['git', 'init', '-q', cls.repository])
+        cls.git('config', 'user.email', 'test@example.com')
+        cls.git('config', 'user.name', 'test')
+        for version in range(6):
+            cls.commit_version(version)
+        cls.git('tag', 'lightweight', 'HEAD~3')
+        cls.git('tag', '-a', '-m', 'annotated', 'annotated', 'HEAD~1')
+        cls.git('repack', '-adq', '--depth=10', '--window=10')
+        cls.git('pack-refs', '--all')
+        cls.commit_version(6)
+        cls.store = GitObjectStore(join(cls.repository, 'sub'))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.store.close()
+        rmtree(cls.repository)
+
+    def assert_matches_git(self, object_name):
+        expected = check_output(
+            ['git', 'rev-parse', '--verify', '--quiet', object_name],
+            cwd=join(self.repository, 'sub'),
+        ).decode('utf-8').strip()
+        object_type = self.git('cat-file', '-t', expected)
+        contents = check_output(
+            ['git', 'cat-file', object_type, expected],
+            cwd=self.repository,
+        )
+        self.assertEqual(
+            self.store.object_info(object_name),
+            (expected, object_type, len(contents))
+        )
+        self.assertEqual(
+            self.store.read_object(object_name),
+            (expected, object_type, contents)
+        )
+
+
+class DiscoverGitDirUnitTests(GitObjectStoreTestCase):
+
+    def test_walks_up_to_git_dir(self):
+        self.assertEqual(self.store.git_dir, join(self.repository, '.git'))
+        self.assertEqual(self.store.work_tree, self.repository)
+
+    def test_not_a_repo(self):
+        directory = mkdtemp()
+        self.addCleanup(rmtree, directory)
+        with self.assertRaisesRegexp(ValueError, 'is not a git repo'):
+            GitObjectStore(directory)
+
+
+class ResolveUnitTests(GitObjectStoreTestCase):
+
+    def test_head(self):
+        self.assert_matches_git('HEAD')
+
+    def test_branch(self):
+        self.assert_matches_git(self.git('symbolic-ref', '--short', 'HEAD'))
+
+    def test_packed_lightweight_tag(self):
+        self.assert_matches_git('lightweight')
+
+    def test_packed_annotated_tag(self):
+        self.assert_matches_git('annotated')
+
+    def test_short_hash(self):
+        self.assert_matches_git(self.git('rev-parse', '--short', 'HEAD~2'))
+
+    def test_paths_relative_to_working_directory(self):
+        self.assert_matches_git('HEAD:./file.txt')
+        self.assert_matches_git('HEAD:../top.txt')
+
+    def test_paths_relative_to_root(self):
+        self.assert_matches_git('annotated:sub/file.txt')
+
+    def test_revision_suffixes(self):
+        for revision in (
+                '@',
+                'HEAD~1',
+                'HEAD~5',
+                'HEAD^',
+                'HEAD^1~2',
+                'HEAD^0',
+                'HEAD^{tree}',
+                'HEAD~1^{commit}',
+                'annotated^{}',
+                'annotated^{object}',
+                'annotated~1',
+                'annotated^{tree}',
+        ):
+            self.assert_matches_git(revision)
+        self.assert_matches_git('HEAD~1:./file.txt')
+        self.assert_matches_git('annotated^{tree}:top.txt')
+
+    def test_missing_revisions(self):
+        self.assertIsNone(self.store.object_info('HEAD~7'))
+        self.assertIsNone(self.store.object_info('HEAD^2'))
+        self.assertIsNone(self.store.object_info('HEAD^{tag}'))
+        self.assertIsNone(self.store.object_info('qqq~1'))
+
+    def test_unsupported_revisions(self):
+        for revision in ('HEAD@{1}', 'HEAD^@', 'HEAD~x'):
+            with self.assertRaisesRegexp(ValueError, 'Unsupported revision'):
+                self.store.object_info(revision)
+
+    def test_missing(self):
+        self.assertIsNone(self.store.object_info('qqq'))
+        self.assertIsNone(self.store.object_info('HEAD:./qqq'))
+        self.assertIsNone(self.store.read_object('HEAD:../../qqq'))
+        self.assertIsNone(self.store.read_object('0' * 40))
+
+
+class ReadObjectUnitTests(GitObjectStoreTestCase):
+
+    def test_every_object(self):
+        for line in self.git(
+                'cat-file',
+                '--batch-all-objects',
+                '--batch-check=%(objectname)'
+        ).split('\n'):
+            self.assert_matches_git(line)
+
+
+class DeltaBaseCacheUnitTests(GitObjectStoreTestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        store = GitObjectStore(self.repository)
+        self.addCleanup(store.close)
+        store.DELTA_BASE_CACHE_SIZE = 2
+        store.remember_base('first', 'blob', b'1')
+        store.remember_base('second', 'blob', b'2')
+        self.assertEqual(store.cached_base('first'), ('blob', b'1'))
+        store.remember_base('third', 'blob', b'3')
+        self.assertIsNone(store.cached_base('second'))
+        self.assertEqual(
+            list(store.delta_base_cache),
+            ['first', 'third']
+        )
+
+
+class ListTreeUnitTests(GitObjectStoreTestCase):
+
+    def assert_matches_ls_tree(self, tree_ish):
+        listing = check_output(
+            ['git', 'ls-tree', '-r', '-z', '--full-tree', tree_ish],
+            cwd=self.repository,
+        ).decode('utf-8')
+        expected = []
+        for line in listing.split('\0'):
+            if line:
+                header, path = line.split('\t', 1)
+                expected.append(tuple(header.split()) + (path,))
+        self.assertEqual(self.store.list_tree(tree_ish), expected)
+
+    def test_commits_tags_and_trees(self):
+        self.assert_matches_ls_tree('HEAD')
+        self.assert_matches_ls_tree('annotated')
+        self.assert_matches_ls_tree(self.git('rev-parse', 'HEAD~2^{tree}'))
+
+    def test_not_a_tree(self):
+        self.assertIsNone(self.store.list_tree('qqq'))
+        self.assertIsNone(self.store.list_tree('HEAD:top.txt'))
+
+
+class ApplyDeltaUnitTests(TestCase):
+
+    def test_copy_and_insert(self):
+        delta = (
+            b'\x0b'  # base size
+            b'\x0e'  # result size
+            b'\x90\x05'  # copy 5 bytes from offset 0
+            b'\x04 war'  # insert 4 bytes
+            b'\x91\x06\x05'  # copy 5 bytes from offset 6
+        )
+        self.assertEqual(
+            GitObjectStore.apply_delta(b'raw is what', delta),
+            b'raw i war what'
+        )
+
+    def test_wrong_base(self):
+        with self.assertRaisesRegexp(ValueError, 'does not match'):
+            GitObjectStore.apply_delta(b'raw', b'\x0b\x0e')
@@ -0,0 +1,245 @@
+# pylint: disable=invalid-name
+# pylint: disable=missing-docstring
+# pylint: disable=attribute-defined-outside-init
+
+from random import Random
+from re import compile as re_compile
+from unittest import TestCase
+
+from mock import patch
+
+from wotw_highlighter import BlockHighlighter, IncrementalHighlighter
+from wotw_highlighter.incremental_highlighter import (
+    RuleProbe,
+    common_prefix_length,
+    common_suffix_length,
+    split_lines,
+)
+
+
+class HelperUnitTests(TestCase):
+
+    def test_split_lines(self):
+        self.assertEqual(split_lines('a\nb\n'), ['a\n', 'b\n'])
+        self.assertEqual(split_lines('a\n\nb'), ['a\n', '\n', 'b'])
+        self.assertEqual(split_lines(''), [])
+
+    def test_common_prefix_length(self):
+        self.assertEqual(common_prefix_length([1, 2, 3], [1, 2, 4]), 2)
+        self.assertEqual(common_prefix_length([1, 2], [1, 2, 3]), 2)
+        self.assertEqual(common_prefix_length([], [1]), 0)
+
+    def test_common_suffix_length(self):
+        self.assertEqual(common_suffix_length([1, 2, 3], [4, 2, 3], 3), 2)
+        self.assertEqual(common_suffix_length([1, 1], [1, 1, 1], 0), 0)
+        self.assertEqual(common_suffix_length([1, 1], [1, 1, 1], 1), 1)
+
+
+class RuleProbeUnitTests(TestCase):
+
+    def completion(self, pattern, flags=0):
+        return RuleProbe(re_compile(pattern, flags)).completion
+
+    def test_single_line_rules_are_safe(self):
+        self.assertIsNone(self.completion(r'#.*$'))
+        self.assertIsNone(self.completion(r'"[^"\n]*"'))
+
+    def test_trailing_repeats_are_safe(self):
+        self.assertIsNone(self.completion(r'\s+'))
+
+    def test_multi_line_rules(self):
+        self.assertEqual(self.completion(r'/\*[\w\W]*?\*/'), '*/')
+        self.assertEqual(self.completion(r'"""(.|\n)*?"""'), '"""')
+        self.assertEqual(self.completion(r'(?s)<!--.*?-->'), '-->')
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            self.completion(r'(a)[\s\S]*\1')
+
+
+class IncrementalHighlighterTestCase(TestCase):
+
+    BLOB = (
+        'import os\n'
+        '\n'
+        '\n'
+        'def main():\n'
+        '    """Prints the working directory"""\n'
+        '    print(os.getcwd())\n'
+        '\n'
+        '\n'
+        'main()\n'
+    )
+
+    LEXER = 'PythonLexer'
+
+    def build(self, blob=None, **kwargs):
+        self.highlighter = IncrementalHighlighter(
+            blob=self.BLOB if blob is None else blob,
+            explicit_lexer_name=self.LEXER,
+            **kwargs
+        )
+        self.highlighter.attach_and_highlight()
+        return self.highlighter
+
+    def full(self, blob):
+        highlighter = BlockHighlighter(
+            blob=blob,
+            explicit_lexer_name=self.LEXER
+        )
+        highlighter.attach_and_highlight()
+        return highlighter.highlighted_blob
+
+    def assertUpdates(self, blob):
+        previous = list(self.highlighter.line_html)
+        start, end, lines = self.highlighter.update(blob)
+        self.assertEqual(
+            previous[:start] + lines + previous[end:],
+            self.highlighter.line_html
+        )
+        self.highlighter.highlight()
+        self.assertEqual(self.highlighter.highlighted_blob, self.full(blob))
+        return start, end, lines
+
+
+class HighlightUnitTests(IncrementalHighlighterTestCase):
+
+    def test_matches_block_highlighter(self):
+        self.assertEqual(
+            self.build().highlighted_blob,
+            self.full(self.BLOB)
+        )
+
+    def test_checkpoints_every_line(self):
+        self.build()
+        self.assertEqual(
+            len(self.highlighter.line_states),
+            self.BLOB.count('\n')
+        )
+        self.assertNotIn(None, self.highlighter.line_states)
+
+    @patch('wotw_highlighter.incremental_highlighter.format_tokens')
+    def test_outfile(self, mock_format):
+        highlighter = self.build(outfile='outfile')
+        mock_format.assert_called_once_with(
+            [],
+            highlighter.formatter,
+            'outfile'
+        )
+
+
+class UpdateUnitTests(IncrementalHighlighterTestCase):
+
+    def setUp(self):
+        self.build()
+
+    def test_unchanged(self):
+        self.assertEqual(self.highlighter.update(self.BLOB), (9, 9, []))
+
+    def test_single_line_edit(self):
+        blob = self.BLOB.replace('getcwd', 'getcwdb')
+        start, end, lines = self.assertUpdates(blob)
+        self.assertEqual((start, end, len(lines)), (5, 6, 1))
+
+    def test_inserted_line(self):
+        blob = self.BLOB.replace('main()\n', 'main()\nmain()\n', 1)
+        start, end, lines = self.assertUpdates(blob)
+        self.assertEqual(end - start + 1, len(lines))
+
+    def test_opening_a_string_reaches_the_end(self):
+        blob = self.BLOB.replace('import os\n', 'import os\n"""\n')
+        start, end, _ = self.assertUpdates(blob)
+        self.assertEqual((start, end), (1, 9))
+
+    def test_closing_a_string_far_below(self):
+        self.assertUpdates(self.BLOB.replace('import os\n', 'x = """\n'))
+        self.assertUpdates(
+            self.BLOB.replace('import os\n', 'x = """\n') + '"""\n'
+        )
+
+    def test_random_edits(self):
+        random = Random(17)
+        blob = self.BLOB * 4
+        self.build(blob)
+        snippets = ['"""', "'", '#', '\n', '(', ')', '\\', 'x = 1\n']
+        for _ in range(60):
+            position = random.randrange(len(blob) + 1)
+            if random.random() < 0.5:
+                blob = (
+                    blob[:position]
+                    + random.choice(snippets)
+                    + blob[position:]
+                )
+            else:
+                blob = (
+                    blob[:position]
+                    + blob[position + random.randrange(1, 10):]
+                )
+            self.assertUpdates(blob or '\n')
+            blob = blob or '\n'
+
+
+class CssUpdateUnitTests(IncrementalHighlighterTestCase):
+
+    BLOB = 'a { color: red }\n\nb { color: blue }\n'
+    LEXER = 'CssLexer'
+
+    def test_unterminated_comment(self):
+        self.build()
+        self.assertUpdates('/*\n' + self.BLOB)
+        self.assertUpdates('/*\n' + self.BLOB + '*/\n')
+
+
+class JavascriptUpdateUnitTests(IncrementalHighlighterTestCase):
+    """JavascriptLexer's root state starts with zero-width rules"""
+
+    BLOB = (
+        '/function f(a){\n'
+        'var x = 1;\n'
+        '/a+/g.test(x);\n'
+        '  y = x / 2 /* c */;\n'
+    )
+    LEXER = 'JavascriptLexer'
+
+    def test_first_line_keeps_the_root_checkpoint(self):
+        self.build(self.BLOB)
+        self.assertEqual(self.highlighter.line_states[0], ('root',))
+        self.assertUpdates(self.BLOB.replace('(a){', '(a)*/{'))
+
+    def test_random_edits(self):
+        random = Random(20)
+        blob = self.BLOB * 4
+        self.build(blob)
+        snippets = ['/', '*', '"', "'", '`', '\n', '{', '}', '(', ')', '\\']
+        for _ in range(120):
+            position = random.randrange(len(blob) + 1)
+            if random.random() < 0.5:
+                blob = (
+                    blob[:position]
+                    + random.choice(snippets)
+                    + blob[position:]
+                )
+            else:
+                blob = (
+                    blob[:position]
+                    + blob[position + random.randrange(1, 10):]
+                )
+            blob = blob or '\n'
+            self.assertUpdates(blob)
+
+
+class FallbackUnitTests(IncrementalHighlighterTestCase):
+
+    BLOB = '#include <stdio.h>\n\nint main() { return 0; }\n'
+    LEXER = 'CLexer'
+
+    def test_not_incremental(self):
+        self.build()
+        self.assertFalse(self.highlighter.incremental())
+
+    def test_update(self):
+        self.build()
+        start, end, lines = self.assertUpdates(
+            self.BLOB.replace('0', '1')
+        )
+        self.assertEqual((start, end, len(lines)), (2, 3, 1))
@@ -0,0 +1,92 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+"""This file collects tests for LineIndex"""
+
+from unittest import TestCase
+
+from wotw_highlighter.line_index import LineIndex
+
+
+class SpanUnitTests(TestCase):
+
+    BUFFER = b'one\ntwo\n\nfour'
+
+    def setUp(self):
+        self.index = LineIndex()
+
+    def lines(self, first_line, last_line):
+        begin, end = self.index.span(self.BUFFER, first_line, last_line)
+        return self.BUFFER[begin:end]
+
+    def test_ranges(self):
+        self.assertEqual(self.lines(1, 1), b'one\n')
+        self.assertEqual(self.lines(2, 3), b'two\n\n')
+        self.assertEqual(self.lines(4, None), b'four')
+        self.assertEqual(self.lines(None, 2), b'one\ntwo\n')
+        self.assertEqual(self.lines(None, None), self.BUFFER)
+
+    def test_past_the_end(self):
+        self.assertEqual(self.lines(3, 40), b'\nfour')
+        self.assertEqual(self.lines(5, None), b'')
+
+    def test_scans_lazily(self):
+        self.lines(1, 1)
+        self.assertEqual(list(self.index.offsets), [0, 4])
+        self.assertFalse(self.index.complete)
+        self.lines(None, None)
+        self.assertEqual(list(self.index.offsets), [0, 4])
+        self.lines(None, 9)
+        self.assertEqual(list(self.index.offsets), [0, 4, 8, 9])
+        self.assertTrue(self.index.complete)
+
+    def test_trailing_newline(self):
+        begin, end = self.index.span(b'a\nb\n', 3, None)
+        self.assertEqual((begin, end), (4, 4))
+        self.assertEqual(len(self.index.offsets), 2)
+
+    def test_wide_newlines(self):
+        buffer = u'਀\nਊ'.encode('utf-16-le')
+        index = LineIndex(u'\n'.encode('utf-16-le'))
+        begin, end = index.span(buffer, 2, None)
+        self.assertEqual(buffer[begin:end].decode('utf-16-le'), u'ਊ')
+
+    def test_start(self):
+        index = LineIndex(b'\n', 3)
+        self.assertEqual(index.span(b'\xef\xbb\xbfa\nb', 1, 1), (3, 5))
+
+
+class ExcerptUnitTests(TestCase):
+
+    BUFFER = b'one\ntwo\nthree\nfour\n'
+
+    def test_without_lead_in(self):
+        self.assertEqual(LineIndex().excerpt(self.BUFFER, 3, 3), (8, 8, 14))
+
+    def test_lead_in(self):
+        self.assertEqual(
+            LineIndex().excerpt(self.BUFFER, 3, 4, 2),
+            (4, 8, 19)
+        )
+
+
+class ForKeyUnitTests(TestCase):
+
+    def setUp(self):
+        self.shared = LineIndex.shared.copy()
+        self.addCleanup(self.restore)
+        LineIndex.shared.clear()
+
+    def restore(self):
+        LineIndex.shared.clear()
+        LineIndex.shared.update(self.shared)
+
+    def test_shared(self):
+        self.assertIs(LineIndex.for_key('key'), LineIndex.for_key('key'))
+        self.assertIsNot(LineIndex.for_key('key'), LineIndex.for_key('other'))
+
+    def test_bounded(self):
+        first = LineIndex.for_key(0)
+        for key in range(1, LineIndex.MAX_SHARED + 1):
+            LineIndex.for_key(key)
+        self.assertEqual(len(LineIndex.shared), LineIndex.MAX_SHARED)
+        self.assertIsNot(LineIndex.for_key(0), first)
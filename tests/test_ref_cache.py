@@ -0,0 +1,137 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for RefCache"""
+
+from os.path import join
+from shutil import rmtree
+from subprocess import check_call, check_output
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from mock import MagicMock
+
+from wotw_highlighter import GitChannel
+from wotw_highlighter.ref_cache import RefCache
+
+
+class RefCacheTestCase(TestCase):
+    """Builds a scratch repo with two commits and a tag per test"""
+
+    def git(self, *args):
+        return check_output(
+            ('git',) + args,
+            cwd=self.repository,
+        ).decode('utf-8').strip()
+
+    def commit(self, contents):
+        with open(join(self.repository, 'main.py'), 'w') as blob_file:
+            blob_file.write(contents)
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', contents)
+
+    def setUp(self):
+        self.repository = mkdtemp()
+        self.addCleanup(rmtree, self.repository)
+        check_call(['git', 'init', '-q', self.repository])
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'test')
+        self.commit('first\n')
+        self.git('tag', '-a', '-m', 'release', 'v1.0.0')
+        self.commit('second\n')
+        self.branch = self.git('rev-parse', '--abbrev-ref', 'HEAD')
+        self.channel = GitChannel(self.repository)
+        self.addCleanup(self.channel.close)
+        self.resolve = MagicMock(side_effect=self.channel.object_info)
+        self.cache = RefCache(self.channel.git_dir)
+
+    def object_info(self, object_name):
+        return self.cache.object_info(object_name, self.resolve)
+
+    def assertResolves(self, object_name):
+        self.assertEqual(
+            self.object_info(object_name),
+            self.channel.object_info(object_name)
+        )
+
+    def lookups(self):
+        return [args[0] for args, _ in self.resolve.call_args_list]
+
+
+class ObjectInfoUnitTests(RefCacheTestCase):
+
+    def test_matches_git(self):
+        head = self.git('rev-parse', 'HEAD')
+        for object_name in [
+                'HEAD',
+                'v1.0.0',
+                'v1.0.0:main.py',
+                'HEAD:main.py',
+                'HEAD:missing.py',
+                'missing',
+                'missing:main.py',
+                head,
+                '%s:main.py' % (head),
+        ]:
+            self.assertResolves(object_name)
+
+    def test_resolves_refs_once(self):
+        for _ in range(50):
+            self.object_info('v1.0.0:main.py')
+            self.object_info('v1.0.0')
+        tag = self.git('rev-parse', 'v1.0.0')
+        self.assertEqual(
+            self.lookups(),
+            ['v1.0.0', '%s:main.py' % (tag)]
+        )
+
+    def test_missing_refs_are_cached(self):
+        self.assertIsNone(self.object_info('missing'))
+        self.assertIsNone(self.object_info('missing'))
+        self.assertEqual(self.lookups(), ['missing'])
+
+    def test_hashes_are_cached(self):
+        head = self.git('rev-parse', 'HEAD')
+        self.object_info(head)
+        self.commit('third\n')
+        self.object_info(head)
+        self.assertEqual(self.lookups(), [head])
+
+    def test_unstamped_names_skip_the_cache(self):
+        for object_name in [':main.py', 'ORIG_HEAD', 'HEAD@{0}']:
+            self.object_info(object_name)
+            self.object_info(object_name)
+            self.assertEqual(self.lookups()[-2:], [object_name] * 2)
+
+
+class InvalidationUnitTests(RefCacheTestCase):
+
+    def setUp(self):
+        super(InvalidationUnitTests, self).setUp()
+        self.assertResolves('HEAD:main.py')
+        self.assertResolves(self.branch)
+        self.assertResolves('v2.0.0')
+
+    def test_new_commit(self):
+        self.commit('third\n')
+        self.assertResolves('HEAD:main.py')
+        self.assertResolves(self.branch)
+
+    def test_new_tag(self):
+        self.git('tag', 'v2.0.0')
+        self.assertResolves('v2.0.0')
+
+    def test_packed_refs(self):
+        self.git('pack-refs', '--all')
+        self.git('update-ref', 'refs/heads/%s' % (self.branch), 'HEAD~1')
+        self.assertResolves(self.branch)
+
+    def test_checkout(self):
+        self.git('checkout', '-q', 'v1.0.0')
+        self.assertResolves('HEAD:main.py')
+
+    def test_new_ref_directory(self):
+        self.git('branch', 'feature/nested', 'HEAD~1')
+        self.assertResolves('feature/nested')
+        self.git('update-ref', 'refs/heads/feature/nested', 'HEAD')
+        self.assertResolves('feature/nested')
@@ -0,0 +1,181 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for the render caches"""
+
+from os import listdir
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from mock import patch
+
+from wotw_highlighter import (
+    DirectoryRenderCache,
+    MemoryRenderCache,
+    RenderCache,
+)
+
+
+class KeyForUnitTests(TestCase):
+
+    OPTIONS = {
+        'git_blob_hash': 'qqq',
+        'linenos': True,
+        'raw': 'ignored',
+    }
+
+    def test_same_inputs_same_key(self):
+        self.assertEqual(
+            RenderCache.key_for(self.OPTIONS, 'styles'),
+            RenderCache.key_for(dict(self.OPTIONS), 'styles')
+        )
+
+    def test_unkeyed_options_are_ignored(self):
+        options = dict(self.OPTIONS)
+        options['raw'] = 'something else'
+        self.assertEqual(
+            RenderCache.key_for(self.OPTIONS, 'styles'),
+            RenderCache.key_for(options, 'styles')
+        )
+
+    def test_keyed_options_change_the_key(self):
+        options = dict(self.OPTIONS)
+        options['linenos'] = False
+        self.assertNotEqual(
+            RenderCache.key_for(self.OPTIONS, 'styles'),
+            RenderCache.key_for(options, 'styles')
+        )
+
+    def test_stylesheet_changes_the_key(self):
+        self.assertNotEqual(
+            RenderCache.key_for(self.OPTIONS, 'styles'),
+            RenderCache.key_for(self.OPTIONS, 'other styles')
+        )
+
+    def test_version_changes_the_key(self):
+        original = RenderCache.key_for(self.OPTIONS, 'styles')
+        with patch('wotw_highlighter.render_cache.__version__', '0.0.0'):
+            self.assertNotEqual(
+                RenderCache.key_for(self.OPTIONS, 'styles'),
+                original
+            )
+
+    def test_pygments_version_changes_the_key(self):
+        original = RenderCache.key_for(self.OPTIONS, 'styles')
+        with patch('wotw_highlighter.render_cache.pygments_version', '0.0.0'):
+            self.assertNotEqual(
+                RenderCache.key_for(self.OPTIONS, 'styles'),
+                original
+            )
+
+    def test_storage_is_abstract(self):
+        with self.assertRaises(NotImplementedError):
+            RenderCache().get('key')
+        with self.assertRaises(NotImplementedError):
+            RenderCache().set('key', ('highlighted', 'styles'))
+        with self.assertRaises(NotImplementedError):
+            RenderCache().get_lines('key')
+        with self.assertRaises(NotImplementedError):
+            RenderCache().set_lines('key', ['line'])
+
+
+class MemoryRenderCacheUnitTests(TestCase):
+
+    def setUp(self):
+        self.cache = MemoryRenderCache(max_size=10)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_hit(self):
+        self.cache.set('key', ('abc', 'de'))
+        self.assertEqual(self.cache.get('key'), ('abc', 'de'))
+        self.assertEqual(self.cache.size, 5)
+
+    def test_lines_are_kept_apart(self):
+        self.cache.set_lines('key', ['abc', 'de'])
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get_lines('key'), ['abc', 'de'])
+        self.assertEqual(self.cache.size, 5)
+        self.cache.set('key', ('abc', None))
+        self.assertEqual(self.cache.get_lines('key'), ['abc', 'de'])
+
+    def test_replacing_an_entry(self):
+        self.cache.set('key', ('abc', 'de'))
+        self.cache.set('key', ('a', 'b'))
+        self.assertEqual(self.cache.get('key'), ('a', 'b'))
+        self.assertEqual(self.cache.size, 2)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('first', ('abc', ''))
+        self.cache.set('second', ('abc', ''))
+        self.cache.get('first')
+        self.cache.set('third', ('abcde', ''))
+        self.assertIsNone(self.cache.get('second'))
+        self.assertEqual(self.cache.get('first'), ('abc', ''))
+        self.assertEqual(self.cache.size, 8)
+
+    def test_oversized_entries_are_skipped(self):
+        self.cache.set('key', ('a' * 11, None))
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.size, 0)
+
+
+class DirectoryRenderCacheUnitTests(TestCase):
+
+    KEY = 'abcdef0123456789'
+
+    def setUp(self):
+        self.directory = mkdtemp()
+        self.addCleanup(rmtree, self.directory)
+        self.cache = DirectoryRenderCache(self.directory)
+
+    def test_miss(self):
+        self.assertIsNone(self.cache.get(self.KEY))
+
+    def test_round_trip(self):
+        self.cache.set(self.KEY, ('highlighted', 'styles'))
+        self.assertEqual(
+            DirectoryRenderCache(self.directory).get(self.KEY),
+            ('highlighted', 'styles')
+        )
+        self.assertEqual(
+            listdir(join(self.directory, 'ab')),
+            ['cdef0123456789.json']
+        )
+
+    def test_lines_are_kept_apart(self):
+        self.cache.set_lines(self.KEY, ['abc', 'de'])
+        self.assertIsNone(self.cache.get(self.KEY))
+        self.cache.set(self.KEY, ('highlighted', 'styles'))
+        self.assertEqual(
+            DirectoryRenderCache(self.directory).get_lines(self.KEY),
+            ['abc', 'de']
+        )
+        self.assertEqual(
+            sorted(listdir(join(self.directory, 'ab'))),
+            ['cdef0123456789.json', 'cdef0123456789.lines.json']
+        )
+
+    def test_corrupt_entry(self):
+        self.cache.set(self.KEY, ('highlighted', 'styles'))
+        with open(self.cache.path_for(self.KEY), 'w') as cache_file:
+            cache_file.write('{"highlighted_blob"')
+        self.assertIsNone(self.cache.get(self.KEY))
+
+    @patch(
+        'wotw_highlighter.render_cache.rename',
+        side_effect=OSError
+    )
+    def test_failed_write_leaves_nothing_behind(self, mock_rename):
+        self.cache.set(self.KEY, ('highlighted', 'styles'))
+        self.assertEqual(listdir(join(self.directory, 'ab')), [])
+        self.assertIsNone(self.cache.get(self.KEY))
+
+    def test_unserializable_renders_leave_nothing_behind(self):
+        with self.assertRaises(TypeError):
+            self.cache.set(self.KEY, (object(), 'styles'))
+        self.assertEqual(listdir(join(self.directory, 'ab')), [])
+        self.assertIsNone(self.cache.get(self.KEY))
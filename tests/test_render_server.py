@@ -0,0 +1,311 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for RenderServer and RenderClient"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from json import dumps, loads
+from os import fdopen, pipe
+from os.path import join
+from shutil import rmtree
+from socket import AF_UNIX, SOCK_STREAM, socket
+from subprocess import check_call, check_output
+from tempfile import mkdtemp
+from threading import Thread
+from time import sleep
+from unittest import TestCase
+
+from mock import MagicMock, patch
+from pygments.lexers.css import CssLexer
+from pygments.lexers.python import PythonLexer
+
+from wotw_highlighter import (
+    BlockHighlighter,
+    MemoryRenderCache,
+    RenderClient,
+    RenderServer,
+)
+from wotw_highlighter.block import LoadedBlock
+from wotw_highlighter.render_server import warm_worker
+
+
+BLOB = u'import os\n\nprint(os.sep)\n'
+
+
+def request(request_id, **options):
+    options['id'] = request_id
+    return (u'%s\n' % (dumps(options))).encode('utf-8')
+
+
+class RenderServerTestCase(TestCase):
+    """Renders on threads so tests don't pay for a process pool"""
+
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.executor.shutdown)
+
+    def serve(self, lines, **kwargs):
+        kwargs.setdefault('executor', self.executor)
+        output = BytesIO()
+        RenderServer(**kwargs).serve_stream(BytesIO(b''.join(lines)), output)
+        return dict(
+            (response['id'], response)
+            for response in map(loads, output.getvalue().splitlines())
+        )
+
+
+class WarmWorkerUnitTests(TestCase):
+
+    def test_warms_lexers(self):
+        warm_worker(['PythonLexer'], ['site.css'])
+        self.assertIsNotNone(BlockHighlighter.filename_index)
+        self.assertIn((PythonLexer, False), BlockHighlighter.lexer_instances)
+        self.assertIn((CssLexer, False), BlockHighlighter.lexer_instances)
+
+    @patch('wotw_highlighter.render_server.warm_worker')
+    def test_start_warms_every_worker(self, mock_warm):
+        executor = ThreadPoolExecutor(3)
+        self.addCleanup(executor.shutdown)
+        RenderServer(
+            max_workers=3,
+            executor=executor,
+            lexer_names=['PythonLexer']
+        ).start()
+        self.assertEqual(mock_warm.call_count, 4)
+        mock_warm.assert_called_with(('PythonLexer',), ())
+
+
+class ServeStreamUnitTests(RenderServerTestCase):
+
+    def test_renders_blobs(self):
+        responses = self.serve([
+            request(1, blob=BLOB, blob_path='main.py'),
+            request(2, blob=BLOB, blob_path='main.py', inline_css=True),
+        ])
+        for request_id, inline_css in ((1, False), (2, True)):
+            block = LoadedBlock(
+                blob=BLOB,
+                blob_path='main.py',
+                inline_css=inline_css
+            )
+            self.assertEqual(
+                responses[request_id],
+                {
+                    'error': None,
+                    'highlighted_blob_styles': block.highlighted_blob_styles,
+                    'id': request_id,
+                    'rendered': block.rendered,
+                }
+            )
+
+    def test_errors(self):
+        self.assertTrue(self.serve([b'qqq\n'])[None]['error'])
+        self.assertIn(
+            'JSON objects',
+            self.serve([b'\n', b'[1]\n'])[None]['error']
+        )
+        responses = self.serve([
+            request(1, blob=BLOB, render_cache='qqq'),
+            request(2, blob=BLOB, explicit_lexer_name='QqqLexer'),
+            request(3, blob=BLOB, blob_working_directory='/'),
+            request(4, blob=BLOB, git_backend='python'),
+        ])
+        self.assertIn('chosen by the server', responses[1]['error'])
+        self.assertIn('could not be found', responses[2]['error'])
+        self.assertIsNone(responses[2]['rendered'])
+        self.assertIn('chosen by the server', responses[3]['error'])
+        self.assertIn('chosen by the server', responses[4]['error'])
+
+    def test_paths_outside_the_working_directory(self):
+        directory = mkdtemp()
+        self.addCleanup(rmtree, directory)
+        with open(join(directory, 'main.py'), 'w') as blob_file:
+            blob_file.write(BLOB)
+        responses = self.serve(
+            [
+                request(1, raw='main.py'),
+                request(2, blob_path='../main.py'),
+                request(3, blob_path='/etc/hostname'),
+                request(4, raw='HEAD:../../main.py'),
+                request(5, blob=BLOB, blob_path='../main.py'),
+            ],
+            blob_working_directory=join(directory, 'nested', '..')
+        )
+        self.assertIsNone(responses[1]['error'])
+        for request_id in (2, 3, 4):
+            self.assertIn('is outside', responses[request_id]['error'])
+            self.assertIsNone(responses[request_id]['rendered'])
+        self.assertIsNone(responses[5]['error'])
+
+    def test_failed_renders(self):
+        future = Future()
+        future.set_exception(ValueError('qqq'))
+        executor = MagicMock()
+        executor.submit.return_value = future
+        responses = self.serve([request(1, blob=BLOB)], executor=executor)
+        self.assertEqual(responses[1]['error'], 'qqq')
+
+    def test_render_cache_hits_skip_the_pool(self):
+        render_cache = MemoryRenderCache()
+        lines = [request(1, blob=BLOB, git_blob_hash='qqq')]
+        rendered = self.serve(lines, render_cache=render_cache)[1]['rendered']
+        executor = MagicMock()
+        responses = self.serve(
+            lines,
+            executor=executor,
+            render_cache=render_cache
+        )
+        executor.submit.assert_not_called()
+        self.assertEqual(responses[1]['rendered'], rendered)
+
+    def test_git_refs(self):
+        repository = mkdtemp()
+        self.addCleanup(rmtree, repository)
+        check_call(['git', 'init', '-q', repository])
+        with open(join(repository, 'main.py'), 'w') as blob_file:
+            blob_file.write(BLOB)
+        for command in (
+                ['add', '-A'],
+                [
+                    '-c', 'user.name=test',
+                    '-c', 'user.email=test@example.com',
+                    'commit', '-q', '-m', 'main',
+                ],
+        ):
+            check_output(['git'] + command, cwd=repository)
+        responses = self.serve(
+            [request(1, raw='HEAD:main.py')],
+            blob_working_directory=repository
+        )
+        self.assertIn('main.py', responses[1]['rendered'])
+        self.assertIn('sep', responses[1]['rendered'])
+
+
+class BackpressureUnitTests(TestCase):
+
+    def wait_for(self, condition):
+        for _ in range(200):
+            if condition():
+                return
+            sleep(0.01)
+        self.fail('Timed out')
+
+    def test_reading_stops_while_full(self):
+        futures = [Future(), Future()]
+        executor = MagicMock()
+        executor.submit.side_effect = futures
+        server = RenderServer(executor=executor, max_pending=1)
+        read_end, write_end = pipe()
+        reader, writer = fdopen(read_end, 'rb'), fdopen(write_end, 'wb')
+        output = BytesIO()
+        serving = Thread(target=server.serve_stream, args=(reader, output))
+        serving.start()
+        writer.write(request(1, blob=BLOB) + request(2, blob=BLOB))
+        writer.flush()
+        self.wait_for(lambda: executor.submit.called)
+        sleep(0.1)
+        self.assertEqual(executor.submit.call_count, 1)
+        futures[0].set_result([(0, 'first', None, None)])
+        self.wait_for(lambda: 2 == executor.submit.call_count)
+        futures[1].set_result([(0, 'second', None, None)])
+        writer.close()
+        serving.join()
+        reader.close()
+        self.assertEqual(
+            [
+                loads(line)['rendered']
+                for line in output.getvalue().splitlines()
+            ],
+            ['first', 'second']
+        )
+
+    def test_full_clients_only_stall_themselves(self):
+        stalled, other_render, last_render = Future(), Future(), Future()
+        other_render.set_result([(0, 'other', None, None)])
+        last_render.set_result([(0, 'second', None, None)])
+        executor = MagicMock()
+        executor.submit.side_effect = [stalled, other_render, last_render]
+        server = RenderServer(executor=executor, max_pending=1)
+        read_end, write_end = pipe()
+        reader, writer = fdopen(read_end, 'rb'), fdopen(write_end, 'wb')
+        serving = Thread(
+            target=server.serve_stream,
+            args=(reader, BytesIO())
+        )
+        serving.start()
+        writer.write(request(1, blob=BLOB) + request(2, blob=BLOB))
+        writer.flush()
+        self.wait_for(lambda: executor.submit.called)
+        output = BytesIO()
+        server.serve_stream(BytesIO(request(3, blob=BLOB)), output)
+        self.assertEqual(loads(output.getvalue())['rendered'], 'other')
+        stalled.set_result([(0, 'first', None, None)])
+        writer.close()
+        serving.join()
+        reader.close()
+        self.assertEqual(executor.submit.call_count, 3)
+
+
+class UnixSocketUnitTests(RenderServerTestCase):
+
+    def setUp(self):
+        super(UnixSocketUnitTests, self).setUp()
+        directory = mkdtemp()
+        self.addCleanup(rmtree, directory)
+        self.path = join(directory, 'highlighter.sock')
+        self.server = RenderServer(executor=self.executor)
+
+    def listen(self):
+        listener = self.server.listen_unix(self.path)
+        self.addCleanup(listener.server_close)
+        serving = Thread(target=listener.serve_forever)
+        serving.daemon = True
+        serving.start()
+        self.addCleanup(listener.shutdown)
+        return listener
+
+    def test_client(self):
+        self.listen()
+        client = RenderClient.connect(self.path)
+        self.addCleanup(client.close)
+        expected = LoadedBlock(blob=BLOB, blob_path='main.py').rendered
+        result = client.render(blob=BLOB, blob_path='main.py')
+        self.assertIsNone(result.error)
+        self.assertEqual(result.rendered, expected)
+        results = client.render_many(
+            [{'blob': BLOB, 'blob_path': 'main.py'}] * 20
+            + [{'blob': BLOB, 'explicit_lexer_name': 'QqqLexer'}]
+        )
+        self.assertEqual(
+            [result.rendered for result in results[:-1]],
+            [expected] * 20
+        )
+        self.assertIsInstance(results[-1].error, ValueError)
+
+    def test_stale_socket(self):
+        stale = socket(AF_UNIX, SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        self.listen()
+        client = RenderClient.connect(self.path)
+        self.addCleanup(client.close)
+        self.assertIsNone(client.render(blob=BLOB).error)
+
+    def test_live_socket(self):
+        self.listen()
+        with self.assertRaisesRegexp(ValueError, 'already has a server'):
+            self.server.listen_unix(self.path)
+
+
+class SpawnUnitTests(TestCase):
+
+    def test_stdio(self):
+        client = RenderClient.spawn(['--max-workers', '1'])
+        result = client.render(blob=BLOB, blob_path='main.py')
+        client.close()
+        self.assertEqual(client.process.returncode, 0)
+        self.assertEqual(
+            result.rendered,
+            LoadedBlock(blob=BLOB, blob_path='main.py').rendered
+        )
@@ -0,0 +1,99 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for StylesheetRegistry"""
+
+from os import utime
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from mock import patch
+
+from wotw_highlighter import StylesheetRegistry
+
+
+class StylesheetRegistryTestCase(TestCase):
+    """Collects common items and defaults across test cases"""
+
+    def setUp(self):
+        StylesheetRegistry.clear()
+        self.directory = mkdtemp()
+        self.addCleanup(rmtree, self.directory)
+        self.addCleanup(StylesheetRegistry.clear)
+
+    def write_stylesheet(self, name, contents, modified_time=None):
+        path = join(self.directory, name)
+        with open(path, 'w') as css_file:
+            css_file.write(contents)
+        if modified_time is not None:
+            utime(path, (modified_time, modified_time))
+        return path
+
+
+class MinifyUnitTests(TestCase):
+
+    def test_minify(self):
+        self.assertEqual(
+            StylesheetRegistry.minify(
+                '/*! keep */\n'
+                '/* drop */\n'
+                'table.highlighttable tr > td,\n'
+                'a:hover {\n'
+                '    font-family: a, "b c";\n'
+                '    padding: 0 10px;\n'
+                '}\n'
+            ),
+            '/*! keep */ table.highlighttable tr>td,a:hover'
+            '{font-family:a,"b c";padding:0 10px}'
+        )
+
+    def test_strings_are_untouched(self):
+        self.assertEqual(
+            StylesheetRegistry.minify(
+                'a::before { content: "a, b ; } /* c */"; }\n'
+                "b::after { content: 'd > e:  f' }\n"
+            ),
+            'a::before{content:"a, b ; } /* c */"}'
+            "b::after{content:'d > e:  f'}"
+        )
+
+
+class LoadUnitTests(StylesheetRegistryTestCase):
+
+    def test_read_once(self):
+        path = self.write_stylesheet('a.css', 'p { color: red; }', 1000)
+        self.assertEqual(StylesheetRegistry.load(path), 'p{color:red}')
+        with patch('wotw_highlighter.stylesheet_registry.open') as mock_open:
+            self.assertEqual(StylesheetRegistry.load(path), 'p{color:red}')
+            mock_open.assert_not_called()
+
+    def test_reload_after_change(self):
+        path = self.write_stylesheet('a.css', 'p { color: red; }', 1000)
+        StylesheetRegistry.load(path)
+        self.write_stylesheet('a.css', 'p { color: blue; }', 2000)
+        self.assertEqual(StylesheetRegistry.load(path), 'p{color:blue}')
+
+
+class StylesheetUnitTests(StylesheetRegistryTestCase):
+
+    def test_combined(self):
+        first = self.write_stylesheet('a.css', 'p { color: red; }', 1000)
+        second = self.write_stylesheet('b.css', 'a { color: blue; }', 1000)
+        combined = StylesheetRegistry.stylesheet(first, second)
+        self.assertEqual(combined, 'p{color:red}a{color:blue}')
+        self.assertIs(StylesheetRegistry.stylesheet(first, second), combined)
+
+    def test_combined_after_change(self):
+        first = self.write_stylesheet('a.css', 'p { color: red; }', 1000)
+        combined = StylesheetRegistry.stylesheet(first)
+        self.write_stylesheet('a.css', 'p { color: blue; }', 2000)
+        self.assertNotEqual(StylesheetRegistry.stylesheet(first), combined)
+
+    def test_rules(self):
+        path = self.write_stylesheet('a.css', 'p { color: red; }', 1000)
+        self.assertEqual(
+            StylesheetRegistry.rules(path),
+            [([(None, ('p', frozenset(), frozenset()))], [('color', 'red')])]
+        )
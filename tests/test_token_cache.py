@@ -0,0 +1,147 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for TokenCache and TokenStream"""
+
+from unittest import TestCase
+
+from mock import patch
+from pygments.lexers.python import PythonLexer
+from pygments.token import Text
+
+from wotw_highlighter import BlockHighlighter, TokenCache
+from wotw_highlighter.block import LoadedBlock
+from wotw_highlighter.token_cache import TokenStream
+
+
+BLOB = (
+    u'import os\n'
+    u'\n'
+    u'def main():\n'
+    u'    """Prints é"""\n'
+    u'    print(os.getcwd())\n'
+)
+
+
+class TokenStreamUnitTests(TestCase):
+
+    def setUp(self):
+        highlighter = BlockHighlighter(blob=BLOB)
+        highlighter.lexer = self.lexer = PythonLexer()
+        self.text = highlighter.preprocess(BLOB)
+        self.expected = list(self.lexer.get_tokens(BLOB))
+
+    def test_round_trip(self):
+        stream = TokenStream.encode(self.text, self.expected)
+        self.assertEqual(list(stream.tokens(self.text)), self.expected)
+        self.assertEqual(len(stream), len(self.expected))
+        self.assertEqual(stream.values, dict())
+
+    def test_compact_arrays(self):
+        stream = TokenStream.encode(self.text, self.expected)
+        self.assertEqual(stream.codes.typecode, 'B')
+        self.assertEqual(stream.ends.typecode, 'I')
+        self.assertEqual(len(stream.types), len(set(stream.types)))
+        self.assertEqual(stream.size(), 5 * len(self.expected))
+
+    def test_rewritten_values(self):
+        tokens = [(Text, u'import'), (Text, u'IMPORT'), (Text, u' os\n')]
+        stream = TokenStream.encode(u'import os\n', tokens)
+        self.assertEqual(stream.values, {1: u'IMPORT'})
+        self.assertEqual(list(stream.tokens(u'import os\n')), tokens)
+
+
+    def test_record_passes_tokens_through(self):
+        streams = []
+        recorded = TokenStream.record(
+            self.text,
+            iter(self.expected),
+            streams.append
+        )
+        self.assertEqual(next(recorded), self.expected[0])
+        self.assertEqual(streams, [])
+        self.assertEqual(list(recorded), self.expected[1:])
+        self.assertEqual(list(streams[0].tokens(self.text)), self.expected)
+
+    def test_record_stops_early(self):
+        streams = []
+        recorded = TokenStream.record(
+            self.text,
+            iter(self.expected),
+            streams.append
+        )
+        next(recorded)
+        recorded.close()
+        self.assertEqual(streams, [])
+
+
+class TokenCacheUnitTests(TestCase):
+
+    def stream(self, length):
+        return TokenStream.encode(u'x' * length, [(Text, u'x')] * length)
+
+    def test_key_for(self):
+        lexer = PythonLexer()
+        self.assertEqual(
+            TokenCache.key_for(lexer, BLOB, 'qqq'),
+            ('qqq', 'pygments.lexers.python.PythonLexer', TokenCache.key_for(
+                lexer,
+                BLOB
+            )[2])
+        )
+        self.assertNotEqual(
+            TokenCache.key_for(lexer, BLOB),
+            TokenCache.key_for(lexer, BLOB + u'\n')
+        )
+        self.assertNotEqual(
+            TokenCache.key_for(lexer, BLOB),
+            TokenCache.key_for(PythonLexer(tabsize=4), BLOB)
+        )
+
+    def test_get_and_set(self):
+        cache = TokenCache()
+        stream = self.stream(3)
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', stream)
+        self.assertIs(cache.get('key'), stream)
+        cache.set('key', self.stream(2))
+        self.assertEqual(cache.size, self.stream(2).size())
+
+    def test_evicts_least_recently_used(self):
+        cache = TokenCache(max_size=self.stream(4).size())
+        cache.set('first', self.stream(2))
+        cache.set('second', self.stream(2))
+        cache.get('first')
+        cache.set('third', self.stream(2))
+        self.assertEqual(list(cache.entries), ['first', 'third'])
+        self.assertEqual(cache.size, self.stream(4).size())
+
+    def test_oversized_streams_are_dropped(self):
+        cache = TokenCache(max_size=1)
+        cache.set('key', self.stream(2))
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.size, 0)
+
+
+class BlockTokenCacheUnitTests(TestCase):
+
+    def render(self, **kwargs):
+        return LoadedBlock(
+            blob=BLOB,
+            blob_path='main.py',
+            **kwargs
+        ).rendered
+
+    def test_rerendering_reuses_tokens(self):
+        token_cache = TokenCache()
+        self.render(token_cache=token_cache)
+        self.assertEqual(len(token_cache.entries), 1)
+        for options in (dict(), dict(linenos=False), dict(title='main')):
+            expected = self.render(**options)
+            with patch.object(PythonLexer, 'get_tokens_unprocessed') as lex:
+                self.assertEqual(
+                    self.render(token_cache=token_cache, **options),
+                    expected
+                )
+            lex.assert_not_called()
+        self.assertEqual(len(token_cache.entries), 1)
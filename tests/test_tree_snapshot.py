@@ -0,0 +1,167 @@
+# pylint: disable=C0103
+# pylint: disable=C0111
+# pylint: disable=W0201
+"""This file collects tests for TreeSnapshot"""
+
+from concurrent.futures import ThreadPoolExecutor
+from io import open as io_open
+from json import load
+from os import makedirs, symlink
+from os.path import dirname, isdir, isfile, join
+from shutil import rmtree
+from subprocess import check_call, check_output
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from mock import MagicMock
+
+from wotw_highlighter import Block, MemoryRenderCache, TreeSnapshot
+
+
+class TreeSnapshotTestCase(TestCase):
+    """Builds a scratch repo with code, binaries, and a symlink per test"""
+
+    FILES = {
+        'main.py': b'import os\n\nprint(os.getcwd())\n',
+        'setup.py': b'from setuptools import setup\n\nsetup()\n',
+        'web/site.css': b'a { color: red }\n',
+        'web/index.html': b'<p>\n  hello\n</p>\n',
+        'docs/notes.txt': b'plain text\n',
+        'empty.txt': b'',
+        'logo.png': b'\x89PNG\r\n\x1a\n\0\0\0\rIHDR',
+    }
+
+    def git(self, *args):
+        return check_output(
+            ('git',) + args,
+            cwd=self.repository,
+        ).decode('utf-8').strip()
+
+    def setUp(self):
+        self.repository = mkdtemp()
+        self.addCleanup(rmtree, self.repository)
+        self.output = mkdtemp()
+        self.addCleanup(rmtree, self.output)
+        check_call(['git', 'init', '-q', self.repository])
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'test')
+        for path, contents in self.FILES.items():
+            full_path = join(self.repository, path)
+            if not isdir(dirname(full_path)):
+                makedirs(dirname(full_path))
+            with open(full_path, 'wb') as blob_file:
+                blob_file.write(contents)
+        symlink('main.py', join(self.repository, 'link.py'))
+        self.git('add', '-A')
+        self.git('commit', '-q', '-m', 'snapshot')
+        self.git('tag', 'v1.0.0')
+        # The snapshot reads the tag, not the work tree
+        with open(join(self.repository, 'main.py'), 'w') as blob_file:
+            blob_file.write('changed = True\n')
+        self.executor = ThreadPoolExecutor(2)
+        self.addCleanup(self.executor.shutdown)
+
+    def snapshot(self, **kwargs):
+        kwargs.setdefault('executor', self.executor)
+        return TreeSnapshot(
+            'v1.0.0',
+            blob_working_directory=self.repository,
+            **kwargs
+        )
+
+    def read_output(self, name):
+        with io_open(join(self.output, name), 'r', encoding='utf-8') as output:
+            return output.read()
+
+
+class ConstructorUnitTests(TreeSnapshotTestCase):
+
+    def test_per_file_options(self):
+        with self.assertRaisesRegexp(ValueError, 'chosen per file'):
+            self.snapshot(blob='x = 1\n')
+
+    def test_unknown_backend(self):
+        with self.assertRaisesRegexp(ValueError, 'is not a git backend'):
+            self.snapshot(git_backend='qqq')
+
+
+class WriteUnitTests(TreeSnapshotTestCase):
+
+    def assert_snapshot(self, **kwargs):
+        manifest = self.snapshot(**kwargs).write(self.output)
+        self.assertEqual(
+            manifest['git_ref_hash'],
+            self.git('rev-parse', 'v1.0.0')
+        )
+        self.assertEqual(
+            [entry['path'] for entry in manifest['files']],
+            [
+                'docs/notes.txt',
+                'main.py',
+                'setup.py',
+                'web/index.html',
+                'web/site.css',
+            ]
+        )
+        for entry in manifest['files']:
+            self.assertEqual(
+                entry['git_blob_hash'],
+                self.git('rev-parse', 'v1.0.0:%s' % (entry['path']))
+            )
+            self.assertEqual(entry['size'], len(self.FILES[entry['path']]))
+            self.assertEqual(
+                self.read_output(entry['fragment']),
+                Block(
+                    'v1.0.0:%s' % (entry['path']),
+                    blob_working_directory=self.repository,
+                    **kwargs
+                ).rendered
+            )
+        self.assertEqual(
+            [(entry['path'], entry['reason']) for entry in manifest['skipped']],
+            [
+                ('empty.txt', 'empty'),
+                ('link.py', 'symlink'),
+                ('logo.png', 'binary'),
+            ]
+        )
+        with open(join(self.output, 'manifest.json')) as manifest_file:
+            self.assertEqual(load(manifest_file), manifest)
+        return manifest
+
+    def test_cat_file_backend(self):
+        manifest = self.assert_snapshot()
+        self.assertEqual(manifest['stylesheet'], 'styles.css')
+        self.assertTrue(self.read_output('styles.css'))
+
+    def test_object_store_backend(self):
+        self.assert_snapshot(git_backend='python')
+
+    def test_inline_css(self):
+        manifest = self.assert_snapshot(inline_css=True)
+        self.assertIsNone(manifest['stylesheet'])
+        self.assertFalse(isfile(join(self.output, 'styles.css')))
+
+    def test_process_pool(self):
+        manifest = self.snapshot(executor=None, max_workers=1).write(
+            self.output
+        )
+        self.assertEqual(len(manifest['files']), 5)
+
+    def test_render_cache(self):
+        render_cache = MemoryRenderCache()
+        self.snapshot(render_cache=render_cache).write(self.output)
+        executor = MagicMock()
+        manifest = self.snapshot(
+            executor=executor,
+            render_cache=render_cache
+        ).write(self.output)
+        executor.submit.assert_not_called()
+        self.assertEqual(len(manifest['files']), 5)
+
+    def test_missing_ref(self):
+        with self.assertRaisesRegexp(ValueError, 'is not a valid git ref'):
+            TreeSnapshot(
+                'qqq',
+                blob_working_directory=self.repository
+            ).write(self.output)
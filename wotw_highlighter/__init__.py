@@ -1,13 +1,72 @@
 """
 Package wotw-highlighter creates editor-esque (Sublime, VS Code) blocks via
 the amazing Pygments and some opinionated markup
+
+Everything below is imported on first access, so short-lived processes
+only pay for the stages they use
 """
 
+from importlib import import_module
+from sys import version_info
+
 from .__version__ import __version__
-from .block_options import BlockOptions
-from .block_header import BlockHeader
-from .block_loader import BlockLoader
-from .block_highlighter import BlockHighlighter
-from .block_decorator import BlockDecorator
-from .block_styler import BlockStyler
-from .block import Block
+
+LAZY_ATTRIBUTES = {
+    'BlockObserver': 'block_observer',
+    'TimingAggregator': 'block_observer',
+    'BlockOptions': 'block_options',
+    'GitBackend': 'git_backend',
+    'GitChannel': 'git_channel',
+    'GitObjectStore': 'git_object_store',
+    'BlockHeader': 'block_header',
+    'BlockFormatter': 'block_formatter',
+    'CssInliner': 'css_inliner',
+    'InlineStream': 'css_inliner',
+    'StylesheetRegistry': 'stylesheet_registry',
+    'BlockLoader': 'block_loader',
+    'BlockHighlighter': 'block_highlighter',
+    'IncrementalHighlighter': 'incremental_highlighter',
+    'DiffHighlighter': 'diff_highlighter',
+    'TreeSnapshot': 'tree_snapshot',
+    'BlockDecorator': 'block_decorator',
+    'BlockStyler': 'block_styler',
+    'Block': 'block',
+    'RenderResult': 'block',
+    'RenderCache': 'render_cache',
+    'MemoryRenderCache': 'render_cache',
+    'DirectoryRenderCache': 'render_cache',
+    'TokenCache': 'token_cache',
+    'RenderServer': 'render_server',
+    'RenderClient': 'render_server',
+    'AsyncRenderer': 'block_async',
+}
+
+__all__ = ['__version__'] + sorted(LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    """Imports the module that provides name and caches the result"""
+    if name not in LAZY_ATTRIBUTES:
+        raise AttributeError(
+            'module %r has no attribute %r' % (__name__, name)
+        )
+    value = getattr(
+        import_module('.%s' % (LAZY_ATTRIBUTES[name]), __name__),
+        name
+    )
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_ATTRIBUTES))
+
+
+def import_eagerly():
+    """Imports everything up front where module __getattr__ (PEP 562) isn't"""
+    for name in LAZY_ATTRIBUTES:
+        __getattr__(name)
+
+
+if version_info < (3, 7):
+    import_eagerly()
@@ -0,0 +1,141 @@
+"""This file provides a class to read all or part of a local file"""
+
+from codecs import (
+    BOM_UTF8,
+    BOM_UTF16_BE,
+    BOM_UTF16_LE,
+    BOM_UTF32_BE,
+    BOM_UTF32_LE,
+    getincrementaldecoder,
+    lookup,
+)
+from mmap import ACCESS_READ, mmap
+from os import fstat
+from os.path import realpath
+
+import re
+
+from wotw_highlighter.line_index import LineIndex
+
+# UTF-32 LE has to be checked before the UTF-16 LE mark it starts with
+BYTE_ORDER_MARKS = (
+    (BOM_UTF32_LE, 'utf-32-le'),
+    (BOM_UTF32_BE, 'utf-32-be'),
+    (BOM_UTF8, 'utf-8'),
+    (BOM_UTF16_LE, 'utf-16-le'),
+    (BOM_UTF16_BE, 'utf-16-be'),
+)
+
+CODING_PATTERN = re.compile(br'^[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)')
+
+
+def detect_encoding(sample, default='utf-8', fallback='latin-1'):
+    """
+    Guesses how a file is encoded from its first bytes: a byte order mark, a
+    PEP 263 coding comment in the first two lines, then default if the
+    sample decodes with it and fallback if not
+
+    Returns (encoding, byte order mark length)
+    """
+    for mark, encoding in BYTE_ORDER_MARKS:
+        if sample.startswith(mark):
+            return encoding, len(mark)
+    for line in sample.split(b'\n', 2)[:2]:
+        match = CODING_PATTERN.match(line)
+        if match:
+            try:
+                return lookup(match.group(1).decode('ascii')).name, 0
+            except LookupError:
+                break
+    try:
+        # Not final, so a character cut off by the sample doesn't count
+        getincrementaldecoder(default)().decode(sample, False)
+    except UnicodeDecodeError:
+        return fallback, 0
+    return default, 0
+
+
+class BlobFile(object):
+    """
+    This class reads a local file's text. Files past MMAP_THRESHOLD are
+    memory-mapped so a line range only touches the pages up to its end and
+    only decodes its own bytes; where lines start is kept in a shared
+    LineIndex until the file changes
+
+    Lines are counted on newlines, like the formatter numbers them
+    """
+
+    MMAP_THRESHOLD = 1024 * 1024
+    SAMPLE_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        """
+        Parameters:
+        path: The file to read
+        """
+        self.path = path
+
+    def read(self, start_line=None, end_line=None):
+        """
+        Returns the text of lines start_line through end_line, counting from
+        1, or the whole file; newlines are normalized to \\n
+
+        Raises IOError when the file can't be read
+        """
+        return self.read_excerpt(start_line, end_line)[1]
+
+    def read_excerpt(self, start_line=None, end_line=None, lead_in_line=None):
+        """
+        Returns (lead_in, text) where text is what read returns and lead_in
+        holds the lines from lead_in_line up to start_line
+        """
+        with open(self.path, 'rb') as blob_file:
+            stat = fstat(blob_file.fileno())
+            key = (
+                realpath(self.path),
+                stat.st_ino,
+                stat.st_size,
+                stat.st_mtime,
+            )
+            if stat.st_size < self.MMAP_THRESHOLD:
+                return self.decode(
+                    blob_file.read(),
+                    key,
+                    start_line,
+                    end_line,
+                    lead_in_line
+                )
+            buffer = mmap(blob_file.fileno(), 0, access=ACCESS_READ)
+            try:
+                return self.decode(
+                    buffer,
+                    key,
+                    start_line,
+                    end_line,
+                    lead_in_line
+                )
+            finally:
+                buffer.close()
+
+    @staticmethod
+    def normalize(text):
+        """Converts every newline to \\n"""
+        return text.replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+
+    def decode(self, buffer, key, start_line, end_line, lead_in_line):
+        """Decodes the requested lines of buffer and their lead-in"""
+        encoding, mark_length = detect_encoding(buffer[:self.SAMPLE_SIZE])
+        lead_in_begin = begin = mark_length
+        end = len(buffer)
+        if start_line is not None or end_line is not None:
+            lead_in_begin, begin, end = LineIndex.for_key(
+                key,
+                u'\n'.encode(encoding),
+                mark_length
+            ).excerpt(buffer, start_line, end_line, lead_in_line)
+        return (
+            self.normalize(
+                buffer[lead_in_begin:begin].decode(encoding, 'replace')
+            ),
+            self.normalize(buffer[begin:end].decode(encoding, 'replace')),
+        )
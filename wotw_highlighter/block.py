@@ -1,14 +1,31 @@
 """This file provides a class to build and run everything"""
 
+from collections import namedtuple
+from os.path import splitext
+
 from wotw_highlighter.block_options import BlockOptions
 from wotw_highlighter.block_loader import BlockLoader
-from wotw_highlighter.block_highlighter import BlockHighlighter
 from wotw_highlighter.block_styler import BlockStyler
-from wotw_highlighter.block_decorator import BlockDecorator
+
+
+RenderResult = namedtuple(
+    'RenderResult',
+    [
+        'rendered',
+        'highlighted_blob_styles',
+        'error',
+    ]
+)
 
 
 class Block(BlockOptions):
-    """This class loads code, highlights, and returns a polished block"""
+    """
+    This class loads code, highlights, and returns a polished block. Every
+    stage works on the block's own context, so options are never copied
+    and each stage validates once per block
+    """
+
+    cache_key = None
 
     def __init__(self, *args, **kwargs):
         super(Block, self).__init__(*args, **kwargs)
@@ -16,29 +33,87 @@ class Block(BlockOptions):
 
     def load(self):
         """Loads the block"""
-        loaded_block = BlockLoader(**self.full_options())
-        loaded_block.load()
-        self.update_options(**loaded_block.full_options())
+        with self.observe('load') as details:
+            BlockLoader.for_context(self.context).load()
+            details['bytes_in'] = len(self.blob or '')
 
     def highlight(self):
         """Highlights the block"""
-        highlighted_block = BlockHighlighter(**self.full_options())
-        highlighted_block.attach_lexer()
-        highlighted_block.attach_formatter()
-        highlighted_block.highlight()
-        self.update_options(**highlighted_block.full_options())
+        # Pygments' formatters are the slowest import; cache hits skip them
+        if self.base_blob is None:
+            from wotw_highlighter.block_highlighter import BlockHighlighter
+        else:
+            from wotw_highlighter.diff_highlighter import (
+                DiffHighlighter as BlockHighlighter
+            )
+        with self.observe('highlight') as details:
+            highlighted_block = BlockHighlighter.for_context(self.context)
+            highlighted_block.attach_lexer()
+            highlighted_block.attach_formatter()
+            highlighted_block.highlight()
+            details['bytes_out'] = len(self.highlighted_blob or '')
 
     def style(self):
         """Styles the block"""
-        styled_block = BlockStyler(**self.full_options())
-        styled_block.set_styles()
-        self.update_options(**styled_block.full_options())
+        with self.observe('style'):
+            BlockStyler.for_context(self.context).set_styles()
 
     def decorate(self):
         """Applies any decorations"""
-        decorated_block = BlockDecorator(**self.full_options())
-        decorated_block.decorate()
-        self.update_options(**decorated_block.full_options())
+        from wotw_highlighter.block_decorator import BlockDecorator
+        with self.observe('decorate') as details:
+            BlockDecorator.for_context(self.context).decorate()
+            details['bytes_out'] = len(self.highlighted_blob or '')
+
+    def render_cache_key(self):
+        """Returns the render cache key if the block can be cached"""
+        if self.render_cache is None or not self.git_blob_hash:
+            return None
+        if self.base_blob is not None and not self.git_base_blob_hash:
+            return None
+        return self.render_cache.key_for(
+            self.full_options(),
+            BlockStyler.dump_styles()
+        )
+
+    def load_cached(self, cache_key):
+        """Attempts to pull the rendered block from the cache"""
+        if cache_key is None:
+            return False
+        cached = self.render_cache.get(cache_key)
+        if cached is None:
+            if self.observer is not None:
+                self.observer.counted('cache.miss')
+            return False
+        if self.observer is not None:
+            self.observer.counted('cache.hit')
+        self.highlighted_blob, self.highlighted_blob_styles = cached
+        return True
+
+    def prepare(self):
+        """Loads the block then tries the cache; True means it's rendered"""
+        self.load()
+        self.cache_key = self.render_cache_key()
+        return self.load_cached(self.cache_key)
+
+    def render(self):
+        """Runs every stage after loading"""
+        self.highlight()
+        self.style()
+        self.decorate()
+
+    def render_to_stream(self):
+        """Styles first so everything can be written while highlighting"""
+        self.style()
+        self.highlight()
+
+    def store_cached(self):
+        """Saves a fresh render in the cache if the block can be cached"""
+        if self.cache_key is not None:
+            self.render_cache.set(
+                self.cache_key,
+                (self.highlighted_blob, self.highlighted_blob_styles)
+            )
 
     def compile(self):
         """
@@ -46,12 +121,195 @@ class Block(BlockOptions):
 
         EXECUTION ORDER MATTERS
         """
-        self.load()
-        self.highlight()
-        self.style()
-        self.decorate()
+        if self.prepare():
+            if self.outfile is not None:
+                self.outfile.write(self.highlighted_blob)
+            return
+        if self.outfile is not None:
+            self.render_to_stream()
+            return
+        self.render()
+        self.store_cached()
+
+    @classmethod
+    def render_async(cls, *args, **kwargs):
+        """
+        Returns an awaitable that renders like Block(*args, **kwargs) without
+        blocking the event loop
+
+        Parameters:
+        renderer: The AsyncRenderer to use; the running loop's shared one is
+            used if not given. Build one to pick the executor and how many
+            blocks may render at once
+
+        Resolves to a block whose rendered property is the markup
+        """
+        from wotw_highlighter.block_async import render_with_default
+        renderer = kwargs.pop('renderer', None)
+        if renderer is None:
+            return render_with_default(*args, **kwargs)
+        return renderer.render(*args, **kwargs)
+
+    @staticmethod
+    def batch_group(options):
+        """Blocks sharing a repo and lexer land on the same worker"""
+        return (
+            options['blob_working_directory'] or '',
+            options['explicit_lexer_name']
+            or splitext(options['blob_path'] or '')[1],
+        )
+
+    @classmethod
+    def render_many(cls, specs, max_workers=None, executor=None):
+        """
+        Loads every block here then fans the rendering out over processes
+
+        Parameters:
+        specs: A list of kwargs, one per block; raw replaces the positional arg
+        max_workers: The size of the pool to create if executor is None
+        executor: An existing concurrent.futures executor to reuse
+
+        Returns a RenderResult per spec, in input order
+        """
+        results = [None] * len(specs)
+        pending = []
+        for index, spec in enumerate(specs):
+            try:
+                block = DeferredBlock(**spec)
+            except Exception as error:  # pylint: disable=broad-except
+                results[index] = RenderResult(None, None, error)
+                continue
+            if block.cache_hit:
+                results[index] = RenderResult(
+                    block.highlighted_blob,
+                    block.highlighted_blob_styles,
+                    None
+                )
+            else:
+                pending.append((index, block))
+        if not pending:
+            return results
+        owned_executor = executor is None
+        if owned_executor:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers)
+        try:
+            futures = []
+            for group in cls.batch_chunks(pending, max_workers):
+                futures.append((
+                    group,
+                    executor.submit(
+                        render_loaded_group,
+                        [(index, block.worker_options()) for index, block in group]
+                    )
+                ))
+            for group, future in futures:
+                cls.collect_group(group, future, results)
+        finally:
+            if owned_executor:
+                executor.shutdown()
+        return results
+
+    @classmethod
+    def batch_chunks(cls, pending, max_workers=None):
+        """Splits grouped blocks into chunks small enough to keep workers busy"""
+        pending = sorted(
+            pending,
+            key=lambda item: cls.batch_group(item[1].full_options())
+        )
+        chunk_size = max(1, len(pending) // (4 * (max_workers or 8)))
+        chunks = []
+        current_group = None
+        for item in pending:
+            group = cls.batch_group(item[1].full_options())
+            if group != current_group or len(chunks[-1]) >= chunk_size:
+                chunks.append([])
+                current_group = group
+            chunks[-1].append(item)
+        return chunks
+
+    @staticmethod
+    def collect_group(group, future, results):
+        """Records a finished chunk, caching each successful render"""
+        blocks = dict(group)
+        try:
+            rendered = future.result()
+        except Exception as error:  # pylint: disable=broad-except
+            for index, _ in group:
+                results[index] = RenderResult(None, None, error)
+            return
+        for index, highlighted_blob, highlighted_blob_styles, error in rendered:
+            if error is None:
+                block = blocks[index]
+                block.highlighted_blob = highlighted_blob
+                block.highlighted_blob_styles = highlighted_blob_styles
+                block.store_cached()
+            results[index] = RenderResult(
+                highlighted_blob,
+                highlighted_blob_styles,
+                error
+            )
 
     @property
     def rendered(self):
         """Returns the highlighted block"""
         return self.highlighted_blob
+
+
+class DeferredBlock(Block):
+    """This class loads and checks the cache but leaves rendering for later"""
+
+    cache_hit = False
+
+    def compile(self):
+        """Stops after prepare"""
+        self.cache_hit = self.prepare()
+
+    def worker_options(self):
+        """Collects the options a worker needs; the cache stays here"""
+        options = self.full_options()
+        options['observer'] = None
+        options['outfile'] = None
+        options['render_cache'] = None
+        options['token_cache'] = None
+        return options
+
+
+class PreloadedBlock(DeferredBlock):
+    """This class prepares a block whose blob was already read in bulk"""
+
+    def load(self):
+        """The blob is already on the context"""
+        return self.blob
+
+
+class LoadedBlock(Block):
+    """This class renders a blob that was loaded in another process"""
+
+    def load(self):
+        """The blob arrived with the options"""
+        return self.blob
+
+
+def render_loaded_group(group):
+    """
+    Renders a chunk of loaded blocks inside a worker process
+
+    Parameters:
+    group: A list of (index, options) pairs
+
+    Returns a list of (index, highlighted_blob, styles, error)
+    """
+    rendered = []
+    for index, options in group:
+        try:
+            block = LoadedBlock(**options)
+            rendered.append((
+                index,
+                block.highlighted_blob,
+                block.highlighted_blob_styles,
+                None
+            ))
+        except Exception as error:  # pylint: disable=broad-except
+            rendered.append((index, None, None, error))
+    return rendered
@@ -0,0 +1,385 @@
+"""
+This file provides an asyncio front end for rendering blocks; it's only
+imported when used
+"""
+
+from os.path import isabs, join, realpath
+from weakref import WeakKeyDictionary
+
+import asyncio
+
+from wotw_highlighter.blob_file import BlobFile
+from wotw_highlighter.block import PreloadedBlock, render_loaded_group
+from wotw_highlighter.block_loader import BlockLoader
+from wotw_highlighter.block_observer import observed
+from wotw_highlighter.block_options import BlockOptions
+from wotw_highlighter.git_channel import GitChannel
+from wotw_highlighter.git_object_store import GitObjectStore
+
+# get_running_loop is 3.7+; inside a coroutine, get_event_loop returns the
+# same loop on 3.6
+get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+
+class AsyncGitChannel(object):
+    """
+    This class is GitChannel over asyncio subprocesses: long-lived git
+    cat-file processes whose pipes are read without blocking the loop
+    """
+
+    BATCH = GitChannel.BATCH
+    BATCH_CHECK = GitChannel.BATCH_CHECK
+    MISSING_SUFFIXES = GitChannel.MISSING_SUFFIXES
+
+    def __init__(self, working_directory):
+        """
+        Parameters:
+        working_directory: The directory paths and refs are resolved from;
+            call discover_git_dir before anything else
+        """
+        self.working_directory = working_directory
+        self.git_dir = None
+        self.processes = dict()
+        self.locks = dict()
+
+    async def discover_git_dir(self):
+        """Locates the git directory once, failing if there isn't one"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'git', 'rev-parse', '--git-dir',
+                cwd=self.working_directory,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            git_dir, _ = await process.communicate()
+        except OSError:
+            git_dir, process = None, None
+        if process is None or process.returncode:
+            raise ValueError(
+                "'%s' is not a git repo"
+                % (
+                    self.working_directory,
+                )
+            )
+        git_dir = git_dir.decode('utf-8').strip()
+        if not isabs(git_dir):
+            git_dir = join(self.working_directory, git_dir)
+        self.git_dir = git_dir
+        return git_dir
+
+    async def start_process(self, mode):
+        """Spawns a cat-file process in the given batch mode"""
+        self.processes[mode] = await asyncio.create_subprocess_exec(
+            'git', 'cat-file', mode,
+            cwd=self.working_directory,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        return self.processes[mode]
+
+    def discard_process(self, mode):
+        """
+        Kills the cat-file process in the given batch mode, if any. A request
+        interrupted halfway leaves the pipe out of step, so this runs on
+        errors and cancellation alike
+        """
+        process = self.processes.pop(mode, None)
+        if process is not None and process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+        return process
+
+    async def exchange(self, mode, object_name):
+        """Sends one object name down the pipe and parses the response"""
+        process = self.processes.get(mode)
+        if process is None or process.returncode is not None:
+            process = await self.start_process(mode)
+        process.stdin.write(('%s\n' % (object_name)).encode('utf-8'))
+        await process.stdin.drain()
+        header = await process.stdout.readline()
+        if not header.endswith(b'\n'):
+            raise IOError('git cat-file %s exited unexpectedly' % (mode))
+        if header.endswith(self.MISSING_SUFFIXES):
+            return None
+        object_hash, object_type, size = header.decode('ascii').split()
+        if self.BATCH_CHECK == mode:
+            return object_hash, object_type, int(size)
+        try:
+            contents = await process.stdout.readexactly(int(size) + 1)
+        except asyncio.IncompleteReadError:
+            raise IOError('git cat-file %s exited unexpectedly' % (mode))
+        return object_hash, object_type, contents[:-1]
+
+    async def request(self, mode, object_name):
+        """Runs an exchange, restarting the process once if it has died"""
+        if '\n' in object_name:
+            return None
+        lock = self.locks.setdefault(mode, asyncio.Lock())
+        async with lock:
+            for _ in range(2):
+                try:
+                    return await self.exchange(mode, object_name)
+                except (IOError, OSError, ValueError):
+                    self.discard_process(mode)
+                except BaseException:
+                    self.discard_process(mode)
+                    raise
+            raise ValueError(
+                'Unable to query %s in %s'
+                % (
+                    object_name,
+                    self.working_directory,
+                )
+            )
+
+    async def object_info(self, object_name):
+        """Returns (hash, type, size) for object_name or None"""
+        return await self.request(self.BATCH_CHECK, object_name)
+
+    async def read_object(self, object_name):
+        """Returns (hash, type, contents) for object_name or None"""
+        return await self.request(self.BATCH, object_name)
+
+    async def close(self):
+        """Shuts down every process this channel owns"""
+        for mode in list(self.processes):
+            process = self.discard_process(mode)
+            if process is not None:
+                await process.wait()
+
+
+class PendingQuery(Exception):
+    """Raised by PrefetchedLoader for an answer it doesn't have yet"""
+
+    def __init__(self, method, object_name):
+        super(PendingQuery, self).__init__(method, object_name)
+        self.query = (method, object_name)
+
+
+class PrefetchedLoader(BlockLoader):
+    """
+    This class runs BlockLoader against answers fetched ahead of time. Any
+    git lookup or file read it hasn't seen raises PendingQuery so the caller
+    can fetch it asynchronously and run the loader again; loading is
+    idempotent, so replaying it costs a few regex matches
+    """
+
+    answers = None
+
+    @classmethod
+    def with_answers(cls, context, answers):
+        """Builds the loader over context before validating it"""
+        loader = cls.__new__(cls)
+        loader.context = context
+        loader.answers = answers
+        loader.validate_once()
+        return loader
+
+    def answer(self, method, object_name):
+        """Returns a fetched answer or asks for it"""
+        query = (method, object_name)
+        if query not in self.answers:
+            raise PendingQuery(method, object_name)
+        return self.answers[query]
+
+    def git_repository(self):
+        return self.answer('repository', self.blob_working_directory)
+
+    def query_git(self, method, object_name):
+        return self.answer(method, object_name)
+
+    def load_from_file(self):
+        """Loads the excerpt read off the loop, replaying a failed read"""
+        excerpt = self.answer(
+            'file',
+            (
+                join(self.blob_working_directory, self.blob_path),
+                self.start_line,
+                self.end_line,
+                self.lead_in_line(),
+            )
+        )
+        if isinstance(excerpt, IOError):
+            raise excerpt
+        lead_in, self.blob = excerpt
+        self.blob_lead_in = lead_in or None
+
+
+class AsyncBlock(PreloadedBlock):
+    """This class finishes a block whose blob was loaded asynchronously"""
+
+
+class AsyncRenderer(object):
+    """
+    This class renders blocks from asyncio code. Git lookups run on
+    AsyncGitChannel (or, for the 'python' backend, the loop's default
+    executor), local files are read on the default executor, and
+    highlighting runs on executor so the loop stays free
+
+    Usage:
+        renderer = AsyncRenderer(max_concurrency=4)
+        block = await renderer.render('HEAD:setup.py')
+        block.rendered
+        await renderer.close()
+    """
+
+    defaults = WeakKeyDictionary()
+
+    def __init__(self, executor=None, max_concurrency=8):
+        """
+        Parameters:
+        executor: The concurrent.futures executor that highlights; the loop's
+            default thread pool is used if None. A ProcessPoolExecutor keeps
+            Pygments from competing with the loop for the GIL
+        max_concurrency: How many blocks may render at once
+        """
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.semaphore = None
+        self.channels = dict()
+
+    @classmethod
+    def default(cls):
+        """Returns the shared renderer for the running loop"""
+        loop = get_running_loop()
+        if loop not in cls.defaults:
+            cls.defaults[loop] = cls()
+        return cls.defaults[loop]
+
+    @classmethod
+    async def close_default(cls):
+        """Closes the running loop's shared renderer, if it has one"""
+        renderer = cls.defaults.pop(get_running_loop(), None)
+        if renderer is not None:
+            await renderer.close()
+
+    def limit(self):
+        """Returns the semaphore bounding concurrent renders"""
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.semaphore
+
+    async def git_channel(self, working_directory):
+        """Returns the open channel for working_directory"""
+        key = realpath(working_directory)
+        channel = self.channels.get(key)
+        if channel is None:
+            channel = AsyncGitChannel(key)
+            await channel.discover_git_dir()
+            channel = self.channels.setdefault(key, channel)
+        return channel
+
+    @staticmethod
+    def read_file(path, start_line, end_line, lead_in_line):
+        """Reads an excerpt, returning any IOError for the loader to raise"""
+        try:
+            return BlobFile(path).read_excerpt(
+                start_line,
+                end_line,
+                lead_in_line
+            )
+        except IOError as error:
+            return error
+
+    async def answer(self, context, query):
+        """
+        Runs one git lookup or file read PrefetchedLoader asked for; file
+        reads and the 'python' backend run on the loop's default executor
+        """
+        method, object_name = query
+        if 'file' == method:
+            return await get_running_loop().run_in_executor(
+                None,
+                self.read_file,
+                *object_name
+            )
+        if 'python' == context.git_backend:
+            store = await get_running_loop().run_in_executor(
+                None,
+                GitObjectStore.for_repository,
+                context.blob_working_directory
+            )
+            if 'repository' == method:
+                return store
+            return await get_running_loop().run_in_executor(
+                None,
+                getattr(store, method),
+                object_name
+            )
+        channel = await self.git_channel(context.blob_working_directory)
+        if 'repository' == method:
+            return channel
+        return await getattr(channel, method)(object_name)
+
+    async def load(self, context):
+        """Loads context.blob, fetching answers as the loader needs them"""
+        answers = dict()
+        with observed(context.observer, 'load') as details:
+            while True:
+                try:
+                    PrefetchedLoader.with_answers(context, answers).load()
+                    break
+                except PendingQuery as pending:
+                    method = pending.query[0]
+                    with observed(
+                            context.observer,
+                            method if 'file' == method else 'git.%s' % (method)
+                    ):
+                        answers[pending.query] = await self.answer(
+                            context,
+                            pending.query
+                        )
+            details['bytes_in'] = len(context.blob or '')
+
+    async def render(self, *args, **kwargs):
+        """
+        Renders a block like Block(*args, **kwargs) without blocking the loop
+
+        Cancelling the task stops at the next await; a render already running
+        on the executor finishes there but its result is dropped
+
+        Returns the compiled block; its rendered property is the markup
+        """
+        loop = get_running_loop()
+        async with self.limit():
+            context = BlockOptions(*args, **kwargs).context
+            if context.outfile is not None:
+                raise ValueError('Streaming to outfile is not supported here')
+            await self.load(context)
+            block = AsyncBlock.for_context(context)
+            if context.render_cache is None:
+                block.compile()
+            else:
+                await loop.run_in_executor(None, block.compile)
+            if block.cache_hit:
+                return block
+            with observed(context.observer, 'render') as details:
+                rendered = await loop.run_in_executor(
+                    self.executor,
+                    render_loaded_group,
+                    [(0, block.worker_options())]
+                )
+                _, highlighted_blob, highlighted_blob_styles, error = rendered[0]
+                if error is not None:
+                    raise error
+                block.highlighted_blob = highlighted_blob
+                block.highlighted_blob_styles = highlighted_blob_styles
+                details['bytes_out'] = len(highlighted_blob or '')
+            if context.render_cache is not None:
+                await loop.run_in_executor(None, block.store_cached)
+            return block
+
+    async def close(self):
+        """Shuts down every git process this renderer started"""
+        channels = list(self.channels.values())
+        self.channels.clear()
+        for channel in channels:
+            await channel.close()
+
+
+async def render_with_default(*args, **kwargs):
+    """Renders on the running loop's shared AsyncRenderer"""
+    return await AsyncRenderer.default().render(*args, **kwargs)
@@ -0,0 +1,69 @@
+"""This file provides the object every stage of a block reads and writes"""
+
+OPTION_DEFAULTS = [
+    ('base_blob', None),
+    ('blob', None),
+    ('blob_lead_in', None),
+    ('blob_path', None),
+    ('blob_working_directory', None),
+    ('context_lines', None),
+    ('diff_view', 'unified'),
+    ('end_line', None),
+    ('explicit_lexer_name', None),
+    ('external_source_link', None),
+    ('git_backend', 'cat-file'),
+    ('git_base_ref_name', None),
+    ('git_base_blob_hash', None),
+    ('git_ref_name', None),
+    ('git_ref_hash', None),
+    ('git_blob_hash', None),
+    ('guess_lexer_names', None),
+    ('highlighted_blob', None),
+    ('highlighted_blob_styles', None),
+    ('inline_css', False),
+    ('inline_token_styles', False),
+    ('linenos', True),
+    ('no_header', False),
+    ('observer', None),
+    ('outfile', None),
+    ('raw', None),
+    ('render_cache', None),
+    ('start_line', None),
+    ('title', None),
+    ('token_cache', None),
+]
+
+
+class BlockContext(object):
+    """
+    This class holds one block's option values. A Block hands its context
+    to each stage, so stages change it in place instead of copying options
+    back and forth
+    """
+
+    OPTIONS = tuple(option for option, _ in OPTION_DEFAULTS)
+
+    __slots__ = OPTIONS + ('validated',)
+
+    def __init__(self):
+        for option, default in OPTION_DEFAULTS:
+            setattr(self, option, default)
+        self.validated = set()
+
+    def options(self):
+        """Returns every option value as a dict"""
+        return dict(
+            (option, getattr(self, option))
+            for option in self.OPTIONS
+        )
+
+
+def context_option(option):
+    """Builds a property that reads and writes option on self.context"""
+    def get_option(self):
+        return getattr(self.context, option)
+
+    def set_option(self, value):
+        setattr(self.context, option, value)
+
+    return property(get_option, set_option)
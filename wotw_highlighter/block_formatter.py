@@ -0,0 +1,334 @@
+"""This file provides a formatter that streams fully decorated blocks"""
+
+from itertools import islice
+
+from pygments.formatters.html import HtmlFormatter
+
+
+class InliningWriter(object):
+    """This class inlines CSS into everything written through it"""
+
+    def __init__(self, outfile, inliner):
+        """
+        Parameters:
+        outfile: The writable stream to pass inlined markup to
+        inliner: A compiled CssInliner
+        """
+        self.outfile = outfile
+        self.stream = inliner.stream()
+
+    def write(self, chunk):
+        """Inlines and passes along a chunk"""
+        self.outfile.write(self.stream.feed(chunk))
+
+    def close(self):
+        """Flushes anything the inliner held back"""
+        self.outfile.write(self.stream.close())
+
+
+class BlockFormatter(HtmlFormatter):
+    """
+    This class extends HtmlFormatter to write the block header, the line
+    numbers, and inlined styles as it goes, so nothing is buffered when the
+    line count is known up front
+
+    Additional options:
+    block_header = None
+        The header row to insert at the top of the table
+    block_linenos = True
+        Whether or not to write the line number column
+    formatted_lines = None
+        Code lines already run through format_code_lines to lay out instead
+        of formatting the tokens passed in
+    inliner = None
+        A CssInliner to run over everything written
+    line_count = None
+        The number of lines the lexer will produce; the code is buffered to
+        count them when this is None
+    skip_lines = 0
+        How many leading lines are only there to put the lexer in the right
+        state; they're formatted but not written
+    """
+
+    LINENOS_PER_WRITE = 1024
+
+    def __init__(self, **options):
+        options['linenos'] = 'table'
+        super(BlockFormatter, self).__init__(**options)
+        self.block_header = options.get('block_header')
+        self.block_linenos = options.get('block_linenos', True)
+        self.formatted_lines = options.get('formatted_lines')
+        self.inliner = options.get('inliner')
+        self.line_count = options.get('line_count')
+        self.skip_lines = options.get('skip_lines', 0)
+
+    @staticmethod
+    def count_newlines(text):
+        """Counts newlines the way lexers normalize them"""
+        return text.count('\n') + text.count('\r') - text.count('\r\n')
+
+    @classmethod
+    def count_lines(cls, text, lexer):
+        """
+        Counts the lines lexer will produce from text without making the
+        normalized copy the lexer does
+
+        Parameters:
+        text: The text to be highlighted
+        lexer: The lexer that will highlight it
+        """
+        start = 1 if text.startswith(u'\ufeff') else 0
+        end = len(text)
+        if lexer.stripall:
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+        elif lexer.stripnl:
+            while start < end and text[start] in '\r\n':
+                start += 1
+            while end > start and text[end - 1] in '\r\n':
+                end -= 1
+        lines = (
+            cls.count_newlines(text)
+            - cls.count_newlines(text[:start])
+            - cls.count_newlines(text[end:])
+        )
+        if start == end:
+            return lines + (1 if lexer.ensurenl else 0)
+        if text[end - 1] not in '\r\n':
+            lines += 1
+        return lines
+
+    def lineno_text(self, number, width):
+        """Pads number to width, leaving it blank off linenostep or if None"""
+        if number is None or number % self.linenostep:
+            return ' ' * width
+        return '%*d' % (width, number)
+
+    def lineno_style(self, special=False):
+        """Builds a line number's inline style from the style's colors"""
+        if special:
+            color = self.style.line_number_special_color
+            background_color = self.style.line_number_special_background_color
+        else:
+            color = self.style.line_number_color
+            background_color = self.style.line_number_background_color
+        return (
+            'color: %s; background-color: %s; '
+            'padding-left: 5px; padding-right: 5px;'
+            % (
+                color,
+                background_color,
+            )
+        )
+
+    def lineno_span(self, text, special=False):
+        """Wraps one line of the line number column"""
+        if self.noclasses:
+            return '<span style="%s">%s</span>' % (
+                self.lineno_style(special),
+                text
+            )
+        return '<span class="%s">%s</span>' % (
+            'special' if special else 'normal',
+            text
+        )
+
+    def batch_linenos(self, lines):
+        """Joins line number column lines into batches"""
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == self.LINENOS_PER_WRITE:
+                yield '\n'.join(batch)
+                batch = []
+        if batch:
+            yield '\n'.join(batch)
+
+    def render_linenos(self, line_count):
+        """Yields the line number column in batches"""
+        first = self.linenostart
+        width = len(str(line_count + first - 1))
+        return self.batch_linenos(
+            self.lineno_span(
+                self.lineno_text(number, width),
+                bool(
+                    self.linenospecial
+                    and 0 == number % self.linenospecial
+                )
+            )
+            for number in range(first, first + line_count)
+        )
+
+    def linenos_cell(self, batches):
+        """Wraps batches of line number column lines in their cell"""
+        yield 0, '<td class="linenos"><div class="linenodiv"><pre>'
+        for index, linenos in enumerate(batches):
+            yield 0, ('\n' if index else '') + linenos
+        yield 0, '</pre></div></td>'
+
+    def format_code_lines(self, tokensource):
+        """
+        Formats tokens into a list of code lines. Spans never cross lines, so
+        each line only depends on its own tokens
+        """
+        return [
+            line
+            for _, line in super(BlockFormatter, self)._format_lines(tokensource)
+        ]
+
+    def _format_lines(self, tokensource):
+        """Lays out formatted_lines when there are some, after skip_lines"""
+        if self.formatted_lines is not None:
+            return ((1, line) for line in self.formatted_lines)
+        lines = super(BlockFormatter, self)._format_lines(tokensource)
+        if self.skip_lines:
+            return islice(lines, self.skip_lines, None)
+        return lines
+
+    def _wrap_tablelinenos(self, inner):
+        """Writes the table around inner, streaming inner when possible"""
+        line_count = self.line_count
+        if line_count is None:
+            inner = list(inner)
+            line_count = sum(1 for code, _ in inner if code)
+        yield 0, '<table class="%stable">' % (self.cssclass)
+        if self.block_header:
+            yield 0, self.block_header
+        yield 0, '<tr>'
+        if self.block_linenos:
+            for piece in self.linenos_cell(self.render_linenos(line_count)):
+                yield piece
+        yield 0, '<td class="code"><div>'
+        for piece in inner:
+            yield piece
+        yield 0, '</div></td></tr></table>'
+
+    def format_unencoded(self, tokensource, outfile):
+        """Routes everything through the inliner when there is one"""
+        if self.inliner is None:
+            return super(BlockFormatter, self).format_unencoded(
+                tokensource,
+                outfile
+            )
+        writer = InliningWriter(outfile, self.inliner)
+        super(BlockFormatter, self).format_unencoded(tokensource, writer)
+        writer.close()
+        return None
+
+
+class DiffFormatter(BlockFormatter):
+    """
+    This class lays out the rows of a diff between two highlighted versions
+    of a blob: unified, with both line numbers and a +/- marker beside each
+    line, or side by side, with each version in its own column. Changed
+    lines are wrapped in diff-deleted and diff-inserted spans
+
+    Additional options:
+    diff_rows = []
+        (tag, base number, base line, number, line) for each row, where tag
+        is what difflib calls the change; numbers and lines are None where
+        a version has no line in the row
+    diff_view = 'unified'
+        'unified' or 'side-by-side'
+    """
+
+    MARKERS = {
+        'delete': '-',
+        'equal': ' ',
+        'insert': '+',
+    }
+
+    def __init__(self, **options):
+        super(DiffFormatter, self).__init__(**options)
+        self.diff_rows = options.get('diff_rows') or []
+        self.diff_view = options.get('diff_view', 'unified')
+
+    @staticmethod
+    def mark(line, kind):
+        """Wraps a changed line, newline included, like Pygments' hll"""
+        return '<span class="diff-%s">%s</span>' % (kind, line)
+
+    def base_column(self):
+        """Yields the base version's lines for a side-by-side view"""
+        for tag, _, base_line, _, _ in self.diff_rows:
+            if base_line is None:
+                yield 1, self.lineseparator
+            elif 'equal' == tag:
+                yield 1, base_line
+            else:
+                yield 1, self.mark(base_line, 'deleted')
+
+    def _format_lines(self, tokensource):
+        """Yields the unified column, or the newer version's side by side"""
+        side_by_side = 'side-by-side' == self.diff_view
+        for tag, _, base_line, _, line in self.diff_rows:
+            if line is None and side_by_side:
+                yield 1, self.lineseparator
+            elif 'equal' == tag:
+                yield 1, line
+            elif line is None:
+                yield 1, self.mark(base_line, 'deleted')
+            else:
+                yield 1, self.mark(line, 'inserted')
+
+    def number_width(self, index):
+        """How wide the numbers in one version's column get"""
+        return len(str(max(
+            [row[index] or 0 for row in self.diff_rows] or [0]
+        )))
+
+    def numbers(self, index):
+        """Yields one version's line number column"""
+        width = self.number_width(index)
+        return self.batch_linenos(
+            self.lineno_span(self.lineno_text(row[index], width))
+            for row in self.diff_rows
+        )
+
+    def unified_numbers(self):
+        """
+        Yields both versions' numbers and each row's marker; unified rows
+        are never tagged replace
+        """
+        base_width = self.number_width(1)
+        width = self.number_width(3)
+        return self.batch_linenos(
+            self.lineno_span(
+                '%s %s %s' % (
+                    self.lineno_text(base_number, base_width),
+                    self.lineno_text(number, width),
+                    self.MARKERS[tag],
+                )
+            )
+            for tag, base_number, _, number, _ in self.diff_rows
+        )
+
+    def _wrap_tablelinenos(self, inner):
+        """Writes the table around inner with a column per version"""
+        yield 0, '<table class="%stable diff-%s">' % (
+            self.cssclass,
+            self.diff_view,
+        )
+        if self.block_header:
+            yield 0, self.block_header
+        yield 0, '<tr>'
+        if 'side-by-side' == self.diff_view:
+            if self.block_linenos:
+                for piece in self.linenos_cell(self.numbers(1)):
+                    yield piece
+            yield 0, '<td class="code"><div>'
+            for piece in self.wrap(self.base_column()):
+                yield piece
+            yield 0, '</div></td>'
+            if self.block_linenos:
+                for piece in self.linenos_cell(self.numbers(3)):
+                    yield piece
+        elif self.block_linenos:
+            for piece in self.linenos_cell(self.unified_numbers()):
+                yield piece
+        yield 0, '<td class="code"><div>'
+        for piece in inner:
+            yield piece
+        yield 0, '</div></td></tr></table>'
@@ -41,7 +41,15 @@ blob_path and alternate_title cannot both be empty when generating a header\
         )
 
     def render_git_ref_name_tab(self):
-        """Renders the VCS branch tab"""
+        """Renders the VCS branch tab, or the range a diff covers"""
+        if self.git_base_ref_name:
+            return self.construct_code_tab(
+                '%s..%s'
+                % (
+                    self.git_base_ref_name,
+                    self.git_ref_name or '',
+                )
+            )
         if self.git_ref_name and 'HEAD' != self.git_ref_name:
             return self.construct_code_tab(self.git_ref_name)
         return self.RENDER_AN_OPTION_NOT_INCLUDED
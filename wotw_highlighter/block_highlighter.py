@@ -1,10 +1,19 @@
 """This file provides a class to highlight code"""
 
-from pygments import lexers, highlight
-from pygments.formatters.html import HtmlFormatter
-from pygments.util import ClassNotFound
+from fnmatch import fnmatchcase
+from os.path import basename, splitext
+from threading import Lock
 
+from pygments import format as format_tokens, lexers
+from pygments.lexers.special import TextLexer
+from pygments.plugin import find_plugin_lexers
+
+from wotw_highlighter.block_formatter import BlockFormatter
+from wotw_highlighter.block_header import BlockHeader
 from wotw_highlighter.block_options import BlockOptions
+from wotw_highlighter.block_styler import BlockStyler
+from wotw_highlighter.css_inliner import CssInliner
+from wotw_highlighter.token_cache import TokenCache, TokenStream
 
 
 class BlockHighlighter(BlockOptions):
@@ -16,14 +25,29 @@ class BlockHighlighter(BlockOptions):
         'stripnl': True
     }
 
+    EXCERPT_LEXER_OPTIONS = {
+        'stripnl': False
+    }
+
     DEFAULT_HTMLFORMATTER_OPTIONS = {
         'linenos': True,
         'lineseparator': '<br />'
     }
 
+    GLOB_CHARACTERS = '*?['
+
+    GUESS_PREFIX_LENGTH = 4096
+
+    formatter_class = BlockFormatter
+
     lexer = None
     formatter = None
 
+    filename_index = None
+    lexer_classes_by_filename = dict()
+    lexer_instances = dict()
+    lexer_lock = Lock()
+
     def validate(self):
         """Validates BlockHighlighter options"""
         if not self.blob:
@@ -34,38 +58,255 @@ class BlockHighlighter(BlockOptions):
                 not hasattr(lexers, self.explicit_lexer_name)
         ):
             raise ValueError('The specified lexer (%s) could not be found')
+        for lexer_name in self.guess_lexer_names or []:
+            if not hasattr(lexers, lexer_name):
+                raise ValueError(
+                    'The candidate lexer (%s) could not be found'
+                    % (lexer_name)
+                )
+
+    @classmethod
+    def index_filename_pattern(cls, index, pattern, lexer):
+        """Files a lexer's filename glob under the cheapest key it has"""
+        exact, by_extension, wildcards = index
+        if not any(character in pattern for character in cls.GLOB_CHARACTERS):
+            exact.setdefault(pattern, []).append((lexer, pattern))
+        elif (
+                pattern.startswith('*')
+                and
+                not any(
+                    character in pattern[1:]
+                    for character in cls.GLOB_CHARACTERS
+                )
+                and
+                splitext(pattern)[1]
+        ):
+            by_extension.setdefault(splitext(pattern)[1], []).append(
+                (lexer, pattern)
+            )
+        else:
+            wildcards.append((lexer, pattern))
+
+    @classmethod
+    def build_filename_index(cls):
+        """
+        Indexes every registered filename glob once; lexers are named by
+        their registry entry so nothing is imported until it matches
+        """
+        index = (dict(), dict(), [])
+        for _, lexer_name, _, filenames, _ in lexers.LEXERS.values():
+            for pattern in filenames:
+                cls.index_filename_pattern(index, pattern, lexer_name)
+        for lexer_class in find_plugin_lexers():
+            for pattern in lexer_class.filenames:
+                cls.index_filename_pattern(index, pattern, lexer_class)
+        return index
+
+    @staticmethod
+    def rate_filename_match(match):
+        """Mirrors Pygments' rating when no code is passed"""
+        lexer_class, pattern = match
+        bonus = 0.5 if '*' not in pattern else 0
+        return lexer_class.priority + bonus, lexer_class.__name__
+
+    @classmethod
+    def find_lexer_class_for_filename(cls, path):
+        """
+        Picks the same lexer class as lexers.get_lexer_for_filename without
+        scanning the registry, memoized by file name
+        """
+        filename = basename(path)
+        with cls.lexer_lock:
+            if filename in cls.lexer_classes_by_filename:
+                return cls.lexer_classes_by_filename[filename]
+            if cls.filename_index is None:
+                cls.filename_index = cls.build_filename_index()
+            exact, by_extension, wildcards = cls.filename_index
+        candidates = (
+            exact.get(filename, [])
+            + by_extension.get(splitext(filename)[1], [])
+            + wildcards
+        )
+        matches = []
+        for lexer, pattern in candidates:
+            if fnmatchcase(filename, pattern):
+                if not isinstance(lexer, type):
+                    lexer = lexers.find_lexer_class(lexer)
+                matches.append((lexer, pattern))
+        lexer_class = None
+        if matches:
+            lexer_class = max(matches, key=cls.rate_filename_match)
+            lexer_class = lexer_class[0]
+        with cls.lexer_lock:
+            cls.lexer_classes_by_filename[filename] = lexer_class
+        return lexer_class
+
+    def guess_lexer_class(self):
+        """
+        Guesses from a bounded prefix of the blob, only consulting
+        guess_lexer_names when given
+        """
+        prefix = self.blob[:self.GUESS_PREFIX_LENGTH]
+        if not self.guess_lexer_names:
+            return type(lexers.guess_lexer(prefix))
+        best_rating, best_class = 0.0, TextLexer
+        for lexer_name in self.guess_lexer_names:
+            lexer_class = getattr(lexers, lexer_name)
+            rating = lexer_class.analyse_text(prefix)
+            if rating > best_rating:
+                best_rating, best_class = rating, lexer_class
+        return best_class
+
+    @classmethod
+    def lexer_instance(cls, lexer_class, excerpt=False):
+        """
+        Shares one lexer per class since the lexer options never change;
+        excerpts get one that keeps blank edge lines so numbering holds
+        """
+        key = (lexer_class, excerpt)
+        with cls.lexer_lock:
+            if key not in cls.lexer_instances:
+                cls.lexer_instances[key] = lexer_class(
+                    **(
+                        cls.EXCERPT_LEXER_OPTIONS
+                        if excerpt
+                        else cls.DEFAULT_LEXER_OPTIONS
+                    )
+                )
+            return cls.lexer_instances[key]
+
+    def excerpted(self):
+        """Whether blob is a range of lines rather than the whole text"""
+        return self.start_line is not None or self.end_line is not None
 
     def attach_lexer(self):
         """
         Either assigns the explicitly named lexer or guesses the proper lexer
         """
         if self.explicit_lexer_name:
-            self.lexer = getattr(
-                lexers, self.explicit_lexer_name)(**self.DEFAULT_LEXER_OPTIONS)
+            lexer_class = getattr(lexers, self.explicit_lexer_name)
         else:
-            try:
-                self.lexer = lexers.get_lexer_for_filename(
-                    self.blob_path,
-                    **self.DEFAULT_LEXER_OPTIONS
-                )
-            except ClassNotFound:
-                self.lexer = lexers.guess_lexer(
-                    self.blob,
-                    **self.DEFAULT_LEXER_OPTIONS
-                )
+            lexer_class = None
+            if self.blob_path:
+                with self.observe('lexer.filename'):
+                    lexer_class = self.find_lexer_class_for_filename(
+                        self.blob_path
+                    )
+            if lexer_class is None:
+                with self.observe('lexer.guess'):
+                    lexer_class = self.guess_lexer_class()
+        self.lexer = self.lexer_instance(lexer_class, self.excerpted())
 
     def attach_formatter(self):
-        """Currently only assigns a vanilla HtmlFormatter"""
-        self.formatter = HtmlFormatter(**self.DEFAULT_HTMLFORMATTER_OPTIONS)
+        """
+        Assigns a formatter_class, emitting token styles directly when
+        inline_token_styles is set
+        """
+        options = dict(self.DEFAULT_HTMLFORMATTER_OPTIONS)
+        if self.inline_token_styles:
+            options['noclasses'] = True
+            options['style'] = BlockStyler.dump_token_style()
+        options.update(self.formatter_options())
+        self.formatter = self.formatter_class(**options)
 
-    def highlight(self):
-        """Highlights blob using lexer via formatter"""
-        self.highlighted_blob = highlight(
-            self.blob,
-            self.lexer,
-            self.formatter
+    def compile_header(self):
+        """Renders the header row, if the block gets one"""
+        if self.linenos and not self.no_header and (self.blob_path or self.title):
+            return BlockHeader.for_context(self.context).render_full_header()
+        return None
+
+    def formatter_options(self):
+        """Collects the layout BlockFormatter renders natively"""
+        options = {
+            'block_header': self.compile_header(),
+            'block_linenos': self.linenos,
+        }
+        if self.lexer is not None:
+            options['line_count'] = BlockFormatter.count_lines(
+                self.blob,
+                self.lexer
+            )
+        if self.start_line is not None:
+            options['linenostart'] = self.start_line
+        if self.blob_lead_in:
+            options['skip_lines'] = BlockFormatter.count_newlines(
+                self.blob_lead_in
+            )
+        if self.outfile is not None and self.inline_css:
+            if not self.highlighted_blob_styles:
+                raise ValueError('No styles to inline')
+            options['inliner'] = CssInliner.for_stylesheet(
+                self.highlighted_blob_styles
+            )
+        return options
+
+    def lexed_blob(self):
+        """Returns blob behind any lines lexed ahead of it"""
+        if self.blob_lead_in:
+            return self.blob_lead_in + self.blob
+        return self.blob
+
+    def preprocess(self, blob):
+        """
+        Normalizes blob like the lexer's get_tokens does before lexing: the
+        BOM dropped, newlines made '\\n', edges stripped, tabs expanded,
+        and a final newline ensured
+        """
+        lexer = self.lexer
+        if blob.startswith(u'\ufeff'):
+            blob = blob[1:]
+        blob = blob.replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+        if lexer.stripall:
+            blob = blob.strip()
+        elif lexer.stripnl:
+            blob = blob.strip(u'\n')
+        if lexer.tabsize > 0:
+            blob = blob.expandtabs(lexer.tabsize)
+        if lexer.ensurenl and not blob.endswith(u'\n'):
+            blob += u'\n'
+        return blob
+
+    def token_cache_key(self, text):
+        """Keys the lexer's run over text, by blob hash when text is whole"""
+        git_blob_hash = self.git_blob_hash
+        if self.excerpted() or self.blob_lead_in:
+            git_blob_hash = None
+        return TokenCache.key_for(self.lexer, text, git_blob_hash)
+
+    def tokens(self):
+        """
+        Returns the lexed blob's tokens, lexing only when the token cache
+        doesn't already have them; a miss is packed into the cache as the
+        formatter consumes it rather than held as a list
+        """
+        text = self.lexed_blob()
+        if self.token_cache is None:
+            return self.lexer.get_tokens(text)
+        key = self.token_cache_key(text)
+        stream = self.token_cache.get(key)
+        lexed_text = self.preprocess(text)
+        if stream is not None:
+            if self.observer is not None:
+                self.observer.counted('tokens.hit')
+            return stream.tokens(lexed_text)
+        if self.observer is not None:
+            self.observer.counted('tokens.miss')
+        return TokenStream.record(
+            lexed_text,
+            self.lexer.get_tokens(text),
+            lambda stream: self.token_cache.set(key, stream)
         )
 
+    def highlight(self):
+        """
+        Highlights blob using lexer via formatter, writing to outfile instead
+        of highlighted_blob when there is one
+        """
+        if self.outfile is not None:
+            format_tokens(self.tokens(), self.formatter, self.outfile)
+            return
+        self.highlighted_blob = format_tokens(self.tokens(), self.formatter)
+
     def attach_and_highlight(self):
         """Collects all the necessary elements to highlight blob"""
         self.attach_lexer()
@@ -1,10 +1,13 @@
 """This file provides a class to load code"""
-from os import devnull
-from subprocess import CalledProcessError, check_call, check_output
+from os.path import isabs, join, relpath
 
 import re
 
+from wotw_highlighter.blob_file import BlobFile
 from wotw_highlighter.block_options import BlockOptions
+from wotw_highlighter.git_channel import GitChannel
+from wotw_highlighter.git_object_store import GitObjectStore
+from wotw_highlighter.line_index import LineIndex
 
 
 class BlockLoader(BlockOptions):
@@ -13,7 +16,16 @@ class BlockLoader(BlockOptions):
     local or git tree
     """
 
-    DEV_NULL = open(devnull, 'w+')
+    BLOB_ENCODING = 'utf-8'
+
+    # What git hashes empty contents to; a file that didn't exist yet is
+    # diffed against it
+    EMPTY_BLOB_HASH = 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391'
+
+    GIT_BACKENDS = {
+        'cat-file': GitChannel,
+        'python': GitObjectStore,
+    }
 
     RAW_PATTERN = re.compile(
         r"""
@@ -31,50 +43,59 @@ class BlockLoader(BlockOptions):
         re.VERBOSE
     )
 
-    working_directory = 'blob_working_directory'
+    def git_repository(self):
+        """Returns the shared git backend for blob_working_directory"""
+        return self.GIT_BACKENDS[self.git_backend].for_repository(
+            self.blob_working_directory
+        )
 
-    def validate_git_directory(self):
-        """Ensures the blob_working_directory is a git repo"""
-        try:
-            check_call(
-                ['git', 'status'],
-                stdout=self.DEV_NULL,
-                stderr=self.DEV_NULL,
-            )
-        except CalledProcessError:
-            raise ValueError(
-                "'%s' is not a git repo"
-                % (
-                    self.blob_working_directory,
-                )
+    def query_git(self, method, object_name):
+        """
+        Runs one backend lookup, answering object_info from the repository's
+        RefCache when it can
+        """
+        repository = self.git_repository()
+        if 'object_info' == method:
+            return repository.ref_cache.object_info(
+                object_name,
+                lambda name: self.run_query(repository, method, name)
             )
+        return self.run_query(repository, method, object_name)
 
-    def validate_git_ref_name(self):
-        """Ensures the provided ref name exists"""
-        try:
-            check_call(
-                ['git', 'rev-parse', '--verify', self.git_ref_name],
-                stdout=self.DEV_NULL,
-                stderr=self.DEV_NULL,
+    def run_query(self, repository, method, object_name):
+        """
+        Asks repository directly, telling the observer how long it took and
+        how many git processes it started
+        """
+        if self.observer is None:
+            return getattr(repository, method)(object_name)
+        process_starts = repository.process_starts
+        with self.observe('git.%s' % (method)) as details:
+            result = getattr(repository, method)(object_name)
+            details['processes_started'] = (
+                repository.process_starts - process_starts
             )
-        except CalledProcessError:
+        return result
+
+    def validate_git_directory(self):
+        """Ensures the blob_working_directory is a git repo"""
+        self.git_repository()
+
+    def validate_git_ref_name(self, git_ref_name=None):
+        """Ensures the provided ref name, or git_ref_name, exists"""
+        git_ref_name = git_ref_name or self.git_ref_name
+        if self.query_git('object_info', git_ref_name) is None:
             raise ValueError(
                 "'%s' is not a valid git ref in %s"
                 % (
-                    self.git_ref_name,
+                    git_ref_name,
                     self.blob_working_directory,
                 )
             )
 
     def validate_git_hash(self, git_hash):
         """Ensures the provided hash exists"""
-        try:
-            check_call(
-                ['git', 'rev-parse', '--verify', git_hash],
-                stdout=self.DEV_NULL,
-                stderr=self.DEV_NULL,
-            )
-        except CalledProcessError:
+        if self.query_git('object_info', git_hash) is None:
             raise ValueError(
                 "'%s' is not a valid git hash in %s"
                 % (
@@ -83,11 +104,70 @@ class BlockLoader(BlockOptions):
                 )
             )
 
+    def validate_line_range(self):
+        """Ensures start_line and end_line are line numbers in order"""
+        for option in ('start_line', 'end_line'):
+            line = getattr(self, option)
+            if line is not None and (not isinstance(line, int) or line < 1):
+                raise ValueError(
+                    "%s must be a line number from 1, not '%s'"
+                    % (
+                        option,
+                        line,
+                    )
+                )
+        if (
+                self.start_line is not None
+                and self.end_line is not None
+                and self.start_line > self.end_line
+        ):
+            raise ValueError(
+                'start_line %d is past end_line %d'
+                % (
+                    self.start_line,
+                    self.end_line,
+                )
+            )
+
     def validate(self):
-        if self.git_ref_name or self.git_ref_hash or self.git_blob_hash:
+        self.validate_line_range()
+        if self.context_lines is not None and (
+                not isinstance(self.context_lines, int)
+                or self.context_lines < 0
+        ):
+            raise ValueError(
+                "context_lines must be a line count, not '%s'"
+                % (
+                    self.context_lines,
+                )
+            )
+        if self.git_backend not in self.GIT_BACKENDS:
+            raise ValueError(
+                "'%s' is not a git backend; use one of %s"
+                % (
+                    self.git_backend,
+                    ', '.join(sorted(self.GIT_BACKENDS)),
+                )
+            )
+        if (
+                self.git_ref_name
+                or self.git_ref_hash
+                or self.git_blob_hash
+                or self.git_base_ref_name
+        ):
             self.validate_git_directory()
         if self.git_ref_name:
             self.validate_git_ref_name()
+        if self.git_base_ref_name:
+            self.validate_git_ref_name(self.git_base_ref_name)
+            if self.start_line is not None or self.end_line is not None:
+                raise ValueError(
+                    'A diff against %s covers the whole file; drop '
+                    'start_line and end_line'
+                    % (
+                        self.git_base_ref_name,
+                    )
+                )
         if self.git_ref_hash:
             self.validate_git_hash(self.git_ref_hash)
         if self.git_blob_hash:
@@ -111,10 +191,54 @@ Must specify an input string, file, or git ref\
             raise ValueError('''\
 Cannot specify a ref name or hash without also specifying a blob path or hash''')
 
+    def lead_in_line(self):
+        """
+        Returns the first line lexed ahead of start_line so the excerpt
+        starts in the right lexer state, or None if none are
+        """
+        if not self.start_line or 1 == self.start_line:
+            return None
+        if self.context_lines is None:
+            return 1
+        if 0 == self.context_lines:
+            return None
+        return max(1, self.start_line - self.context_lines)
+
+    def select_lines(self, buffer, index=None, decode=None):
+        """
+        Cuts buffer down to the lines from start_line through end_line and
+        keeps the lines lexed ahead of them in blob_lead_in
+
+        Parameters:
+        buffer: The text, or the bytes decode turns into text
+        index: A LineIndex over buffer; a throwaway one is used if None
+        decode: Converts a slice of buffer to text
+        """
+        if decode is None:
+            decode = lambda text: text  # noqa: E731
+        if self.start_line is None and self.end_line is None:
+            return decode(buffer)
+        lead_in_begin, begin, end = (index or LineIndex(u'\n')).excerpt(
+            buffer,
+            self.start_line,
+            self.end_line,
+            self.lead_in_line()
+        )
+        self.blob_lead_in = decode(buffer[lead_in_begin:begin]) or None
+        return decode(buffer[begin:end])
+
     def load_from_file(self):
-        """Loads blob_path's contents into blob"""
-        blob_file = open(self.blob_path, 'r')
-        self.blob = blob_file.read()
+        """Loads the requested lines of blob_path into blob"""
+        lead_in, self.blob = BlobFile(
+            join(self.blob_working_directory, self.blob_path)
+        ).read_excerpt(self.start_line, self.end_line, self.lead_in_line())
+        self.blob_lead_in = lead_in or None
+
+    def tree_path(self):
+        """Converts blob_path into a ref:path suffix relative to the repo"""
+        if isabs(self.blob_path):
+            return relpath(self.blob_path, self.blob_working_directory)
+        return './%s' % (self.blob_path)
 
     def discover_blob_hash(self):
         """Discovers the git blob hash from all the git attributes"""
@@ -124,12 +248,11 @@ Cannot specify a ref name or hash without also specifying a blob path or hash'''
                 if self.git_ref_hash
                 else self.git_ref_name
             )
-            try:
-                tree_output = check_output(
-                    ['git', 'ls-tree', git_ref, self.blob_path]
-                )
-                self.git_blob_hash = re.compile(r'\s+').split(tree_output)[2]
-            except (CalledProcessError, IndexError):
+            object_info = self.query_git(
+                'object_info',
+                '%s:%s' % (git_ref, self.tree_path())
+            )
+            if object_info is None or 'blob' != object_info[1]:
                 raise ValueError(
                     'Ref %s does not contain blob %s'
                     % (
@@ -137,13 +260,24 @@ Cannot specify a ref name or hash without also specifying a blob path or hash'''
                         self.blob_path
                     )
                 )
+            self.git_blob_hash = object_info[0]
         return self.git_blob_hash
 
     def load_from_git(self):
         """Discovers git_blob_hash and loads its contents into blob"""
         self.discover_blob_hash()
-        self.blob = check_output(
-            ['git', 'cat-file', '-p', self.git_blob_hash]
+        git_object = self.query_git('read_object', self.git_blob_hash)
+        if git_object is None:
+            raise ValueError(
+                'Unable to read blob %s'
+                % (
+                    self.git_blob_hash
+                )
+            )
+        self.blob = self.select_lines(
+            git_object[2],
+            LineIndex.for_key(('git', self.git_blob_hash)),
+            lambda contents: contents.decode(self.BLOB_ENCODING, 'replace')
         )
 
     def parse_raw_as_options(self):
@@ -197,9 +331,56 @@ Cannot specify a ref name or hash without also specifying a blob path or hash'''
                 else:
                     self.blob_path = potential_path
         else:
-            self.blob = self.raw
+            self.blob = self.select_lines(self.raw)
+
+    def load_base_from_git(self):
+        """
+        Loads blob_path as of git_base_ref_name into base_blob; it's empty if
+        the file didn't exist yet
+        """
+        if not self.blob_path:
+            raise ValueError(
+                'Diffing against %s needs a blob path'
+                % (
+                    self.git_base_ref_name,
+                )
+            )
+        object_info = self.query_git(
+            'object_info',
+            '%s:%s' % (self.git_base_ref_name, self.tree_path())
+        )
+        if object_info is None:
+            self.git_base_blob_hash = self.EMPTY_BLOB_HASH
+            self.base_blob = u''
+            return self.base_blob
+        if 'blob' != object_info[1]:
+            raise ValueError(
+                'Ref %s does not contain blob %s'
+                % (
+                    self.git_base_ref_name,
+                    self.blob_path
+                )
+            )
+        git_object = self.query_git('read_object', object_info[0])
+        if git_object is None:
+            raise ValueError(
+                'Unable to read blob %s'
+                % (
+                    object_info[0]
+                )
+            )
+        self.git_base_blob_hash = object_info[0]
+        self.base_blob = git_object[2].decode(self.BLOB_ENCODING, 'replace')
+        return self.base_blob
 
     def load(self):
+        """Loads the blob, then the version it's diffed against if any"""
+        self.load_blob()
+        if self.git_base_ref_name:
+            self.load_base_from_git()
+        return self.blob
+
+    def load_blob(self):
         """Loads the blob intelligently"""
         self.parse_raw_as_options()
         if self.blob:
@@ -217,7 +398,7 @@ Cannot specify a ref name or hash without also specifying a blob path or hash'''
             pass
 
         if self.raw:
-            self.blob = self.raw
+            self.blob = self.select_lines(self.raw)
             return self.blob
         else:
             raise ValueError('Unable to load from positional and keyword args')
@@ -0,0 +1,139 @@
+"""This file provides hooks for instrumenting blocks as they render"""
+
+from contextlib import contextmanager
+from math import ceil
+from threading import Lock
+
+import sys
+import time
+
+CLOCK = time.perf_counter
+
+
+class BlockObserver(object):
+    """
+    This class receives instrumentation events; it ignores them all so
+    children only override what they need
+
+    Events are named by stage ('load', 'highlight', 'style', 'decorate')
+    or by sub-event ('cache.hit', 'git.read_object', 'lexer.guess', ...)
+    """
+
+    def started(self, name):
+        """Called when a timed event starts"""
+        pass
+
+    def finished(self, name, duration, **details):
+        """
+        Called when a timed event finishes, even if it raised
+
+        Parameters:
+        name: The event
+        duration: Seconds it took
+        details: Counters like bytes_in and bytes_out
+        """
+        pass
+
+    def counted(self, name, value=1):
+        """Called for untimed counters like cache hits"""
+        pass
+
+
+@contextmanager
+def observed(observer, name, **details):
+    """
+    Times the body for observer; the body may add to the yielded details.
+    Does nothing without an observer
+    """
+    if observer is None:
+        yield details
+        return
+    observer.started(name)
+    start = CLOCK()
+    try:
+        yield details
+    finally:
+        observer.finished(name, CLOCK() - start, **details)
+
+
+class TimingAggregator(BlockObserver):
+    """This class collects every event and summarizes them as percentiles"""
+
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self):
+        self.durations = dict()
+        self.counters = dict()
+        self.lock = Lock()
+
+    def finished(self, name, duration, **details):
+        with self.lock:
+            self.durations.setdefault(name, []).append(duration)
+            for detail, value in details.items():
+                if isinstance(value, (int, float)):
+                    key = '%s.%s' % (name, detail)
+                    self.counters[key] = self.counters.get(key, 0) + value
+
+    def counted(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @staticmethod
+    def percentile(ordered, percent):
+        """Nearest-rank percentile of an already sorted list"""
+        rank = int(ceil(percent / 100.0 * len(ordered)))
+        return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+    def summary(self):
+        """Returns {name: {'count', 'total', 'p50', ..., 'max'}}"""
+        with self.lock:
+            durations = dict(
+                (name, sorted(values))
+                for name, values in self.durations.items()
+            )
+        summary = dict()
+        for name, ordered in durations.items():
+            summary[name] = {
+                'count': len(ordered),
+                'total': sum(ordered),
+                'max': ordered[-1],
+            }
+            for percent in self.PERCENTILES:
+                summary[name]['p%d' % (percent)] = self.percentile(
+                    ordered,
+                    percent
+                )
+        return summary
+
+    def print_summary(self, outfile=None):
+        """Prints a table of timings in milliseconds followed by counters"""
+        outfile = outfile or sys.stdout
+        columns = ['p%d' % (percent) for percent in self.PERCENTILES] + ['max']
+        print(
+            '%-36s %8s %10s %s'
+            % (
+                'event',
+                'count',
+                'total ms',
+                ' '.join('%9s' % (column) for column in columns)
+            ),
+            file=outfile
+        )
+        for name, row in sorted(self.summary().items()):
+            print(
+                '%-36s %8d %10.2f %s'
+                % (
+                    name,
+                    row['count'],
+                    row['total'] * 1000,
+                    ' '.join(
+                        '%9.3f' % (row[column] * 1000)
+                        for column in columns
+                    )
+                ),
+                file=outfile
+            )
+        with self.lock:
+            counters = sorted(self.counters.items())
+        for name, value in counters:
+            print('%-36s %8s' % (name, value), file=outfile)
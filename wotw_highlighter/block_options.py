@@ -1,113 +1,150 @@
 """This file provides a common class used to collect all of the block options"""
 
-from os import chdir, getcwd
+from os import getcwd
+
+from wotw_highlighter.block_context import BlockContext, context_option
+from wotw_highlighter.block_observer import observed
 
 
 class BlockOptions(object):
     """
     BlockOptions collects all of the options needed to run any of the child
     classes so that its descendants can pull out only what they need.
+
+    The values live on a BlockContext; stages built with for_context share
+    their parent's instead of copying it.
     """
 
-    USED_KWARGS = [
-        'blob',
-        'blob_path',
-        'blob_working_directory',
-        'explicit_lexer_name',
-        'external_source_link',
-        'git_ref_name',
-        'git_ref_hash',
-        'git_blob_hash',
-        'highlighted_blob',
-        'highlighted_blob_styles',
-        'inline_css',
-        'linenos',
-        'no_header',
-        'raw',
-        'title',
-    ]
-
-    blob = None
-    blob_path = None
-    explicit_lexer_name = None
-    external_source_link = None
-    git_ref_name = None
-    git_ref_hash = None
-    git_blob_hash = None
-    highlighted_blob = None
-    highlighted_blob_styles = None
-    inline_css = False
-    linenos = True
-    no_header = False
-    raw = None
-    title = None
-
-    working_directory = 'launch_directory'
+    USED_KWARGS = list(BlockContext.OPTIONS)
 
     def __init__(self, *args, **kwargs):
         """The ctor simply assigns defaults
 
         Possible parameters:
+        base_blob = None
+            The earlier version of blob; the block shows what changed from
+            it when given
         blob = None
             The raw file blob to parse
+        blob_lead_in = None
+            Lines before start_line the loader kept so blob is lexed in the
+            right state; they're lexed but never shown
         blob_path = None
             A path to load/parse/etc
         blob_working_directory=os.getcwd()
-            The directory to use for input commands
+            The directory paths and git commands are resolved from; the
+            process working directory is never changed
+        context_lines = None
+            How many lines before start_line are lexed to find the state
+            the excerpt starts in; every earlier line is if None
+        diff_view = 'unified'
+            How a diff is laid out: 'unified' interleaves removed and added
+            lines, 'side-by-side' puts each version in its own column
+        end_line = None
+            The last line to load, counting from 1; loads to the end if None
         explicit_lexer_name = None
             Name of lexer to use from Pygments rather than guessing
         external_source_link = None
             Link to the file in VCS
+        git_backend = 'cat-file'
+            How git objects are read; 'cat-file' keeps git processes open
+            while 'python' reads .git directly without forking
+        git_base_blob_hash = None
+            Blob hash of base_blob from git
+        git_base_ref_name = None
+            Branch/reference name to diff blob_path against; base_blob is
+            loaded from it
         git_ref_name = None
             Branch/reference name from git
         git_ref_hash = None
             Branch/reference hash from git
         git_blob_hash = None
             Blob hash from git
+        guess_lexer_names = None
+            Lexer names, like explicit_lexer_name, to choose between when
+            guessing; every registered lexer is tried otherwise
         highlighted_blob = None
             The highlighted code as an HTML string
         highlighted_blob_styles = None
             The styles to be applied to the highlighted_blob
         inline_css = False
             Inlines all styles
+        inline_token_styles = False
+            Has Pygments write token styles as attributes so only the table
+            and header styles are left to inline
         linenos = True
             Whether or not to generate line numbers
         no_header = False
             Skip header generation on files/named blobs
+        observer = None
+            A BlockObserver that's told how long each stage and sub-event
+            takes; nothing is measured without one
+        outfile = None
+            A writable stream to render into instead of highlighted_blob;
+            the header, line numbers, and inlining happen while streaming
         raw = None
             Raw input pulled from the first positional argument
+        render_cache = None
+            A RenderCache consulted for blocks whose git_blob_hash is known
+        start_line = None
+            The first line to load, counting from 1; only the lines from
+            start_line through end_line are read from large files, and line
+            numbers start at start_line
         title = None
             The title to use for highlighted blobs or instead of the filename
+        token_cache = None
+            A TokenCache holding lexed blobs so re-rendering one with other
+            decoration options only formats it
         """
+        self.context = BlockContext()
         if args and args[0]:
             self.raw = args[0]
-        self.launch_directory = getcwd()
-        self.blob_working_directory = getcwd()
+        if 'blob_working_directory' not in kwargs:
+            self.blob_working_directory = getcwd()
         self.update_options(**kwargs)
-        self.move_to_working_directory()
-        self.validate()
+        self.validate_once()
+
+    @classmethod
+    def for_context(cls, context):
+        """
+        Builds this stage over an existing BlockContext without copying it;
+        the stage only validates the first time it sees the context
+        """
+        stage = cls.__new__(cls)
+        stage.context = context
+        stage.validate_once()
+        return stage
 
     def update_options(self, **kwargs):
         """Updates any passed in kwargs; does nothing without values"""
-        for option in self.USED_KWARGS:
-            if option in kwargs:
-                setattr(self, option, kwargs.get(option))
-
-    def move_to_working_directory(self):
-        """Moves to the directory of interest"""
-        chdir(getattr(self, self.working_directory))
+        for option, value in kwargs.items():
+            if option in self.USED_KWARGS:
+                setattr(self.context, option, value)
 
     def validate(self):  # pylint: disable=R0201
         """Overriden by children to validate options"""
         return
 
+    def validate_once(self):
+        """Validates unless this class already passed on the context"""
+        stage = type(self)
+        if stage not in self.context.validated:
+            self.validate()
+            self.context.validated.add(stage)
+
+    def observe(self, name, **details):
+        """Times the body of a with statement for the observer, if any"""
+        return observed(self.observer, name, **details)
+
     def full_options(self):
         """Compiles a dict with all option values"""
-        options = dict()
-        for option in self.USED_KWARGS:
-            options[option] = getattr(self, option)
-        return options
-
-    def return_to_launch_directory(self):
-        """Returns to the original directory, where the process was launched"""
-        chdir(self.launch_directory)
+        return self.context.options()
+
+
+def install_context_options():
+    """Backs each of BlockOptions.USED_KWARGS with its context"""
+    for option in BlockOptions.USED_KWARGS:
+        setattr(BlockOptions, option, context_option(option))
+
+
+install_context_options()
@@ -1,50 +1,124 @@
 """This file provides a class to provide styling"""
 
 from os.path import dirname, join
+from threading import Lock
+
+from pygments.style import Style, StyleMeta
+from pygments.token import STANDARD_TYPES
 
 from wotw_highlighter.block_options import BlockOptions
+from wotw_highlighter.stylesheet_registry import StylesheetRegistry
 
 
 class BlockStyler(BlockOptions):
     """This class provides styles for a highlighted_blob"""
 
+    PYGMENTS_STYLESHEET = 'pygments-monokai.css'
+    ADDITIONAL_STYLESHEET = 'pygments-monokai-additions.css'
+
+    TOKEN_STYLE_DECLARATIONS = {
+        ('font-style', 'italic'): 'italic',
+        ('font-style', 'normal'): 'noitalic',
+        ('font-weight', 'bold'): 'bold',
+        ('font-weight', 'normal'): 'nobold',
+        ('text-decoration', 'underline'): 'underline',
+    }
+
+    TOKEN_STYLE_BACKGROUND = '#272822'
+
+    token_style = None
+    token_style_lock = Lock()
+
+    @staticmethod
+    def stylesheet_path(name):
+        """Locates a bundled stylesheet"""
+        return join(dirname(__file__), 'data', name)
+
     @staticmethod
     def dump_pygments_styles():
         """Dumps all the styles from Pygments"""
-        with open(
-            join(
-                dirname(__file__),
-                'data',
-                'pygments-monokai.css'
-            ),
-            'r'
-        ) as css_file:
-            styles = css_file.read()
-            return styles.strip()
+        return StylesheetRegistry.stylesheet(
+            BlockStyler.stylesheet_path(BlockStyler.PYGMENTS_STYLESHEET)
+        )
 
     @staticmethod
     def dump_additional_styles():
         """Dumps all the additional styling"""
-        with open(
-            join(
-                dirname(__file__),
-                'data',
-                'pygments-monokai-additions.css'
-            ),
-            'r'
-        ) as css_file:
-            styles = css_file.read()
-            return styles.strip()
+        return StylesheetRegistry.stylesheet(
+            BlockStyler.stylesheet_path(BlockStyler.ADDITIONAL_STYLESHEET)
+        )
 
     @staticmethod
     def dump_styles():
         """Dumps all the style"""
-        return (
-            BlockStyler.dump_pygments_styles()
-            +
-            BlockStyler.dump_additional_styles()
+        return StylesheetRegistry.stylesheet(
+            BlockStyler.stylesheet_path(BlockStyler.PYGMENTS_STYLESHEET),
+            BlockStyler.stylesheet_path(BlockStyler.ADDITIONAL_STYLESHEET)
+        )
+
+    @staticmethod
+    def convert_declaration(name, value):
+        """Converts one CSS declaration to a Pygments style string"""
+        if 'color' == name:
+            return value
+        if 'background-color' == name:
+            return 'bg:%s' % (value)
+        return BlockStyler.TOKEN_STYLE_DECLARATIONS.get((name, value))
+
+    @staticmethod
+    def build_token_style(rules):
+        """
+        Builds a Pygments Style from the rule table of class-based token CSS
+        so HtmlFormatter can emit the same styles inline
+        """
+        token_types = dict(
+            (short_name, token_type)
+            for token_type, short_name in STANDARD_TYPES.items()
+            if short_name
         )
+        styles = dict()
+        for parsed, pairs in rules:
+            _, (tag, classes, ids) = parsed[0]
+            if tag or ids or 1 != len(classes):
+                continue
+            token_type = token_types.get(next(iter(classes)))
+            if token_type is None:
+                continue
+            for name, value in pairs:
+                converted = BlockStyler.convert_declaration(name, value)
+                if converted:
+                    styles.setdefault(token_type, []).append(converted)
+        return StyleMeta(
+            'BundledMonokaiStyle',
+            (Style,),
+            {
+                'background_color': BlockStyler.TOKEN_STYLE_BACKGROUND,
+                'styles': dict(
+                    (token_type, ' '.join(definitions))
+                    for token_type, definitions in styles.items()
+                ),
+            }
+        )
+
+    @classmethod
+    def dump_token_style(cls):
+        """Builds the bundled token Style once per stylesheet change"""
+        stylesheet = cls.dump_pygments_styles()
+        with cls.token_style_lock:
+            if cls.token_style is None or cls.token_style[0] != stylesheet:
+                cls.token_style = (
+                    stylesheet,
+                    cls.build_token_style(
+                        StylesheetRegistry.rules(
+                            cls.stylesheet_path(cls.PYGMENTS_STYLESHEET)
+                        )
+                    ),
+                )
+            return cls.token_style[1]
 
     def set_styles(self):
         """Assigns styles to the BlockOptions chain"""
-        self.highlighted_blob_styles = self.dump_styles()
+        if self.inline_token_styles:
+            self.highlighted_blob_styles = self.dump_additional_styles()
+        else:
+            self.highlighted_blob_styles = self.dump_styles()
@@ -0,0 +1,405 @@
+"""This file provides a small, fast CSS inliner for highlighted blocks"""
+
+from threading import Lock
+
+import re
+
+
+class CssInliner(object):
+    """
+    This class compiles a stylesheet once and inlines it into Pygments
+    markup in a single pass. It follows Premailer's rules for specificity,
+    merging, and value normalization; it only understands the selectors
+    Pygments styles use (tags, classes, ids, descendant and child
+    combinators).
+    """
+
+    COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+    RULE_PATTERN = re.compile(r'([^{}]+)\{([^{}]*)\}')
+    COMPOUND_PATTERN = re.compile(r'^([a-zA-Z][\w-]*|\*)?((?:[.#][\w-]+)*)$')
+    ELEMENT_COUNT_PATTERN = re.compile(r'(^|\s)\w')
+    TAG_PATTERN = re.compile(r'<(/?)([a-zA-Z][\w-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+    ATTRIBUTE_PATTERN = re.compile(
+        r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?'
+    )
+
+    LONG_HEX_PATTERN = re.compile(
+        r'#([0-9a-fA-F])\1([0-9a-fA-F])\2([0-9a-fA-F])\3\b'
+    )
+    LEADING_DECIMAL_PATTERN = re.compile(r'(^|[\s,(])\.(\d)')
+    ZERO_LENGTH_PATTERN = re.compile(
+        r'(^|[\s,(])0(?:\.0+)?(?:px|em|ex|pt|pc|cm|mm|in|rem|vh|vw)(?=$|[\s,)])'
+    )
+    QUOTED_OR_COMMA_PATTERN = re.compile(r'"[^"]*"|\'[^\']*\'|\s*,\s*')
+
+    PSEUDO_SELECTORS_KEPT = (':first-child', ':last-child', ':nth-child')
+    VOID_ELEMENTS = frozenset([
+        'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+        'meta', 'param', 'source', 'track', 'wbr',
+    ])
+
+    compiled = dict()
+    compiled_lock = Lock()
+
+    def __init__(self, stylesheet):
+        """
+        The ctor compiles every rule up front
+
+        Parameters:
+        stylesheet: The CSS to inline
+        """
+        self.rules = self.parse_stylesheet(stylesheet)
+        self.path_ids = dict()
+        self.path_styles = dict()
+        self.lock = Lock()
+
+    @classmethod
+    def for_stylesheet(cls, stylesheet):
+        """Returns a shared, compiled inliner for stylesheet"""
+        with cls.compiled_lock:
+            if stylesheet not in cls.compiled:
+                cls.compiled[stylesheet] = cls(stylesheet)
+            return cls.compiled[stylesheet]
+
+    @classmethod
+    def normalize_value(cls, value):
+        """Normalizes a declaration value the way cssutils serializes it"""
+        value = ' '.join(value.split())
+        value = cls.QUOTED_OR_COMMA_PATTERN.sub(
+            lambda match: (
+                match.group(0)
+                if match.group(0)[0] in '"\''
+                else ', '
+            ),
+            value
+        )
+        value = cls.LONG_HEX_PATTERN.sub(r'#\1\2\3', value)
+        value = cls.LEADING_DECIMAL_PATTERN.sub(r'\g<1>0.\2', value)
+        return cls.ZERO_LENGTH_PATTERN.sub(r'\g<1>0', value)
+
+    @classmethod
+    def parse_declarations(cls, body):
+        """Splits a declaration block into normal and important pairs"""
+        normal = []
+        important = []
+        for declaration in body.split(';'):
+            name, separator, value = declaration.partition(':')
+            name = name.strip().lower()
+            if not separator or not name or not value.strip():
+                continue
+            value = value.strip()
+            if value.lower().endswith('!important'):
+                important.append((
+                    name,
+                    '%s !important' % (
+                        cls.normalize_value(value[:-len('!important')])
+                    )
+                ))
+            else:
+                normal.append((name, cls.normalize_value(value)))
+        return normal, important
+
+    @classmethod
+    def parse_compound(cls, compound):
+        """Parses tag.class#id into (tag, classes, ids)"""
+        match = cls.COMPOUND_PATTERN.match(compound)
+        if match is None:
+            return None
+        tag = match.group(1)
+        if '*' == tag:
+            tag = None
+        classes = []
+        ids = []
+        for token in re.findall(r'[.#][\w-]+', match.group(2)):
+            (classes if '.' == token[0] else ids).append(token[1:])
+        return (tag.lower() if tag else None), frozenset(classes), frozenset(ids)
+
+    @classmethod
+    def parse_selector(cls, selector):
+        """
+        Parses a selector into [(combinator, compound), ...] from right to
+        left, or None if it can't be inlined
+        """
+        if ':' in selector:
+            return None
+        tokens = re.sub(r'\s*>\s*', ' > ', selector).split()
+        parsed = []
+        combinator = None
+        for token in reversed(tokens):
+            if '>' == token:
+                combinator = '>'
+                continue
+            compound = cls.parse_compound(token)
+            if compound is None:
+                return None
+            if parsed:
+                parsed[-1] = (combinator or ' ', parsed[-1][1])
+            parsed.append((None, compound))
+            combinator = None
+        return parsed or None
+
+    @classmethod
+    def parse_stylesheet(cls, stylesheet):
+        """Compiles a stylesheet into rules sorted the way Premailer sorts them"""
+        rules = []
+        stylesheet = cls.COMMENT_PATTERN.sub('', stylesheet)
+        for selectors, body in cls.RULE_PATTERN.findall(stylesheet):
+            normal, important = cls.parse_declarations(body)
+            for selector in selectors.split(','):
+                selector = ' '.join(
+                    re.sub(r'\s*>\s*', ' > ', selector).split()
+                )
+                if not selector or selector.startswith('@'):
+                    continue
+                if '*' in selector or selector.startswith(':'):
+                    continue
+                parsed = cls.parse_selector(selector)
+                if parsed is None:
+                    continue
+                for is_important, pairs in ((1, important), (0, normal)):
+                    if not pairs:
+                        continue
+                    specificity = (
+                        is_important,
+                        selector.count('#'),
+                        selector.count('.'),
+                        len(cls.ELEMENT_COUNT_PATTERN.findall(selector)),
+                        len(rules),
+                    )
+                    rules.append((specificity, parsed, pairs))
+        rules.sort(key=lambda rule: rule[0])
+        return [(parsed, pairs) for _, parsed, pairs in rules]
+
+    @staticmethod
+    def compound_matches(compound, element):
+        """Checks one (tag, classes, ids) against one element"""
+        tag, classes, ids = compound
+        element_tag, element_classes, element_id = element
+        if tag is not None and tag != element_tag:
+            return False
+        if ids and (element_id is None or ids != frozenset([element_id])):
+            return False
+        return classes <= element_classes
+
+    @classmethod
+    def selector_matches(cls, parsed, path, position=None):
+        """Matches a right-to-left selector against a path of elements"""
+        if position is None:
+            position = len(path) - 1
+        _, compound = parsed[0]
+        if not cls.compound_matches(compound, path[position]):
+            return False
+        if 1 == len(parsed):
+            return True
+        combinator = parsed[1][0]
+        if '>' == combinator:
+            return (
+                position > 0
+                and cls.selector_matches(parsed[1:], path, position - 1)
+            )
+        for ancestor in range(position - 1, -1, -1):
+            if cls.selector_matches(parsed[1:], path, ancestor):
+                return True
+        return False
+
+    def styles_for_path(self, path):
+        """Merges every matching rule's declarations in specificity order"""
+        merged = []
+        positions = dict()
+        for parsed, pairs in self.rules:
+            if self.selector_matches(parsed, path):
+                for name, value in pairs:
+                    if name in positions:
+                        merged[positions[name]] = (name, value)
+                    else:
+                        positions[name] = len(merged)
+                        merged.append((name, value))
+        return merged
+
+    def path_id(self, parent_id, element):
+        """Interns (parent, element) so each distinct path is matched once"""
+        key = (parent_id, element)
+        path_id = self.path_ids.get(key)
+        if path_id is None:
+            with self.lock:
+                path_id = self.path_ids.setdefault(key, len(self.path_ids) + 1)
+        return path_id
+
+    def cached_styles(self, path_id, path):
+        """Returns the merged styles for a path, matching it at most once"""
+        styles = self.path_styles.get(path_id)
+        if styles is None:
+            styles = self.styles_for_path(path)
+            self.path_styles[path_id] = styles
+        return styles
+
+    def stream(self):
+        """Starts a streaming pass; see InlineStream"""
+        return InlineStream(self)
+
+    def inline(self, html):
+        """Inlines every matching rule into html"""
+        stream = self.stream()
+        return stream.feed(html) + stream.close()
+
+
+class InlineStream(object):
+    """
+    This class inlines a document fed to it in chunks, tracking open
+    elements between chunks
+    """
+
+    def __init__(self, inliner):
+        """
+        Parameters:
+        inliner: A compiled CssInliner
+        """
+        self.inliner = inliner
+        self.stack = [(0, ())]
+        self.pending = ''
+
+    @staticmethod
+    def merge_inline_style(styles, existing):
+        """Lets an element's own style attribute override stylesheet rules"""
+        if not existing:
+            return styles
+        merged = list(styles)
+        positions = dict((name, index) for index, (name, _) in enumerate(merged))
+        for name, value in CssInliner.parse_declarations(existing)[0]:
+            if name in positions:
+                merged[positions[name]] = (name, value)
+            else:
+                positions[name] = len(merged)
+                merged.append((name, value))
+        return merged
+
+    @staticmethod
+    def six_color(value):
+        """Expands three digit colors for bgcolor"""
+        return re.sub(
+            r'#([0-9a-fA-F])([0-9a-fA-F])([0-9a-fA-F])\b',
+            r'#\1\1\2\2\3\3',
+            value
+        )
+
+    @classmethod
+    def basic_attributes(cls, styles):
+        """Mirrors the presentational attributes Premailer adds"""
+        attributes = []
+        for name, value in styles:
+            if 'text-align' == name:
+                attributes.append(('align', value))
+            elif 'vertical-align' == name:
+                attributes.append(('valign', value))
+            elif 'background-color' == name and 'transparent' not in value.lower():
+                attributes.append(('bgcolor', cls.six_color(value)))
+            elif name in ('width', 'height'):
+                attributes.append((
+                    name,
+                    value[:-2] if value.endswith('px') else value
+                ))
+        return attributes
+
+    @staticmethod
+    def quote(value):
+        """Quotes an attribute value, preferring double quotes"""
+        if '"' in value:
+            if "'" not in value:
+                return "'%s'" % (value)
+            value = value.replace('"', '&quot;')
+        return '"%s"' % (value)
+
+    def render_tag(self, tag, attributes, styles, self_closing):
+        """Rebuilds a start tag with its inlined styles"""
+        attributes = list(attributes)
+        names = [name for name, _ in attributes]
+        style = '; '.join(
+            '%s:%s' % (name, value)
+            for name, value in self.merge_inline_style(
+                styles,
+                dict(attributes).get('style')
+            )
+        )
+        updates = [('style', style)] + self.basic_attributes(styles)
+        for name, value in updates:
+            if name in names:
+                attributes[names.index(name)] = (name, value)
+            else:
+                names.append(name)
+                attributes.append((name, value))
+        return '<%s%s%s>' % (
+            tag,
+            ''.join(
+                ' %s' % (name) if value is None
+                else ' %s=%s' % (name, self.quote(value))
+                for name, value in attributes
+            ),
+            ' /' if self_closing else ''
+        )
+
+    def open_element(self, match):
+        """Processes a start tag, returning its replacement"""
+        tag = match.group(2).lower()
+        raw_attributes = match.group(3)
+        self_closing = raw_attributes.rstrip().endswith('/')
+        attributes = []
+        for attribute in CssInliner.ATTRIBUTE_PATTERN.finditer(
+                raw_attributes.rstrip().rstrip('/')
+        ):
+            value = attribute.group(2)
+            if value is None:
+                value = attribute.group(3)
+            if value is None:
+                value = attribute.group(4)
+            attributes.append((attribute.group(1).lower(), value))
+        attribute_map = dict(attributes)
+        element = (
+            tag,
+            frozenset((attribute_map.get('class') or '').split()),
+            attribute_map.get('id'),
+        )
+        parent_id, parent_path = self.stack[-1]
+        path = parent_path + (element,)
+        path_id = self.inliner.path_id(parent_id, element)
+        if not self_closing and tag not in CssInliner.VOID_ELEMENTS:
+            self.stack.append((path_id, path))
+        styles = self.inliner.cached_styles(path_id, path)
+        if not styles:
+            return match.group(0)
+        return self.render_tag(
+            match.group(2),
+            attributes,
+            styles,
+            self_closing
+        )
+
+    def close_element(self, tag):
+        """Pops the stack back to the matching start tag"""
+        for position in range(len(self.stack) - 1, 0, -1):
+            if self.stack[position][1][-1][0] == tag:
+                del self.stack[position:]
+                return
+
+    def replace_tag(self, match):
+        """Dispatches start and end tags"""
+        if match.group(1):
+            self.close_element(match.group(2).lower())
+            return match.group(0)
+        return self.open_element(match)
+
+    def feed(self, chunk):
+        """Inlines a chunk, holding back any tag split across chunks"""
+        chunk = self.pending + chunk
+        split = chunk.rfind('<')
+        if -1 != split and -1 == chunk.find('>', split):
+            self.pending = chunk[split:]
+            chunk = chunk[:split]
+        else:
+            self.pending = ''
+        return CssInliner.TAG_PATTERN.sub(self.replace_tag, chunk)
+
+    def close(self):
+        """Flushes anything still held back"""
+        pending = self.pending
+        self.pending = ''
+        return pending
@@ -0,0 +1,199 @@
+"""This file provides a highlighter that shows what changed between versions"""
+
+from difflib import SequenceMatcher
+
+from pygments import format as format_tokens
+
+from wotw_highlighter.block_formatter import DiffFormatter
+from wotw_highlighter.block_styler import BlockStyler
+from wotw_highlighter.incremental_highlighter import (
+    IncrementalHighlighter,
+    split_lines,
+)
+
+
+class DiffHighlighter(IncrementalHighlighter):
+    """
+    This class highlights base_blob and blob with the same lexer and lays
+    out the lines that changed between them. Each version's formatted lines
+    are kept in the render cache, apart from its renders, under the blob
+    hash, so a version shared by several diffs is only lexed once; when
+    neither is cached, blob is re-lexed from base_blob's checkpoints only
+    where the two differ
+
+    Usage:
+        highlighter = DiffHighlighter(
+            base_blob=old_text,
+            blob=new_text,
+            blob_path='main.py'
+        )
+        highlighter.attach_and_highlight()
+    """
+
+    DIFF_VIEWS = ('unified', 'side-by-side')
+
+    LINES_KEYED_OPTIONS = ['git_blob_hash', 'inline_token_styles', 'lexer']
+
+    formatter_class = DiffFormatter
+
+    def validate(self):
+        super(DiffHighlighter, self).validate()
+        if self.base_blob is None:
+            raise ValueError('No base_blob to diff against')
+        if self.diff_view not in self.DIFF_VIEWS:
+            raise ValueError(
+                "'%s' is not a diff view; use one of %s"
+                % (
+                    self.diff_view,
+                    ', '.join(self.DIFF_VIEWS),
+                )
+            )
+
+    def excerpted(self):
+        """Keeps blank edge lines so both versions number like their files"""
+        return True
+
+    def version_lines(self, blob):
+        """Splits a version into lines the way the lexer sees them"""
+        if not blob:
+            return []
+        return split_lines(self.preprocess(blob))
+
+    def lines_key(self, git_blob_hash):
+        """Returns the render cache key for a version's formatted lines"""
+        if self.render_cache is None or not git_blob_hash:
+            return None
+        return self.render_cache.key_for(
+            {
+                'git_blob_hash': git_blob_hash,
+                'inline_token_styles': self.inline_token_styles,
+                'lexer': type(self.lexer).__name__,
+            },
+            BlockStyler.dump_styles(),
+            self.LINES_KEYED_OPTIONS
+        )
+
+    def cached_lines(self, key):
+        """Returns a version's formatted lines from the cache, or None"""
+        if key is None:
+            return None
+        return self.render_cache.get_lines(key)
+
+    def store_lines(self, key, lines):
+        """Saves a version's formatted lines if it can be cached"""
+        if key is not None:
+            self.render_cache.set_lines(key, lines)
+
+    def lex_version(self, blob):
+        """Highlights one version from scratch"""
+        if not blob:
+            return []
+        self.blob = blob
+        self.relex_all()
+        return list(self.line_html)
+
+    def formatted_versions(self):
+        """
+        Returns the formatted lines of base_blob and blob, lexing only the
+        versions the cache doesn't have
+        """
+        blob = self.blob
+        base_key = self.lines_key(self.git_base_blob_hash)
+        key = self.lines_key(self.git_blob_hash)
+        base_html = self.cached_lines(base_key)
+        html = self.cached_lines(key)
+        if base_html is None:
+            base_html = self.lex_version(self.base_blob)
+            self.store_lines(base_key, base_html)
+            if html is None and base_html:
+                self.update(blob)
+                html = list(self.line_html)
+                self.store_lines(key, html)
+        if html is None:
+            html = self.lex_version(blob)
+            self.store_lines(key, html)
+        self.blob = blob
+        return base_html, html
+
+    def diff_rows(self, base_html, html):
+        """
+        Pairs the versions' formatted lines into rows for DiffFormatter;
+        unified views list a replaced run's old lines before its new ones
+        """
+        rows = []
+        opcodes = SequenceMatcher(
+            None,
+            self.version_lines(self.base_blob),
+            self.version_lines(self.blob)
+        ).get_opcodes()
+        for tag, base_start, base_end, start, end in opcodes:
+            if 'equal' == tag:
+                rows.extend(
+                    (
+                        'equal',
+                        base_line + 1,
+                        base_html[base_line],
+                        line + 1,
+                        html[line],
+                    )
+                    for base_line, line in zip(
+                        range(base_start, base_end),
+                        range(start, end)
+                    )
+                )
+            elif 'side-by-side' == self.diff_view:
+                for offset in range(max(base_end - base_start, end - start)):
+                    base_line = base_start + offset
+                    line = start + offset
+                    if base_line >= base_end:
+                        rows.append((
+                            'insert',
+                            None,
+                            None,
+                            line + 1,
+                            html[line],
+                        ))
+                    elif line >= end:
+                        rows.append((
+                            'delete',
+                            base_line + 1,
+                            base_html[base_line],
+                            None,
+                            None,
+                        ))
+                    else:
+                        rows.append((
+                            'replace',
+                            base_line + 1,
+                            base_html[base_line],
+                            line + 1,
+                            html[line],
+                        ))
+            else:
+                rows.extend(
+                    ('delete', base_line + 1, base_html[base_line], None, None)
+                    for base_line in range(base_start, base_end)
+                )
+                rows.extend(
+                    ('insert', None, None, line + 1, html[line])
+                    for line in range(start, end)
+                )
+        return rows
+
+    def formatter_options(self):
+        """Lays the diff out in the chosen view"""
+        options = super(DiffHighlighter, self).formatter_options()
+        options['diff_view'] = self.diff_view
+        return options
+
+    def highlight(self):
+        """
+        Highlights both versions and lays out their diff, writing to outfile
+        instead of highlighted_blob when there is one
+        """
+        base_html, html = self.formatted_versions()
+        self.formatter.diff_rows = self.diff_rows(base_html, html)
+        if self.outfile is not None:
+            format_tokens([], self.formatter, self.outfile)
+            return
+        self.highlighted_blob = format_tokens([], self.formatter)
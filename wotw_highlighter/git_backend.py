@@ -0,0 +1,88 @@
+"""This file provides the common base for anything that reads git objects"""
+
+from atexit import register
+from os.path import realpath
+from threading import Lock
+
+from wotw_highlighter.ref_cache import RefCache
+
+
+class GitBackend(object):
+    """
+    GitBackend shares one instance per repository across every block and
+    defines the lookups BlockLoader needs from a repository, along with the
+    RefCache that remembers their answers
+    """
+
+    backends = {}
+    backends_lock = Lock()
+
+    process_starts = 0
+
+    def __init__(self, working_directory):
+        """
+        The ctor ensures the directory is a git repo
+
+        Parameters:
+        working_directory: The directory paths and refs are resolved from
+        """
+        self.working_directory = working_directory
+        self.git_dir = self.discover_git_dir()
+        self.ref_cache = RefCache(self.git_dir)
+
+    @classmethod
+    def for_repository(cls, working_directory):
+        """Returns the shared backend for working_directory, creating it if necessary"""
+        key = (cls, realpath(working_directory))
+        with cls.backends_lock:
+            if key not in cls.backends:
+                cls.backends[key] = cls(key[1])
+            return cls.backends[key]
+
+    @classmethod
+    def close_all(cls):
+        """Closes every open backend"""
+        with cls.backends_lock:
+            backends = list(cls.backends.values())
+            cls.backends.clear()
+        for backend in backends:
+            backend.close()
+
+    def discover_git_dir(self):
+        """Overridden by children to locate the git directory"""
+        raise NotImplementedError
+
+    def object_info(self, object_name):
+        """
+        Overridden by children to return (hash, type, size) for anything git
+        can resolve, e.g. a hash, a ref, or ref:path, or None if it doesn't
+        exist
+        """
+        raise NotImplementedError
+
+    def read_object(self, object_name):
+        """Overridden by children to return (hash, type, contents) or None"""
+        raise NotImplementedError
+
+    def read_objects(self, object_names):
+        """
+        Yields what read_object returns for each name in order; children
+        that can stream many objects at once override this
+        """
+        for object_name in object_names:
+            yield self.read_object(object_name)
+
+    def list_tree(self, tree_ish):
+        """
+        Overridden by children to return every entry under tree_ish, like
+        git ls-tree -r, as (mode, type, hash, path) or None if tree_ish
+        isn't a tree, commit, or tag
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Overridden by children to release any held resources"""
+        return
+
+
+register(GitBackend.close_all)
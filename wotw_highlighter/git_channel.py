@@ -0,0 +1,224 @@
+"""This file provides a persistent channel to a repository's object database"""
+
+from os import devnull
+from os.path import isabs, join
+from subprocess import CalledProcessError, PIPE, Popen, check_output
+from threading import Lock, Thread
+
+from wotw_highlighter.git_backend import GitBackend
+
+
+class GitChannel(GitBackend):
+    """
+    This class keeps long-lived git cat-file processes open for a single
+    repository so blobs, hashes, and refs can be resolved without forking git
+    for every lookup
+    """
+
+    BATCH = '--batch'
+    BATCH_CHECK = '--batch-check'
+
+    MISSING_SUFFIXES = (
+        b' missing\n',
+        b' ambiguous\n',
+    )
+
+    def __init__(self, working_directory):
+        super(GitChannel, self).__init__(working_directory)
+        self.processes = dict()
+        self.dev_null = None
+        self.lock = Lock()
+
+    def discover_git_dir(self):
+        """Locates the git directory once, failing if there isn't one"""
+        self.process_starts += 1
+        try:
+            with open(devnull, 'w') as dev_null:
+                git_dir = check_output(
+                    ['git', 'rev-parse', '--git-dir'],
+                    cwd=self.working_directory,
+                    stderr=dev_null,
+                )
+        except (CalledProcessError, OSError):
+            raise ValueError(
+                "'%s' is not a git repo"
+                % (
+                    self.working_directory,
+                )
+            )
+        git_dir = git_dir.decode('utf-8').strip()
+        if not isabs(git_dir):
+            git_dir = join(self.working_directory, git_dir)
+        return git_dir
+
+    def spawn_process(self, mode):
+        """Spawns a cat-file process in the given batch mode"""
+        if self.dev_null is None:
+            self.dev_null = open(devnull, 'w')
+        self.process_starts += 1
+        return Popen(
+            ['git', 'cat-file', mode],
+            cwd=self.working_directory,
+            stdin=PIPE,
+            stdout=PIPE,
+            stderr=self.dev_null,
+        )
+
+    def start_process(self, mode):
+        """Spawns the shared cat-file process in the given batch mode"""
+        self.processes[mode] = self.spawn_process(mode)
+        return self.processes[mode]
+
+    @staticmethod
+    def end_process(process):
+        """Closes process's input and waits for it, terminating it if needed"""
+        try:
+            process.stdin.close()
+        except (IOError, OSError):
+            pass
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+        process.stdout.close()
+
+    def stop_process(self, mode):
+        """Shuts down the cat-file process in the given batch mode, if any"""
+        process = self.processes.pop(mode, None)
+        if process is not None:
+            self.end_process(process)
+
+    def exchange(self, mode, object_name):
+        """Sends one object name down the pipe and parses the response"""
+        process = self.processes.get(mode)
+        if process is None or process.poll() is not None:
+            process = self.start_process(mode)
+        process.stdin.write(('%s\n' % (object_name)).encode('utf-8'))
+        process.stdin.flush()
+        return self.read_response(process, mode)
+
+    def read_response(self, process, mode):
+        """Parses one response off the pipe"""
+        header = process.stdout.readline()
+        if not header.endswith(b'\n'):
+            raise IOError('git cat-file %s exited unexpectedly' % (mode))
+        if header.endswith(self.MISSING_SUFFIXES):
+            return None
+        object_hash, object_type, size = header.decode('ascii').split()
+        if self.BATCH_CHECK == mode:
+            return object_hash, object_type, int(size)
+        contents = process.stdout.read(int(size) + 1)
+        if len(contents) != int(size) + 1:
+            raise IOError('git cat-file %s exited unexpectedly' % (mode))
+        return object_hash, object_type, contents[:-1]
+
+    def request(self, mode, object_name):
+        """Runs an exchange, restarting the process once if it has died"""
+        if '\n' in object_name:
+            return None
+        with self.lock:
+            try:
+                return self.exchange(mode, object_name)
+            except (IOError, OSError, ValueError):
+                self.stop_process(mode)
+            try:
+                return self.exchange(mode, object_name)
+            except (IOError, OSError, ValueError):
+                self.stop_process(mode)
+                raise ValueError(
+                    'Unable to query %s in %s'
+                    % (
+                        object_name,
+                        self.working_directory,
+                    )
+                )
+
+    @staticmethod
+    def write_names(process, object_names):
+        """Feeds object names to process, stopping if it goes away"""
+        try:
+            for object_name in object_names:
+                process.stdin.write(('%s\n' % (object_name)).encode('utf-8'))
+            process.stdin.flush()
+        except (IOError, OSError, ValueError):
+            pass
+
+    def read_objects(self, object_names):
+        """
+        Yields (hash, type, contents) or None for each name in order. Names
+        are written from a thread while responses are read, so one cat-file
+        process streams every object without a round trip apiece. The stream
+        gets a process of its own, so the channel stays free for other
+        lookups while it's read, and the process ends with the generator
+        """
+        object_names = list(object_names)
+        sent = [name for name in object_names if '\n' not in name]
+        with self.lock:
+            process = self.spawn_process(self.BATCH)
+        writer = Thread(target=self.write_names, args=(process, sent))
+        writer.daemon = True
+        writer.start()
+        try:
+            for object_name in object_names:
+                if '\n' in object_name:
+                    yield None
+                else:
+                    yield self.read_response(process, self.BATCH)
+        except (IOError, OSError, ValueError):
+            raise ValueError(
+                'Unable to stream objects from %s'
+                % (
+                    self.working_directory,
+                )
+            )
+        finally:
+            self.end_process(process)
+            writer.join()
+
+    def list_tree(self, tree_ish):
+        """Runs git ls-tree -r once for the whole tree"""
+        if tree_ish.startswith('-'):
+            return None
+        if self.dev_null is None:
+            self.dev_null = open(devnull, 'w')
+        self.process_starts += 1
+        try:
+            listing = check_output(
+                ['git', 'ls-tree', '-r', '-z', '--full-tree', tree_ish, '--'],
+                cwd=self.working_directory,
+                stderr=self.dev_null,
+            )
+        except CalledProcessError:
+            return None
+        entries = []
+        for line in listing.split(b'\0'):
+            if not line:
+                continue
+            header, _, path = line.partition(b'\t')
+            mode, object_type, object_hash = header.decode('ascii').split()
+            entries.append((
+                mode,
+                object_type,
+                object_hash,
+                path.decode('utf-8', 'replace'),
+            ))
+        return entries
+
+    def object_info(self, object_name):
+        """
+        Returns (hash, type, size) for anything git can resolve, e.g. a hash,
+        a ref, or ref:path, or None if it doesn't exist
+        """
+        return self.request(self.BATCH_CHECK, object_name)
+
+    def read_object(self, object_name):
+        """Returns (hash, type, contents) for object_name or None"""
+        return self.request(self.BATCH, object_name)
+
+    def close(self):
+        """Shuts down every process this channel owns"""
+        with self.lock:
+            for mode in list(self.processes):
+                self.stop_process(mode)
+            if self.dev_null is not None:
+                self.dev_null.close()
+                self.dev_null = None
@@ -0,0 +1,730 @@
+"""This file provides a pure-Python reader for a repository's object database"""
+
+from binascii import hexlify, unhexlify
+from bisect import bisect_left
+from collections import OrderedDict
+from mmap import mmap, ACCESS_READ
+from os import listdir
+from os.path import abspath, dirname, isabs, isdir, isfile, join, relpath
+from struct import unpack_from
+from threading import Lock
+from zlib import decompressobj, error as ZlibError
+
+import re
+
+from wotw_highlighter.git_backend import GitBackend
+
+
+class GitPack(object):
+    """This class reads objects from a single memory-mapped packfile"""
+
+    IDX_MAGIC = b'\377tOc'
+
+    OBJ_COMMIT = 1
+    OBJ_TREE = 2
+    OBJ_BLOB = 3
+    OBJ_TAG = 4
+    OBJ_OFS_DELTA = 6
+    OBJ_REF_DELTA = 7
+
+    TYPE_NAMES = {
+        OBJ_COMMIT: 'commit',
+        OBJ_TREE: 'tree',
+        OBJ_BLOB: 'blob',
+        OBJ_TAG: 'tag',
+    }
+
+    INFLATE_CHUNK_SIZE = 65536
+
+    def __init__(self, idx_path):
+        """
+        The ctor maps both the index and the pack
+
+        Parameters:
+        idx_path: The path to a version 2 .idx file
+        """
+        self.idx_path = idx_path
+        self.pack_path = idx_path[:-len('.idx')] + '.pack'
+        with open(self.idx_path, 'rb') as idx_file:
+            self.idx = mmap(idx_file.fileno(), 0, access=ACCESS_READ)
+        with open(self.pack_path, 'rb') as pack_file:
+            self.pack = mmap(pack_file.fileno(), 0, access=ACCESS_READ)
+        if self.IDX_MAGIC != self.idx[:4] or 2 != unpack_from('>I', self.idx, 4)[0]:
+            raise ValueError('%s is not a version 2 pack index' % (idx_path))
+        self.count = unpack_from('>I', self.idx, 8 + 255 * 4)[0]
+        self.hashes_offset = 8 + 256 * 4
+        self.offsets_offset = self.hashes_offset + self.count * 24
+        self.large_offsets_offset = self.offsets_offset + self.count * 4
+
+    def close(self):
+        """Unmaps both files"""
+        self.idx.close()
+        self.pack.close()
+
+    def hash_at(self, position):
+        """Returns the raw 20-byte hash at position in the index"""
+        start = self.hashes_offset + position * 20
+        return self.idx[start:start + 20]
+
+    def fanout_range(self, first_byte):
+        """Returns the index positions whose hashes start with first_byte"""
+        low = (
+            unpack_from('>I', self.idx, 8 + (first_byte - 1) * 4)[0]
+            if first_byte
+            else 0
+        )
+        high = unpack_from('>I', self.idx, 8 + first_byte * 4)[0]
+        return low, high
+
+    def find_position(self, raw_hash):
+        """Binary searches the index for a full hash"""
+        low, high = self.fanout_range(bytearray(raw_hash)[0])
+        while low < high:
+            middle = (low + high) // 2
+            candidate = self.hash_at(middle)
+            if candidate == raw_hash:
+                return middle
+            if candidate < raw_hash:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def hashes_with_prefix(self, hex_prefix):
+        """Lists every hex hash in this pack starting with hex_prefix"""
+        low, high = self.fanout_range(int(hex_prefix[:2], 16))
+        matches = []
+        for position in range(low, high):
+            hex_hash = hexlify(self.hash_at(position)).decode('ascii')
+            if hex_hash.startswith(hex_prefix):
+                matches.append(hex_hash)
+        return matches
+
+    def offset_at(self, position):
+        """Returns the pack offset of the object at position"""
+        offset = unpack_from('>I', self.idx, self.offsets_offset + position * 4)[0]
+        if offset & 0x80000000:
+            offset = unpack_from(
+                '>Q',
+                self.idx,
+                self.large_offsets_offset + (offset & 0x7fffffff) * 8
+            )[0]
+        return offset
+
+    def find_offset(self, raw_hash):
+        """Returns the pack offset of raw_hash or None"""
+        position = self.find_position(raw_hash)
+        if position is None:
+            return None
+        return self.offset_at(position)
+
+    def entry_header(self, offset):
+        """Parses the type and size varint of the entry at offset"""
+        byte = bytearray(self.pack[offset:offset + 1])[0]
+        offset += 1
+        object_type = (byte >> 4) & 7
+        size = byte & 15
+        shift = 4
+        while byte & 0x80:
+            byte = bytearray(self.pack[offset:offset + 1])[0]
+            offset += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+        return object_type, size, offset
+
+    def delta_base(self, object_type, offset, entry_offset):
+        """Returns ('offset', n) or ('hash', raw) plus where the data starts"""
+        if self.OBJ_REF_DELTA == object_type:
+            return ('hash', self.pack[offset:offset + 20]), offset + 20
+        byte = bytearray(self.pack[offset:offset + 1])[0]
+        offset += 1
+        base_distance = byte & 0x7f
+        while byte & 0x80:
+            byte = bytearray(self.pack[offset:offset + 1])[0]
+            offset += 1
+            base_distance = ((base_distance + 1) << 7) | (byte & 0x7f)
+        return ('offset', entry_offset - base_distance), offset
+
+    def inflate(self, offset, size=None, max_length=0):
+        """
+        Inflates zlib data starting at offset straight from the map; slicing
+        a memoryview doesn't copy the pack
+        """
+        view = memoryview(self.pack)
+        decompressor = decompressobj()
+        chunks = []
+        produced = 0
+        try:
+            while not decompressor.eof:
+                chunk = view[offset:offset + self.INFLATE_CHUNK_SIZE]
+                if not chunk:
+                    raise ValueError('Truncated pack %s' % (self.pack_path))
+                offset += len(chunk)
+                if max_length:
+                    output = decompressor.decompress(chunk, max_length - produced)
+                else:
+                    output = decompressor.decompress(chunk)
+                chunks.append(output)
+                produced += len(output)
+                if max_length and produced >= max_length:
+                    break
+        finally:
+            view.release()
+        data = b''.join(chunks)
+        if size is not None and not max_length and len(data) != size:
+            raise ValueError('Corrupt entry in %s' % (self.pack_path))
+        return data
+
+
+class GitObjectStore(GitBackend):
+    """
+    This class resolves refs, walks trees, and inflates loose and packed
+    objects directly from the git directory without ever forking git
+    """
+
+    FULL_HASH_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+    SHORT_HASH_PATTERN = re.compile(r'^[0-9a-f]{4,39}$')
+    TREE_ENTRY_PATTERN = re.compile(br'(\d+) ([^\0]*)\0', re.DOTALL)
+    REVISION_SUFFIX_PATTERN = re.compile(r'\^\{(\w*)\}|([~^])(\d*)')
+    PARENT_PATTERN = re.compile(br'^parent ([0-9a-f]{40})$', re.MULTILINE)
+
+    REF_SEARCH_ORDER = [
+        '%s',
+        'refs/%s',
+        'refs/tags/%s',
+        'refs/heads/%s',
+        'refs/remotes/%s',
+        'refs/remotes/%s/HEAD',
+    ]
+
+    MAX_SYMBOLIC_DEPTH = 5
+    DELTA_BASE_CACHE_SIZE = 64
+
+    def __init__(self, working_directory):
+        self.common_dir = None
+        self.work_tree = None
+        super(GitObjectStore, self).__init__(working_directory)
+        self.object_directories = self.discover_object_directories()
+        self.packs = dict()
+        self.delta_base_cache = OrderedDict()
+        self.lock = Lock()
+
+    def discover_git_dir(self):
+        """Walks up from working_directory looking for .git"""
+        directory = abspath(self.working_directory)
+        while True:
+            candidate = join(directory, '.git')
+            if isdir(candidate):
+                git_dir = candidate
+                break
+            if isfile(candidate):
+                with open(candidate, 'r') as git_file:
+                    pointer = git_file.read().strip()
+                if pointer.startswith('gitdir:'):
+                    git_dir = pointer[len('gitdir:'):].strip()
+                    if not isabs(git_dir):
+                        git_dir = join(directory, git_dir)
+                    break
+            if dirname(directory) == directory:
+                raise ValueError(
+                    "'%s' is not a git repo"
+                    % (
+                        self.working_directory,
+                    )
+                )
+            directory = dirname(directory)
+        self.work_tree = directory
+        self.common_dir = git_dir
+        common_pointer = join(git_dir, 'commondir')
+        if isfile(common_pointer):
+            with open(common_pointer, 'r') as common_file:
+                self.common_dir = abspath(
+                    join(git_dir, common_file.read().strip())
+                )
+        return git_dir
+
+    def discover_object_directories(self):
+        """Lists the object directory and any alternates"""
+        objects = join(self.common_dir, 'objects')
+        directories = [objects]
+        alternates = join(objects, 'info', 'alternates')
+        if isfile(alternates):
+            with open(alternates, 'r') as alternates_file:
+                for line in alternates_file:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        directories.append(
+                            line if isabs(line) else abspath(join(objects, line))
+                        )
+        return directories
+
+    def refresh_packs(self):
+        """Maps any packs that have appeared since the last scan"""
+        for objects in self.object_directories:
+            pack_directory = join(objects, 'pack')
+            if not isdir(pack_directory):
+                continue
+            for filename in sorted(listdir(pack_directory)):
+                idx_path = join(pack_directory, filename)
+                if filename.endswith('.idx') and idx_path not in self.packs:
+                    try:
+                        self.packs[idx_path] = GitPack(idx_path)
+                    except (IOError, OSError, ValueError):
+                        continue
+
+    def find_packed(self, raw_hash):
+        """Returns (pack, offset) for raw_hash, rescanning packs on a miss"""
+        for attempt in range(2):
+            for pack in list(self.packs.values()):
+                offset = pack.find_offset(raw_hash)
+                if offset is not None:
+                    return pack, offset
+            if not attempt:
+                with self.lock:
+                    self.refresh_packs()
+        return None, None
+
+    def loose_path(self, hex_hash):
+        """Returns the path of a loose object if it exists"""
+        for objects in self.object_directories:
+            path = join(objects, hex_hash[:2], hex_hash[2:])
+            if isfile(path):
+                return path
+        return None
+
+    @staticmethod
+    def parse_loose_header(data):
+        """Splits 'type size\\0' from the front of an inflated loose object"""
+        header, _, contents = data.partition(b'\0')
+        object_type, size = header.decode('ascii').split(' ')
+        return object_type, int(size), contents
+
+    def read_loose(self, path, header_only=False):
+        """Inflates a loose object"""
+        with open(path, 'rb') as loose_file:
+            decompressor = decompressobj()
+            if header_only:
+                data = decompressor.decompress(loose_file.read(512), 64)
+            else:
+                data = decompressor.decompress(loose_file.read())
+        return self.parse_loose_header(data)
+
+    @staticmethod
+    def read_delta_size(delta, offset):
+        """Reads one size varint from a delta"""
+        size = 0
+        shift = 0
+        while True:
+            byte = bytearray(delta[offset:offset + 1])[0]
+            offset += 1
+            size |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return size, offset
+
+    @classmethod
+    def apply_delta(cls, base, delta):
+        """Rebuilds an object from its base and a git delta"""
+        base_size, offset = cls.read_delta_size(delta, 0)
+        if base_size != len(base):
+            raise ValueError('Delta does not match its base')
+        result_size, offset = cls.read_delta_size(delta, offset)
+        delta = bytearray(delta)
+        result = bytearray()
+        while offset < len(delta):
+            opcode = delta[offset]
+            offset += 1
+            if opcode & 0x80:
+                copy_offset = 0
+                copy_size = 0
+                for bit in range(4):
+                    if opcode & (1 << bit):
+                        copy_offset |= delta[offset] << (bit * 8)
+                        offset += 1
+                for bit in range(3):
+                    if opcode & (0x10 << bit):
+                        copy_size |= delta[offset] << (bit * 8)
+                        offset += 1
+                if not copy_size:
+                    copy_size = 0x10000
+                result += base[copy_offset:copy_offset + copy_size]
+            elif opcode:
+                result += delta[offset:offset + opcode]
+                offset += opcode
+            else:
+                raise ValueError('Invalid delta opcode')
+        if len(result) != result_size:
+            raise ValueError('Delta produced the wrong size')
+        return bytes(result)
+
+    def locate_base(self, pack, base):
+        """Turns a delta base reference into (pack, offset)"""
+        kind, value = base
+        if 'offset' == kind:
+            return pack, value
+        base_pack, base_offset = self.find_packed(value)
+        if base_pack is None:
+            path = self.loose_path(hexlify(value).decode('ascii'))
+            if path is None:
+                raise ValueError('Missing delta base')
+            return path, None
+        return base_pack, base_offset
+
+    def read_packed(self, pack, offset):
+        """Inflates a packed object, resolving any chain of deltas"""
+        deltas = []
+        while True:
+            cache_key = (pack.idx_path, offset)
+            cached = self.cached_base(cache_key)
+            if cached is not None:
+                object_type, data = cached
+                break
+            object_type, size, data_offset = pack.entry_header(offset)
+            if object_type in GitPack.TYPE_NAMES:
+                object_type = GitPack.TYPE_NAMES[object_type]
+                data = pack.inflate(data_offset, size)
+                break
+            base, data_offset = pack.delta_base(object_type, data_offset, offset)
+            deltas.append((cache_key, pack.inflate(data_offset, size)))
+            pack, offset = self.locate_base(pack, base)
+            if offset is None:
+                object_type, _, data = self.read_loose(pack)
+                break
+        for index in range(len(deltas) - 1, -1, -1):
+            cache_key, delta = deltas[index]
+            data = self.apply_delta(data, delta)
+            if index:
+                self.remember_base(cache_key, object_type, data)
+        return object_type, data
+
+    def cached_base(self, cache_key):
+        """Returns a remembered (type, data) delta base, marking it used"""
+        with self.lock:
+            cached = self.delta_base_cache.get(cache_key)
+            if cached is not None:
+                self.delta_base_cache.move_to_end(cache_key)
+            return cached
+
+    def remember_base(self, cache_key, object_type, data):
+        """
+        Keeps a bounded number of delta bases around for long chains,
+        evicting the least recently used
+        """
+        with self.lock:
+            self.delta_base_cache[cache_key] = (object_type, data)
+            while len(self.delta_base_cache) > self.DELTA_BASE_CACHE_SIZE:
+                self.delta_base_cache.popitem(last=False)
+
+    def packed_info(self, pack, offset):
+        """Finds a packed object's type and size without inflating bases"""
+        object_type, size, data_offset = pack.entry_header(offset)
+        if object_type in GitPack.TYPE_NAMES:
+            return GitPack.TYPE_NAMES[object_type], size
+        base, data_offset = pack.delta_base(object_type, data_offset, offset)
+        delta_start = pack.inflate(data_offset, max_length=32)
+        _, delta_offset = self.read_delta_size(delta_start, 0)
+        result_size, _ = self.read_delta_size(delta_start, delta_offset)
+        base_pack, base_offset = self.locate_base(pack, base)
+        if base_offset is None:
+            return self.read_loose(base_pack, True)[0], result_size
+        return self.packed_info(base_pack, base_offset)[0], result_size
+
+    def raw_object(self, hex_hash, header_only=False):
+        """Returns (type, size, contents) for a full hex hash or None"""
+        path = self.loose_path(hex_hash)
+        try:
+            if path is not None:
+                object_type, size, contents = self.read_loose(path, header_only)
+                return object_type, size, (None if header_only else contents)
+            pack, offset = self.find_packed(unhexlify(hex_hash))
+            if pack is None:
+                return None
+            if header_only:
+                object_type, size = self.packed_info(pack, offset)
+                return object_type, size, None
+            object_type, contents = self.read_packed(pack, offset)
+            return object_type, len(contents), contents
+        except (IOError, OSError, ValueError, ZlibError):
+            return None
+
+    def expand_short_hash(self, hex_prefix):
+        """Returns the unique full hash starting with hex_prefix or None"""
+        matches = set()
+        for objects in self.object_directories:
+            directory = join(objects, hex_prefix[:2])
+            if isdir(directory):
+                for filename in listdir(directory):
+                    full_hash = hex_prefix[:2] + filename
+                    if full_hash.startswith(hex_prefix):
+                        matches.add(full_hash)
+        with self.lock:
+            self.refresh_packs()
+        for pack in list(self.packs.values()):
+            matches.update(pack.hashes_with_prefix(hex_prefix))
+        if 1 == len(matches):
+            return matches.pop()
+        return None
+
+    def packed_refs(self):
+        """Parses packed-refs into {ref: hash}, skipping peeled lines"""
+        refs = dict()
+        path = join(self.common_dir, 'packed-refs')
+        if not isfile(path):
+            return refs
+        with open(path, 'r') as packed_file:
+            for line in packed_file:
+                line = line.strip()
+                if not line or line[0] in '#^':
+                    continue
+                ref_hash, _, ref_name = line.partition(' ')
+                refs[ref_name] = ref_hash
+        return refs
+
+    def ref_directory(self, ref_name):
+        """HEAD-like refs live in git_dir; everything else is shared"""
+        if ref_name.startswith('refs/'):
+            return self.common_dir
+        return self.git_dir
+
+    def read_ref(self, ref_name, packed_refs, depth=0):
+        """Follows a (possibly symbolic) ref to a hash"""
+        if depth > self.MAX_SYMBOLIC_DEPTH:
+            return None
+        path = join(self.ref_directory(ref_name), ref_name)
+        if isfile(path):
+            with open(path, 'r') as ref_file:
+                contents = ref_file.read().strip()
+            if contents.startswith('ref:'):
+                return self.read_ref(
+                    contents[len('ref:'):].strip(),
+                    packed_refs,
+                    depth + 1
+                )
+            if self.FULL_HASH_PATTERN.match(contents):
+                return contents
+            return None
+        return packed_refs.get(ref_name)
+
+    def resolve_ref(self, ref_name):
+        """Resolves a ref name the way git rev-parse searches for one"""
+        if '..' in ref_name or ref_name.startswith('/'):
+            return None
+        packed_refs = self.packed_refs()
+        for pattern in self.REF_SEARCH_ORDER:
+            resolved = self.read_ref(pattern % (ref_name), packed_refs)
+            if resolved:
+                return resolved
+        return None
+
+    def resolve_name(self, name):
+        """Turns a hash, abbreviated hash, or ref name into a full hash"""
+        if '@' == name:
+            name = 'HEAD'
+        if self.FULL_HASH_PATTERN.match(name):
+            return name
+        resolved = self.resolve_ref(name)
+        if resolved:
+            return resolved
+        if self.SHORT_HASH_PATTERN.match(name):
+            return self.expand_short_hash(name)
+        return None
+
+    def resolve_revision(self, revision):
+        """
+        Turns a name followed by any ~N, ^N, and ^{type} suffixes into a full
+        hash, walking first parents and peeling the way git rev-parse does
+        """
+        name_end = len(revision)
+        for marker in '~^':
+            if marker in revision:
+                name_end = min(name_end, revision.index(marker))
+        suffixes = []
+        position = name_end
+        while position < len(revision):
+            suffix = self.REVISION_SUFFIX_PATTERN.match(revision, position)
+            if suffix is None:
+                break
+            suffixes.append(suffix)
+            position = suffix.end()
+        # Reflog entries like @{1} and ranges like ^@ aren't read here
+        if position < len(revision) or '@{' in revision[:name_end]:
+            raise ValueError(
+                'Unsupported revision syntax in %s'
+                % (
+                    revision,
+                )
+            )
+        resolved = self.resolve_name(revision[:name_end])
+        for suffix in suffixes:
+            if resolved is None:
+                break
+            if suffix.group(2) is None:
+                resolved = self.peel(resolved, suffix.group(1) or None)
+            elif '~' == suffix.group(2):
+                for _ in range(int(suffix.group(3) or 1)):
+                    resolved = self.parent(resolved, 1)
+                    if resolved is None:
+                        break
+            elif '0' == suffix.group(3):
+                resolved = self.peel(resolved, 'commit')
+            else:
+                resolved = self.parent(resolved, int(suffix.group(3) or 1))
+        return resolved
+
+    def peel(self, hex_hash, object_type=None):
+        """
+        Peels tags, and commits down to their trees, until hex_hash names an
+        object_type; with no type, only tags are peeled
+        """
+        for _ in range(self.MAX_SYMBOLIC_DEPTH + 1):
+            git_object = self.raw_object(hex_hash, header_only=True)
+            if git_object is None:
+                return None
+            if object_type in (git_object[0], 'object'):
+                return hex_hash
+            if 'tag' == git_object[0]:
+                hex_hash = self.raw_object(hex_hash)[2][7:47].decode('ascii')
+            elif 'commit' == git_object[0] and 'tree' == object_type:
+                hex_hash = self.raw_object(hex_hash)[2][5:45].decode('ascii')
+            elif object_type is None:
+                return hex_hash
+            else:
+                return None
+        return None
+
+    def parent(self, hex_hash, number):
+        """Finds the numbered parent of the commit hex_hash peels to"""
+        commit_hash = self.peel(hex_hash, 'commit')
+        if commit_hash is None:
+            return None
+        parents = self.PARENT_PATTERN.findall(
+            self.raw_object(commit_hash)[2].split(b'\n\n', 1)[0]
+        )
+        if number > len(parents):
+            return None
+        return parents[number - 1].decode('ascii')
+
+    def peel_to_tree(self, hex_hash):
+        """Peels tags and commits down to a tree hash"""
+        return self.peel(hex_hash, 'tree')
+
+    def tree_entry(self, tree_hash, name):
+        """Finds a single entry's hash in a tree"""
+        git_object = self.raw_object(tree_hash)
+        if git_object is None or 'tree' != git_object[0]:
+            return None
+        contents = git_object[2]
+        encoded = name.encode('utf-8')
+        position = 0
+        while position < len(contents):
+            match = self.TREE_ENTRY_PATTERN.match(contents, position)
+            if match is None:
+                return None
+            position = match.end() + 20
+            if match.group(2) == encoded:
+                return hexlify(contents[match.end():position]).decode('ascii')
+        return None
+
+    def tree_entries(self, tree_hash):
+        """Yields (mode, name, hash) for each entry in a tree"""
+        git_object = self.raw_object(tree_hash)
+        if git_object is None or 'tree' != git_object[0]:
+            return
+        contents = git_object[2]
+        position = 0
+        while position < len(contents):
+            match = self.TREE_ENTRY_PATTERN.match(contents, position)
+            if match is None:
+                return
+            position = match.end() + 20
+            yield (
+                match.group(1).decode('ascii').zfill(6),
+                match.group(2),
+                hexlify(contents[match.end():position]).decode('ascii'),
+            )
+
+    def list_tree(self, tree_ish):
+        """Walks every tree under tree_ish, in the order ls-tree -r lists"""
+        resolved = self.resolve(tree_ish)
+        tree_hash = None if resolved is None else self.peel_to_tree(resolved)
+        if tree_hash is None:
+            return None
+        entries = []
+        stack = [(self.tree_entries(tree_hash), b'')]
+        while stack:
+            tree_entries, prefix = stack[-1]
+            for mode, name, entry_hash in tree_entries:
+                if mode.startswith('04'):
+                    stack.append((
+                        self.tree_entries(entry_hash),
+                        prefix + name + b'/'
+                    ))
+                    break
+                entries.append((
+                    mode,
+                    'commit' if '160000' == mode else 'blob',
+                    entry_hash,
+                    (prefix + name).decode('utf-8', 'replace'),
+                ))
+            else:
+                stack.pop()
+        return entries
+
+    def normalize_tree_path(self, path):
+        """Turns ./ and ../ paths into repo-root-relative components"""
+        if path.startswith('./') or path.startswith('../'):
+            prefix = relpath(abspath(self.working_directory), self.work_tree)
+            path = join(prefix, path)
+        components = []
+        for component in path.split('/'):
+            if component in ('', '.'):
+                continue
+            if '..' == component:
+                if not components:
+                    return None
+                components.pop()
+            else:
+                components.append(component)
+        return components
+
+    def resolve(self, object_name):
+        """Resolves anything BlockLoader asks for into a full hex hash"""
+        revision, separator, path = object_name.partition(':')
+        resolved = self.resolve_revision(revision)
+        if not separator or resolved is None:
+            return resolved
+        current = self.peel_to_tree(resolved)
+        components = self.normalize_tree_path(path)
+        if components is None:
+            return None
+        for component in components:
+            if current is None:
+                return None
+            current = self.tree_entry(current, component)
+        return current
+
+    def object_info(self, object_name):
+        resolved = self.resolve(object_name)
+        if resolved is None:
+            return None
+        git_object = self.raw_object(resolved, header_only=True)
+        if git_object is None:
+            return None
+        return resolved, git_object[0], git_object[1]
+
+    def read_object(self, object_name):
+        resolved = self.resolve(object_name)
+        if resolved is None:
+            return None
+        git_object = self.raw_object(resolved)
+        if git_object is None:
+            return None
+        return resolved, git_object[0], git_object[2]
+
+    def close(self):
+        """Unmaps every pack"""
+        with self.lock:
+            for pack in self.packs.values():
+                pack.close()
+            self.packs.clear()
+            self.delta_base_cache.clear()
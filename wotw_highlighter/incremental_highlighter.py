@@ -0,0 +1,504 @@
+"""This file provides a highlighter that only re-lexes what an edit touched"""
+
+from bisect import bisect_left
+from threading import Lock
+
+from pygments import format as format_tokens
+from pygments.lexer import RegexLexer
+from pygments.token import Error, Whitespace, _TokenType
+
+from wotw_highlighter.block_highlighter import BlockHighlighter
+
+# pylint: disable=deprecated-module,no-name-in-module
+try:
+    from re import _compiler as sre_compile
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_compile
+    import sre_constants
+    import sre_parse
+
+CHARACTER_OPERATORS = (
+    sre_constants.ANY,
+    sre_constants.CATEGORY,
+    sre_constants.IN,
+    sre_constants.LITERAL,
+    sre_constants.NOT_LITERAL,
+)
+
+REPEAT_OPERATORS = tuple(
+    getattr(sre_constants, name)
+    for name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT')
+    if hasattr(sre_constants, name)
+)
+
+GROUP_OPERATORS = tuple(
+    getattr(sre_constants, name)
+    for name in ('SUBPATTERN', 'ATOMIC_GROUP')
+    if hasattr(sre_constants, name)
+)
+
+ZERO_WIDTH_OPERATORS = (
+    sre_constants.ASSERT,
+    sre_constants.ASSERT_NOT,
+    sre_constants.AT,
+)
+
+PROBE_CHARACTERS = u'a0 _!"\'#*/-\n'
+
+
+def split_lines(text):
+    """Splits text after every newline, the way formatters count lines"""
+    lines = text.split('\n')
+    last = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def common_prefix_length(first, second):
+    """Counts the equal leading items of two lists"""
+    low, high = 0, min(len(first), len(second))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if first[low:middle] == second[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def common_suffix_length(first, second, limit):
+    """Counts the equal trailing items of two lists, up to limit"""
+    low, high = 0, limit
+    while low < high:
+        middle = (low + high + 1) // 2
+        if (
+                first[len(first) - middle:len(first) - low]
+                ==
+                second[len(second) - middle:len(second) - low]
+        ):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class RuleProbe(object):
+    """
+    This class finds the lexer rules whose failed matches may have read to
+    the end of the text, like an unterminated /* or \"\"\", and the suffix
+    that would complete them
+
+    A rule qualifies when an unbounded repeat that can cross lines is
+    followed by more pattern. Appending the completion to the text and
+    matching again tells a failure that ran out of text from one that
+    didn't; text added later can only change the former
+    """
+
+    def __init__(self, pattern):
+        """
+        Parameters:
+        pattern: A compiled lexer rule
+
+        Raises ValueError when the pattern uses something this can't follow
+        """
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+        self.state = parsed.state
+        self.flags = pattern.flags
+        self.completion = self.hazard_completion(list(parsed))
+
+    def matcher(self, item):
+        """Compiles a single parsed item"""
+        return sre_compile.compile(
+            sre_parse.SubPattern(self.state, [item]),
+            self.flags
+        ).match
+
+    def character(self, item):
+        """Picks a character item matches"""
+        operator, argument = item
+        candidates = list(PROBE_CHARACTERS)
+        if sre_constants.LITERAL is operator:
+            candidates.insert(0, chr(argument))
+        elif sre_constants.IN is operator:
+            for member_operator, member in argument:
+                if sre_constants.LITERAL is member_operator:
+                    candidates.append(chr(member))
+                elif sre_constants.RANGE is member_operator:
+                    candidates.append(chr(member[0]))
+        match = self.matcher(item)
+        for character in candidates:
+            if match(character):
+                return character
+        raise ValueError('No probe character matches %r' % (item,))
+
+    def shortest(self, items):
+        """Builds a short string items match"""
+        parts = []
+        for operator, argument in items:
+            if operator in CHARACTER_OPERATORS:
+                parts.append(self.character((operator, argument)))
+            elif operator in REPEAT_OPERATORS:
+                parts.append(self.shortest(argument[2]) * argument[0])
+            elif operator in GROUP_OPERATORS:
+                parts.append(self.shortest(argument[-1]))
+            elif operator is sre_constants.BRANCH:
+                parts.append(self.shortest(argument[1][0]))
+            elif operator not in ZERO_WIDTH_OPERATORS:
+                raise ValueError('Cannot probe %s' % (operator))
+        return ''.join(parts)
+
+    def crosses_lines(self, items):
+        """Whether items can consume a newline"""
+        for operator, argument in items:
+            if operator in CHARACTER_OPERATORS:
+                if self.matcher((operator, argument))('\n'):
+                    return True
+            elif operator in REPEAT_OPERATORS:
+                if self.crosses_lines(argument[2]):
+                    return True
+            elif operator in GROUP_OPERATORS:
+                if self.crosses_lines(argument[-1]):
+                    return True
+            elif operator is sre_constants.BRANCH:
+                if any(self.crosses_lines(branch) for branch in argument[1]):
+                    return True
+        return False
+
+    def hazard_completion(self, items):
+        """
+        Returns what completes items after their first unbounded repeat that
+        can cross lines, or None if nothing follows one
+        """
+        for index, (operator, argument) in enumerate(items):
+            inner = None
+            if operator in REPEAT_OPERATORS:
+                if (
+                        sre_constants.MAXREPEAT == argument[1]
+                        and self.crosses_lines(argument[2])
+                ):
+                    inner = ''
+            elif operator in GROUP_OPERATORS:
+                inner = self.hazard_completion(list(argument[-1]))
+            elif operator is sre_constants.BRANCH:
+                for branch in argument[1]:
+                    inner = self.hazard_completion(list(branch))
+                    if inner is not None:
+                        break
+            if inner is not None:
+                completion = inner + self.shortest(items[index + 1:])
+                return completion or None
+        return None
+
+
+class IncrementalHighlighter(BlockHighlighter):
+    """
+    This class keeps the formatted lines and the lexer's state stack at line
+    starts so update only re-lexes from the last checkpoint before an edit
+    until the state matches the old run again
+
+    Usage:
+        highlighter = IncrementalHighlighter(blob=text, blob_path='main.py')
+        highlighter.attach_and_highlight()
+        start, end, lines = highlighter.update(edited_text)
+        highlighter.highlight()
+
+    Lexers that don't run the stock RegexLexer loop, have filters, or use
+    patterns RuleProbe can't follow are re-lexed in full on every update
+    """
+
+    line_texts = None
+    line_states = None
+    line_html = None
+    open_lines = None
+    interned_states = None
+
+    lexer_probes = dict()
+    probe_lock = Lock()
+
+    @classmethod
+    def probes_for(cls, lexer_class, token_definitions):
+        """
+        Returns (rules, suffix) for lexer_class: the rule matchers whose
+        failures may depend on the end of the text and what completes them,
+        or None if the lexer can't be followed
+        """
+        with cls.probe_lock:
+            if lexer_class not in cls.lexer_probes:
+                rules = set()
+                suffix = []
+                try:
+                    for state_tokens in token_definitions.values():
+                        for match_rule, _, _ in state_tokens:
+                            completion = RuleProbe(
+                                match_rule.__self__
+                            ).completion
+                            if completion is not None:
+                                rules.add(match_rule)
+                                if completion not in suffix:
+                                    suffix.append(completion)
+                    probes = (frozenset(rules), ''.join(suffix))
+                except (AttributeError, ValueError, TypeError):
+                    probes = None
+                cls.lexer_probes[lexer_class] = probes
+            return cls.lexer_probes[lexer_class]
+
+    def probes(self):
+        """Returns the attached lexer's probes"""
+        # pylint: disable=protected-access
+        return self.probes_for(type(self.lexer), self.lexer._tokens)
+
+    def incremental(self):
+        """Whether the lexer's state can be resumed between lines"""
+        return (
+            isinstance(self.lexer, RegexLexer)
+            and
+            type(self.lexer).get_tokens_unprocessed
+            is RegexLexer.get_tokens_unprocessed
+            and
+            not self.lexer.filters
+            and
+            self.probes() is not None
+        )
+
+    def intern_state(self, state):
+        """Shares equal state stacks between lines"""
+        return self.interned_states.setdefault(state, state)
+
+    def lex(self, text, pos, stack, at_line_start):
+        """
+        Runs RegexLexer.get_tokens_unprocessed from pos with stack, calling
+        at_line_start(pos, stack) at every later line start a token ends on.
+        Zero-width matches don't count, so a checkpoint keeps the state the
+        lexer arrived at the line with
+
+        Returns (tokens, end, open_positions), stopping early when
+        at_line_start returns True; open_positions are where a rule failed
+        for lack of text
+        """
+        lexer = self.lexer
+        # pylint: disable=protected-access
+        token_definitions = lexer._tokens
+        hazards, suffix = self.probes()
+        probe_text = text + suffix
+        state_stack = list(stack)
+        state_tokens = token_definitions[state_stack[-1]]
+        tokens = []
+        open_positions = []
+        length = len(text)
+        while pos < length:
+            before = pos
+            for match_rule, action, new_state in state_tokens:
+                match = match_rule(text, pos)
+                if not match:
+                    if match_rule in hazards and match_rule(probe_text, pos):
+                        open_positions.append(pos)
+                    continue
+                if action is not None:
+                    if type(action) is _TokenType:
+                        tokens.append((action, match.group()))
+                    else:
+                        tokens.extend(
+                            (token_type, value)
+                            for _, token_type, value in action(lexer, match)
+                        )
+                pos = match.end()
+                if new_state is not None:
+                    self.transition(state_stack, new_state)
+                    state_tokens = token_definitions[state_stack[-1]]
+                break
+            else:
+                if '\n' == text[pos]:
+                    state_stack = ['root']
+                    state_tokens = token_definitions['root']
+                    tokens.append((Whitespace, '\n'))
+                else:
+                    tokens.append((Error, text[pos]))
+                pos += 1
+            if (
+                    before < pos < length
+                    and '\n' == text[pos - 1]
+                    and at_line_start(pos, tuple(state_stack))
+            ):
+                break
+        return tokens, pos, open_positions
+
+    @staticmethod
+    def transition(state_stack, new_state):
+        """Applies a RegexLexer state change to state_stack in place"""
+        if isinstance(new_state, tuple):
+            for state in new_state:
+                if '#pop' == state:
+                    if len(state_stack) > 1:
+                        state_stack.pop()
+                elif '#push' == state:
+                    state_stack.append(state_stack[-1])
+                else:
+                    state_stack.append(state)
+        elif isinstance(new_state, int):
+            if abs(new_state) >= len(state_stack):
+                del state_stack[1:]
+            else:
+                del state_stack[new_state:]
+        elif '#push' == new_state:
+            state_stack.append(state_stack[-1])
+
+    @staticmethod
+    def line_cursor(lines, line, offset):
+        """
+        Returns a function mapping ascending offsets from lines[line], which
+        starts at offset, to line numbers
+        """
+        cursor = [line, offset]
+
+        def line_at(pos):
+            line, line_start = cursor
+            while line_start + len(lines[line]) <= pos:
+                line_start += len(lines[line])
+                line += 1
+            cursor[:] = [line, line_start]
+            return line
+
+        return line_at
+
+    def relex_all(self):
+        """Highlights blob from scratch, checkpointing every line it can"""
+        text = self.preprocess(self.blob)
+        self.line_texts = split_lines(text)
+        self.line_states = [None] * len(self.line_texts)
+        self.open_lines = []
+        self.interned_states = dict()
+        if not self.incremental():
+            tokens = list(self.lexer.get_tokens(self.blob))
+        else:
+            self.line_states[0] = self.intern_state(('root',))
+            line_at = self.line_cursor(self.line_texts, 0, 0)
+
+            def checkpoint(pos, state):
+                self.line_states[line_at(pos)] = self.intern_state(state)
+                return False
+
+            tokens, _, open_positions = self.lex(
+                text,
+                0,
+                ('root',),
+                checkpoint
+            )
+            line_at = self.line_cursor(self.line_texts, 0, 0)
+            self.open_lines = sorted(set(map(line_at, open_positions)))
+        self.line_html = self.formatter.format_code_lines(tokens)
+
+    def restart_line(self, prefix):
+        """
+        Finds the checkpoint to re-lex from for an edit after prefix lines:
+        before the line preceding the edit, since lookahead may peek past a
+        newline, and before any line left waiting on more text
+        """
+        restart = max(prefix - 1, 0)
+        if self.open_lines and self.open_lines[0] < restart:
+            restart = self.open_lines[0]
+        while self.line_states[restart] is None:
+            restart -= 1
+        return restart
+
+    def update(self, blob):
+        """
+        Re-highlights the lines an edit affected
+
+        Parameters:
+        blob: The new version of the text
+
+        Returns (start, end, lines): the formatted lines that replace
+        [start, end) of the previous version's lines
+        """
+        previous_html = self.line_html
+        self.blob = blob
+        if previous_html is None or not self.incremental():
+            self.relex_all()
+            return self.trim_change(previous_html or [], 0, self.line_html)
+        text = self.preprocess(blob)
+        new_lines = split_lines(text)
+        old_lines = self.line_texts
+        prefix = common_prefix_length(old_lines, new_lines)
+        if prefix == len(old_lines) == len(new_lines):
+            return prefix, prefix, []
+        suffix_start = len(new_lines) - common_suffix_length(
+            old_lines,
+            new_lines,
+            min(len(old_lines), len(new_lines)) - prefix
+        )
+        shift = len(new_lines) - len(old_lines)
+        restart = self.restart_line(prefix)
+        offset = sum(len(line) for line in new_lines[:restart])
+        line_at = self.line_cursor(new_lines, restart, offset)
+        states = {restart: self.line_states[restart]}
+        stop = [len(new_lines)]
+
+        def resynchronized(pos, state):
+            line = line_at(pos)
+            states[line] = self.intern_state(state)
+            if line >= suffix_start and self.line_states[line - shift] == state:
+                stop[0] = line
+                return True
+            return False
+
+        tokens, _, open_positions = self.lex(
+            text,
+            offset,
+            self.line_states[restart],
+            resynchronized
+        )
+        stop = stop[0]
+        old_stop = stop - shift
+        html = self.formatter.format_code_lines(tokens)
+        replaced = previous_html[restart:old_stop]
+        line_at = self.line_cursor(new_lines, restart, offset)
+        self.open_lines = (
+            self.open_lines[:bisect_left(self.open_lines, restart)]
+            + sorted(set(map(line_at, open_positions)))
+            + [
+                line + shift
+                for line in self.open_lines[
+                    bisect_left(self.open_lines, old_stop):
+                ]
+            ]
+        )
+        self.line_texts = new_lines
+        self.line_states[restart:old_stop] = [
+            states.get(line) for line in range(restart, stop)
+        ]
+        self.line_html[restart:old_stop] = html
+        return self.trim_change(replaced, restart, html)
+
+    @staticmethod
+    def trim_change(old_html, start, new_html):
+        """Drops replaced lines that came out the same"""
+        prefix = common_prefix_length(old_html, new_html)
+        suffix = common_suffix_length(
+            old_html,
+            new_html,
+            min(len(old_html), len(new_html)) - prefix
+        )
+        return (
+            start + prefix,
+            start + len(old_html) - suffix,
+            new_html[prefix:len(new_html) - suffix]
+        )
+
+    def highlight(self):
+        """
+        Lays out the formatted lines, highlighting blob first if nothing has
+        been yet, writing to outfile instead of highlighted_blob when there
+        is one
+        """
+        if self.line_html is None:
+            self.relex_all()
+        self.formatter.formatted_lines = self.line_html
+        self.formatter.line_count = len(self.line_html)
+        if self.outfile is not None:
+            format_tokens([], self.formatter, self.outfile)
+            return
+        self.highlighted_blob = format_tokens([], self.formatter)
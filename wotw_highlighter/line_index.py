@@ -0,0 +1,100 @@
+"""This file provides an index of where lines start in encoded text"""
+
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+
+class LineIndex(object):
+    """
+    This class records the offset every line starts at in a buffer, scanning
+    only as far as the lines asked for. It keeps offsets rather than text, so
+    one index serves every read of the same content
+
+    Usage:
+        index = LineIndex.for_key(('path', size, mtime))
+        begin, end = index.span(buffer, 1200, 1260)
+        buffer[begin:end]
+    """
+
+    MAX_SHARED = 64
+
+    shared = OrderedDict()
+    shared_lock = Lock()
+
+    def __init__(self, newline=b'\n', start=0):
+        """
+        Parameters:
+        newline: The encoded newline; matches are only counted at multiples
+            of its width from start
+        start: Where the first line starts, past any byte order mark
+        """
+        self.newline = newline
+        self.offsets = array('L', [start])
+        self.complete = False
+        self.lock = Lock()
+
+    @classmethod
+    def for_key(cls, key, newline=b'\n', start=0):
+        """
+        Returns the shared index for key, building it if needed; the least
+        recently used index is dropped past MAX_SHARED
+        """
+        with cls.shared_lock:
+            index = cls.shared.pop(key, None)
+            if index is None:
+                index = cls(newline, start)
+            cls.shared[key] = index
+            while len(cls.shared) > cls.MAX_SHARED:
+                cls.shared.popitem(last=False)
+        return index
+
+    def scan(self, buffer, line_count):
+        """Indexes buffer until line_count lines have started or it ends"""
+        newline = self.newline
+        width = len(newline)
+        offsets = self.offsets
+        size = len(buffer)
+        find = buffer.find
+        pos = offsets[-1]
+        while len(offsets) < line_count and not self.complete:
+            found = find(newline, pos)
+            while found >= 0 and (found - offsets[0]) % width:
+                found = find(newline, found + 1)
+            if found < 0 or found + width >= size:
+                self.complete = True
+            else:
+                pos = found + width
+                offsets.append(pos)
+
+    def span(self, buffer, first_line=None, last_line=None):
+        """
+        Returns the (begin, end) offsets of lines first_line through
+        last_line, counting from 1; either end is open when None
+        """
+        first_line = first_line or 1
+        size = len(buffer)
+        with self.lock:
+            self.scan(
+                buffer,
+                first_line if last_line is None else last_line + 1
+            )
+            offsets = self.offsets
+            if first_line > len(offsets):
+                return size, size
+            begin = offsets[first_line - 1]
+            if last_line is None or last_line >= len(offsets):
+                return begin, size
+            return begin, offsets[last_line]
+
+    def excerpt(self, buffer, first_line, last_line, lead_in_line=None):
+        """
+        Returns (lead_in_begin, begin, end): the span of lines first_line
+        through last_line starts at begin, and the lines lexed ahead of it
+        from lead_in_line start at lead_in_begin
+        """
+        begin, end = self.span(buffer, first_line, last_line)
+        if lead_in_line is None:
+            return begin, begin, end
+        lead_in_begin, _ = self.span(buffer, lead_in_line, lead_in_line)
+        return min(lead_in_begin, begin), begin, end
@@ -0,0 +1,154 @@
+"""This file provides a cache of what a repository's refs resolve to"""
+
+from collections import OrderedDict
+from os import listdir, stat
+from os.path import abspath, isdir, isfile, join
+from threading import Lock
+
+import re
+
+
+class RefCache(object):
+    """
+    This class remembers object_info answers for a repository. Names built
+    on a full hash never change, so they're kept until evicted; names built
+    on refs are kept until HEAD, packed-refs, or a directory under refs
+    changes. ref:path lookups are split into the ref, resolved once, and
+    commit:path, which never changes
+
+    Usage:
+        cache = RefCache(git_dir)
+        cache.object_info('v2.3.0:setup.py', backend.object_info)
+    """
+
+    MAX_OBJECTS = 4096
+
+    FULL_HASH_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+    # :path reads the index, FETCH_HEAD and friends are rewritten in place,
+    # and @{...} can depend on the clock, so none of them can be stamped
+    UNSTAMPED_PATTERN = re.compile(r'^$|^(?!HEAD\b)[A-Z_]+\b|@\{')
+
+    def __init__(self, git_dir):
+        """
+        Parameters:
+        git_dir: The repository's git directory; nothing is read until the
+            first lookup
+        """
+        self.git_dir = git_dir
+        self.common_dir = None
+        self.refs = dict()
+        self.objects = OrderedDict()
+        self.directories = dict()
+        self.stamp = None
+        self.lock = Lock()
+
+    def discover_common_dir(self):
+        """Follows a worktree's commondir file to the shared directory"""
+        common_dir = self.git_dir
+        pointer = join(self.git_dir, 'commondir')
+        if isfile(pointer):
+            with open(pointer, 'r') as common_file:
+                common_dir = abspath(
+                    join(self.git_dir, common_file.read().strip())
+                )
+        return common_dir
+
+    @staticmethod
+    def path_stamp(path):
+        """Returns what changes when path is rewritten, or None if missing"""
+        try:
+            status = stat(path)
+        except OSError:
+            return None
+        return (
+            getattr(status, 'st_mtime_ns', status.st_mtime),
+            status.st_ino,
+            status.st_size,
+        )
+
+    def directory_stamps(self):
+        """
+        Stamps every directory under refs. Refs are written by renaming a
+        lock file into place, which touches the directory they land in, so
+        a directory is only listed again when its own stamp changes
+        """
+        stamps = []
+        pending = [join(self.common_dir, 'refs')]
+        while pending:
+            directory = pending.pop()
+            stamp = self.path_stamp(directory)
+            stamps.append((directory, stamp))
+            known = self.directories.get(directory)
+            if known is None or known[0] != stamp:
+                children = []
+                if stamp is not None:
+                    children = [
+                        join(directory, name)
+                        for name in sorted(listdir(directory))
+                        if isdir(join(directory, name))
+                    ]
+                known = (stamp, children)
+                self.directories[directory] = known
+            pending.extend(known[1])
+        return tuple(stamps)
+
+    def current_stamp(self):
+        """Stamps everything a ref name's resolution depends on"""
+        if self.common_dir is None:
+            self.common_dir = self.discover_common_dir()
+        return (
+            self.path_stamp(join(self.git_dir, 'HEAD')),
+            self.path_stamp(join(self.common_dir, 'packed-refs')),
+            self.directory_stamps(),
+        )
+
+    def refresh(self):
+        """Drops every ref answer if the refs have changed"""
+        stamp = self.current_stamp()
+        if stamp != self.stamp:
+            self.refs.clear()
+            self.stamp = stamp
+
+    def immutable(self, object_name, resolve):
+        """Looks up a name built on a full hash"""
+        with self.lock:
+            if object_name in self.objects:
+                self.objects[object_name] = self.objects.pop(object_name)
+                return self.objects[object_name]
+        answer = resolve(object_name)
+        if answer is not None:
+            with self.lock:
+                self.objects[object_name] = answer
+                while len(self.objects) > self.MAX_OBJECTS:
+                    self.objects.popitem(last=False)
+        return answer
+
+    def object_info(self, object_name, resolve):
+        """
+        Returns (hash, type, size) for object_name like resolve would, only
+        calling resolve for what isn't cached
+
+        Parameters:
+        object_name: A hash, ref, or ref:path
+        resolve: The backend's object_info
+        """
+        revision, separator, path = object_name.partition(':')
+        if self.FULL_HASH_PATTERN.match(revision):
+            return self.immutable(object_name, resolve)
+        if self.UNSTAMPED_PATTERN.search(revision):
+            return resolve(object_name)
+        with self.lock:
+            self.refresh()
+            cached = revision in self.refs
+            stamp = self.stamp
+            answer = self.refs.get(revision)
+        if not cached:
+            answer = resolve(revision)
+            with self.lock:
+                if stamp == self.stamp:
+                    self.refs[revision] = answer
+        if not separator:
+            return answer
+        if answer is None:
+            return None
+        return self.immutable('%s:%s' % (answer[0], path), resolve)
@@ -0,0 +1,201 @@
+"""This file provides content-addressed storage for rendered blocks"""
+
+from collections import OrderedDict
+from hashlib import sha1
+from json import dump, dumps, load
+from os import fdopen, makedirs, remove, rename
+from os.path import isdir, join
+from tempfile import mkstemp
+from threading import Lock
+
+from pygments import __version__ as pygments_version
+
+from wotw_highlighter.__version__ import __version__
+
+
+class RenderCache(object):
+    """
+    RenderCache computes keys for rendered blocks; its children decide where
+    the rendered blocks live
+    """
+
+    KEYED_OPTIONS = [
+        'git_blob_hash',
+        'blob_path',
+        'context_lines',
+        'diff_view',
+        'end_line',
+        'explicit_lexer_name',
+        'external_source_link',
+        'git_base_blob_hash',
+        'git_base_ref_name',
+        'git_ref_name',
+        'guess_lexer_names',
+        'inline_css',
+        'inline_token_styles',
+        'linenos',
+        'no_header',
+        'start_line',
+        'title',
+    ]
+
+    @classmethod
+    def key_for(cls, options, stylesheet, keyed_options=None):
+        """
+        Hashes everything a render depends on
+
+        Parameters:
+        options: The block's full_options()
+        stylesheet: The styles the block is rendered with
+        keyed_options: The options that matter, if not KEYED_OPTIONS
+        """
+        keyed = dict()
+        for option in keyed_options or cls.KEYED_OPTIONS:
+            keyed[option] = options.get(option)
+        keyed['stylesheet'] = sha1(stylesheet.encode('utf-8')).hexdigest()
+        keyed['pygments_version'] = pygments_version
+        keyed['version'] = __version__
+        return sha1(
+            dumps(keyed, sort_keys=True).encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key):
+        """Overridden by children to return (highlighted_blob, styles) or None"""
+        raise NotImplementedError
+
+    def set(self, key, rendered):
+        """Overridden by children to store (highlighted_blob, styles)"""
+        raise NotImplementedError
+
+    def get_lines(self, key):
+        """
+        Overridden by children to return a version's formatted lines or None;
+        lines are kept apart from renders, so get never returns them
+        """
+        raise NotImplementedError
+
+    def set_lines(self, key, lines):
+        """Overridden by children to store a version's formatted lines"""
+        raise NotImplementedError
+
+
+class MemoryRenderCache(RenderCache):
+    """
+    This class keeps recently used renders in memory; a version's lines
+    share the size budget under ('lines', key)
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024):
+        """
+        Parameters:
+        max_size: The most characters of rendered output to hold at once
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    @staticmethod
+    def entry_size(rendered):
+        """Approximates an entry's footprint by its length"""
+        return sum(len(part or '') for part in rendered)
+
+    def get(self, key):
+        with self.lock:
+            rendered = self.entries.pop(key, None)
+            if rendered is not None:
+                self.entries[key] = rendered
+            return rendered
+
+    def set(self, key, rendered):
+        size = self.entry_size(rendered)
+        if size > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entry_size(self.entries.pop(key))
+            self.entries[key] = tuple(rendered)
+            self.size += size
+            while self.size > self.max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self.entry_size(evicted)
+
+    def get_lines(self, key):
+        lines = self.get(('lines', key))
+        return None if lines is None else list(lines)
+
+    def set_lines(self, key, lines):
+        self.set(('lines', key), lines)
+
+
+class DirectoryRenderCache(RenderCache):
+    """This class stores renders as files so they survive between builds"""
+
+    def __init__(self, directory):
+        """
+        Parameters:
+        directory: Where to keep the rendered blocks
+        """
+        self.directory = directory
+
+    def path_for(self, key, extension='json'):
+        """Fans entries out over subdirectories like git's objects"""
+        return join(self.directory, key[:2], '%s.%s' % (key[2:], extension))
+
+    def get(self, key):
+        try:
+            with open(self.path_for(key), 'r') as cache_file:
+                rendered = load(cache_file)
+            return (
+                rendered['highlighted_blob'],
+                rendered['highlighted_blob_styles'],
+            )
+        except (IOError, OSError, KeyError, TypeError, ValueError):
+            return None
+
+    def set(self, key, rendered):
+        self.write(
+            key,
+            self.path_for(key),
+            {
+                'highlighted_blob': rendered[0],
+                'highlighted_blob_styles': rendered[1],
+            }
+        )
+
+    def get_lines(self, key):
+        try:
+            with open(self.path_for(key, 'lines.json'), 'r') as cache_file:
+                lines = load(cache_file)['lines']
+        except (IOError, OSError, KeyError, TypeError, ValueError):
+            return None
+        return lines if isinstance(lines, list) else None
+
+    def set_lines(self, key, lines):
+        self.write(key, self.path_for(key, 'lines.json'), {'lines': lines})
+
+    def write(self, key, destination, entry):
+        """Writes entry to a temporary file then renames it into place"""
+        subdirectory = join(self.directory, key[:2])
+        if not isdir(subdirectory):
+            try:
+                makedirs(subdirectory)
+            except OSError:
+                if not isdir(subdirectory):
+                    raise
+        descriptor, temporary_path = mkstemp(dir=subdirectory, suffix='.tmp')
+        renamed = False
+        try:
+            with fdopen(descriptor, 'w') as cache_file:
+                dump(entry, cache_file)
+            rename(temporary_path, destination)
+            renamed = True
+        except (IOError, OSError):
+            pass
+        finally:
+            # Anything else still propagates, but never leaves a stray file
+            if not renamed:
+                try:
+                    remove(temporary_path)
+                except OSError:
+                    pass
@@ -0,0 +1,554 @@
+"""
+This file provides a long-running render daemon and a client for it, so
+short-lived callers don't pay for imports and warm-up on every block
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from itertools import count
+from json import dumps, loads
+from multiprocessing import cpu_count
+from os import getcwd, remove, sep
+from os.path import exists, join, realpath
+from socket import AF_UNIX, SOCK_STREAM, socket
+from subprocess import PIPE, Popen
+from sys import executable, stdin, stdout
+from queue import Queue
+from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+from threading import BoundedSemaphore, Lock, Thread
+
+from pygments import lexers
+
+from wotw_highlighter.block import (
+    Block,
+    DeferredBlock,
+    LoadedBlock,
+    PreloadedBlock,
+    RenderResult,
+    render_loaded_group,
+)
+from wotw_highlighter.block_highlighter import BlockHighlighter
+from wotw_highlighter.block_loader import BlockLoader
+from wotw_highlighter.block_styler import BlockStyler
+from wotw_highlighter.git_backend import GitBackend
+from wotw_highlighter.render_cache import DirectoryRenderCache
+
+WARM_BLOB = u'def warm():\n    return "warm"\n'
+
+
+def warm_worker(lexer_names=(), blob_paths=()):
+    """
+    Loads what a process's first render would otherwise pay for: the lexer
+    registry and its plugins, the stylesheets, the formatter, and the
+    decorator
+
+    Parameters:
+    lexer_names: Lexer class names to build ahead of time, e.g. PythonLexer
+    blob_paths: File names whose lexers should be found ahead of time
+    """
+    for blob_path in blob_paths:
+        lexer_class = BlockHighlighter.find_lexer_class_for_filename(blob_path)
+        if lexer_class is not None:
+            BlockHighlighter.lexer_instance(lexer_class)
+    for lexer_name in lexer_names:
+        BlockHighlighter.lexer_instance(getattr(lexers, lexer_name))
+    BlockStyler.dump_token_style()
+    LoadedBlock(
+        blob=WARM_BLOB,
+        blob_path='warm.py',
+        inline_css=True,
+        inline_token_styles=True
+    )
+
+
+class RenderRequestHandler(StreamRequestHandler):
+    """This class answers one client connection"""
+
+    def handle(self):
+        self.server.render_server.serve_stream(self.rfile, self.wfile)
+
+
+class UnixRenderListener(ThreadingMixIn, UnixStreamServer):
+    """This class accepts clients on a Unix socket, a thread apiece"""
+
+    daemon_threads = True
+    render_server = None
+
+
+class RenderServer(object):
+    """
+    This class renders blocks for clients that send one JSON object of Block
+    options per line, raw standing in for the positional arg, plus an id to
+    match the response by. Blobs are loaded and the render cache checked
+    here, where git channels stay open; highlighting runs on a pool of
+    workers warmed before the first request. Each response is a line of
+    JSON with the request's id, rendered, highlighted_blob_styles, and
+    error, written as soon as its render finishes
+
+    Usage:
+        server = RenderServer(max_workers=4, lexer_names=['PythonLexer'])
+        server.start()
+        server.serve_unix('/tmp/highlighter.sock')
+    """
+
+    SERVER_OPTIONS = (
+        'blob_working_directory',
+        'git_backend',
+        'observer',
+        'outfile',
+        'render_cache',
+        'token_cache',
+    )
+
+    def __init__(
+            self,
+            max_workers=None,
+            max_pending=64,
+            executor=None,
+            lexer_names=(),
+            blob_paths=(),
+            **kwargs
+    ):
+        """
+        Parameters:
+        max_workers: The size of the pool to create if executor is None
+        max_pending: How many requests each client may have in flight;
+            reading from that client stops until one is answered
+        executor: An existing concurrent.futures executor to reuse
+        lexer_names: Lexer class names workers build while warming
+        blob_paths: File names whose lexers workers find while warming
+        kwargs: Block options every request starts from, e.g.
+            blob_working_directory, git_backend, or render_cache
+        """
+        if kwargs.get('outfile') is not None:
+            raise ValueError('Rendered blocks are sent to clients')
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.executor = executor
+        self.owned_executor = False
+        self.warm_arguments = (tuple(lexer_names), tuple(blob_paths))
+        self.defaults = kwargs
+
+    def start(self):
+        """
+        Warms this process, then the pool; forked workers inherit the warm
+        caches, and a warm-up per worker covers ones that were spawned
+        """
+        warm_worker(*self.warm_arguments)
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.max_workers)
+            self.owned_executor = True
+        # Pools start workers on demand; this brings them all up front
+        warming = [
+            self.executor.submit(warm_worker, *self.warm_arguments)
+            for _ in range(self.max_workers or cpu_count())
+        ]
+        for future in warming:
+            future.result()
+        return self
+
+    def close(self):
+        """Shuts down the pool this server created and its git processes"""
+        if self.owned_executor:
+            self.executor.shutdown()
+            self.executor = None
+            self.owned_executor = False
+        GitBackend.close_all()
+
+    def options_for(self, request):
+        """Lays a request's options over the server's"""
+        for option in self.SERVER_OPTIONS:
+            if option in request:
+                raise ValueError(
+                    '%s is chosen by the server'
+                    % (
+                        option,
+                    )
+                )
+        options = dict(self.defaults)
+        options.update(request)
+        if options.get('blob') is None:
+            self.check_blob_paths(options)
+        return options
+
+    @staticmethod
+    def check_blob_paths(options):
+        """
+        Keeps the files a request loads inside the server's
+        blob_working_directory, whether named by blob_path or raw
+        """
+        root = realpath(options.get('blob_working_directory') or getcwd())
+        paths = [options.get('blob_path')]
+        if options.get('raw'):
+            parsed = BlockLoader.RAW_PATTERN.match(options['raw'])
+            if parsed:
+                paths.append(parsed.group('blob_path'))
+        for path in paths:
+            if not path:
+                continue
+            resolved = realpath(join(root, path))
+            if resolved != root and not resolved.startswith(root + sep):
+                raise ValueError(
+                    '%s is outside the server\'s blob_working_directory'
+                    % (
+                        path,
+                    )
+                )
+
+    def prepare(self, line):
+        """
+        Parses a request and loads its block, unless the blob came with it
+
+        Returns (id, block), with a RenderResult in place of the block when
+        the request failed or the render cache had it
+        """
+        request_id = None
+        try:
+            request = loads(line.decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError('Requests are JSON objects of Block options')
+            request_id = request.pop('id', None)
+            options = self.options_for(request)
+            if options.get('blob') is None:
+                block = DeferredBlock(**options)
+            else:
+                block = PreloadedBlock(**options)
+        except Exception as error:  # pylint: disable=broad-except
+            return request_id, RenderResult(None, None, error)
+        if block.cache_hit:
+            return request_id, RenderResult(
+                block.highlighted_blob,
+                block.highlighted_blob_styles,
+                None
+            )
+        return request_id, block
+
+    def submit(self, request_id, block, responses):
+        """Renders block on the pool, queueing its response when done"""
+        def finish(future):
+            results = [None]
+            Block.collect_group([(0, block)], future, results)
+            responses.put((request_id, results[0]))
+        self.executor.submit(
+            render_loaded_group,
+            [(0, block.worker_options())]
+        ).add_done_callback(finish)
+
+    @staticmethod
+    def response(request_id, result):
+        """Encodes a RenderResult as a line of JSON"""
+        return (
+            u'%s\n'
+            % (
+                dumps(
+                    {
+                        'error': (
+                            None
+                            if result.error is None
+                            else u'%s' % (result.error)
+                        ),
+                        'highlighted_blob_styles': (
+                            result.highlighted_blob_styles
+                        ),
+                        'id': request_id,
+                        'rendered': result.rendered,
+                    },
+                    sort_keys=True
+                ),
+            )
+        ).encode('utf-8')
+
+    def serve_stream(self, reader, writer):
+        """
+        Answers requests read from reader on writer until reader closes;
+        responses may come back in a different order than their requests
+
+        Parameters:
+        reader: A binary file of request lines
+        writer: A binary file for response lines
+        """
+        responses = Queue()
+        # Slots belong to the connection, so a client that stops reading
+        # only stalls its own requests
+        slots = BoundedSemaphore(self.max_pending)
+        writing = Thread(
+            target=self.write_responses,
+            args=(writer, responses, slots)
+        )
+        writing.daemon = True
+        writing.start()
+        requests = 0
+        try:
+            for line in iter(reader.readline, b''):
+                if not line.strip():
+                    continue
+                slots.acquire()
+                requests += 1
+                request_id, block = self.prepare(line)
+                if isinstance(block, RenderResult):
+                    responses.put((request_id, block))
+                    continue
+                try:
+                    self.submit(request_id, block, responses)
+                except Exception as error:  # pylint: disable=broad-except
+                    responses.put((request_id, RenderResult(None, None, error)))
+        finally:
+            responses.put(requests)
+            writing.join()
+
+    def write_responses(self, writer, responses, slots):
+        """
+        Writes responses as they're queued, freeing one of slots for each,
+        until every request read is answered. Once the client stops
+        listening, responses are dropped so their slots still come back
+        """
+        written = 0
+        expected = None
+        listening = True
+        while expected is None or written < expected:
+            item = responses.get()
+            if not isinstance(item, tuple):
+                expected = item
+                continue
+            try:
+                if listening:
+                    writer.write(self.response(*item))
+                    writer.flush()
+            except (IOError, OSError, ValueError):
+                listening = False
+            finally:
+                slots.release()
+            written += 1
+
+    def serve_stdio(self):
+        """Answers requests on stdin until it closes"""
+        self.serve_stream(
+            stdin.buffer,
+            stdout.buffer
+        )
+
+    @staticmethod
+    def claim_socket_path(path):
+        """Clears a stale socket from path unless a server is still on it"""
+        if not exists(path):
+            return
+        probe = socket(AF_UNIX, SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except (IOError, OSError):
+            remove(path)
+            return
+        finally:
+            probe.close()
+        raise ValueError("'%s' already has a server listening" % (path))
+
+    def listen_unix(self, path):
+        """Binds a listener to a Unix socket at path and returns it"""
+        self.claim_socket_path(path)
+        listener = UnixRenderListener(path, RenderRequestHandler)
+        listener.render_server = self
+        return listener
+
+    def serve_unix(self, path):
+        """Answers clients on a Unix socket at path until interrupted"""
+        listener = self.listen_unix(path)
+        try:
+            listener.serve_forever()
+        finally:
+            listener.server_close()
+            remove(path)
+
+
+class RenderClient(object):
+    """
+    This class sends blocks to a RenderServer and reads back what it
+    rendered, keeping one connection open
+
+    Usage:
+        client = RenderClient.connect('/tmp/highlighter.sock')
+        result = client.render('HEAD:setup.py', start_line=1, end_line=20)
+        results = client.render_many([{'raw': 'HEAD:setup.py'}])
+        client.close()
+    """
+
+    def __init__(self, reader, writer, connection=None, process=None):
+        """
+        Parameters:
+        reader: A binary file of response lines
+        writer: A binary file for request lines
+        connection: The socket the files are made from, if any
+        process: The server process the files are piped to, if any
+        """
+        self.reader = reader
+        self.writer = writer
+        self.connection = connection
+        self.process = process
+        self.ids = count()
+        self.write_lock = Lock()
+
+    @classmethod
+    def connect(cls, path):
+        """Connects to a server listening on a Unix socket at path"""
+        connection = socket(AF_UNIX, SOCK_STREAM)
+        connection.connect(path)
+        return cls(
+            connection.makefile('rb'),
+            connection.makefile('wb'),
+            connection=connection
+        )
+
+    @classmethod
+    def spawn(cls, arguments=()):
+        """
+        Starts a private server that answers on its stdin and stdout
+
+        Parameters:
+        arguments: Extra command line arguments for the server
+        """
+        process = Popen(
+            [executable, '-m', 'wotw_highlighter.render_server']
+            + list(arguments),
+            stdin=PIPE,
+            stdout=PIPE
+        )
+        return cls(process.stdout, process.stdin, process=process)
+
+    def send(self, spec, request_id=None):
+        """
+        Sends one request without waiting for it
+
+        Parameters:
+        spec: Block kwargs; raw replaces the positional arg
+        request_id: The id to send; the next free one is used if None
+
+        Returns the request's id
+        """
+        if request_id is None:
+            request_id = next(self.ids)
+        request = dict(spec)
+        request['id'] = request_id
+        with self.write_lock:
+            self.writer.write((u'%s\n' % (dumps(request))).encode('utf-8'))
+            self.writer.flush()
+        return request_id
+
+    def receive(self):
+        """Reads the next response, returning (id, RenderResult)"""
+        line = self.reader.readline()
+        if not line:
+            raise IOError('The render server closed the connection')
+        response = loads(line.decode('utf-8'))
+        return response['id'], RenderResult(
+            response['rendered'],
+            response['highlighted_blob_styles'],
+            (
+                None
+                if response['error'] is None
+                else ValueError(response['error'])
+            )
+        )
+
+    def render(self, raw=None, **kwargs):
+        """Renders one block like Block(raw, **kwargs); returns a RenderResult"""
+        if raw is not None:
+            kwargs['raw'] = raw
+        request_id = self.send(kwargs)
+        while True:
+            response_id, result = self.receive()
+            if response_id == request_id:
+                return result
+
+    def render_many(self, specs):
+        """
+        Sends every spec at once and collects the responses; requests are
+        written from a thread so a server pushing back can't deadlock it
+
+        Returns a RenderResult per spec, in input order
+        """
+        request_ids = [next(self.ids) for _ in specs]
+        indices = dict(
+            (request_id, index)
+            for index, request_id in enumerate(request_ids)
+        )
+        sending = Thread(
+            target=lambda: [
+                self.send(spec, request_id)
+                for spec, request_id in zip(specs, request_ids)
+            ]
+        )
+        sending.daemon = True
+        sending.start()
+        results = [None] * len(specs)
+        for _ in specs:
+            response_id, result = self.receive()
+            results[indices[response_id]] = result
+        sending.join()
+        return results
+
+    def close(self):
+        """Hangs up; a spawned server exits once its stdin closes"""
+        self.writer.close()
+        self.reader.close()
+        if self.connection is not None:
+            self.connection.close()
+        if self.process is not None:
+            self.process.wait()
+
+
+def main(arguments=None):
+    """Runs a server on a Unix socket, or on stdin and stdout"""
+    parser = ArgumentParser(
+        description='Renders blocks for clients until interrupted'
+    )
+    parser.add_argument(
+        '--socket',
+        help='Listen on a Unix socket here instead of stdin and stdout'
+    )
+    parser.add_argument(
+        '--max-workers',
+        type=int,
+        help='Worker processes to render with'
+    )
+    parser.add_argument(
+        '--max-pending',
+        type=int,
+        default=64,
+        help='Requests in flight per client before reading from it stops'
+    )
+    parser.add_argument(
+        '--render-cache',
+        help='Keep rendered blocks in this directory'
+    )
+    parser.add_argument(
+        '--lexer',
+        action='append',
+        default=[],
+        help='A lexer class name to build while warming; repeatable'
+    )
+    options = parser.parse_args(arguments)
+    server = RenderServer(
+        max_workers=options.max_workers,
+        max_pending=options.max_pending,
+        lexer_names=options.lexer,
+        render_cache=(
+            DirectoryRenderCache(options.render_cache)
+            if options.render_cache
+            else None
+        )
+    )
+    server.start()
+    try:
+        if options.socket:
+            server.serve_unix(options.socket)
+        else:
+            server.serve_stdio()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    # Workers unpickle functions by module, so run the imported copy
+    from wotw_highlighter.render_server import main as run_server
+    run_server()
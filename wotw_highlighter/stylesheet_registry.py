@@ -0,0 +1,108 @@
+"""This file provides a process-wide cache of the bundled stylesheets"""
+
+from os import stat
+from threading import Lock
+
+import re
+
+from wotw_highlighter.css_inliner import CssInliner
+
+
+class StylesheetRegistry(object):
+    """
+    This class loads, minifies, and caches stylesheets once per process,
+    reloading any file whose mtime has changed
+    """
+
+    # Strings and comments are matched together so neither is looked for
+    # inside the other
+    PRESERVED_PATTERN = re.compile(
+        r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|/\*.*?\*/',
+        re.DOTALL
+    )
+    PLACEHOLDER_PATTERN = re.compile(r'\x00(\d+)\x00')
+    SPACE_PATTERN = re.compile(r'\s+')
+    PUNCTUATION_PATTERN = re.compile(r'\s*([{};,>])\s*')
+
+    entries = dict()
+    combined = dict()
+    lock = Lock()
+
+    @classmethod
+    def minify(cls, stylesheet):
+        """
+        Drops comments, except /*! notices, and needless whitespace; strings
+        and notices are set aside first so they come through untouched
+        """
+        preserved = []
+
+        def preserve(match):
+            text = match.group()
+            if text.startswith('/*') and not text.startswith('/*!'):
+                return ''
+            preserved.append(text)
+            return '\x00%d\x00' % (len(preserved) - 1)
+
+        stylesheet = cls.PRESERVED_PATTERN.sub(preserve, stylesheet)
+        stylesheet = cls.SPACE_PATTERN.sub(' ', stylesheet)
+        stylesheet = cls.PUNCTUATION_PATTERN.sub(r'\1', stylesheet)
+        stylesheet = re.sub(r'\s*:\s*(?=[^{}]*})', ':', stylesheet)
+        stylesheet = stylesheet.replace(';}', '}').strip()
+        return cls.PLACEHOLDER_PATTERN.sub(
+            lambda match: preserved[int(match.group(1))],
+            stylesheet
+        )
+
+    @staticmethod
+    def modified_time(path):
+        """Returns path's mtime or None if it can't be read"""
+        try:
+            return stat(path).st_mtime
+        except OSError:
+            return None
+
+    @classmethod
+    def load(cls, path):
+        """
+        Returns path's minified contents, reading it only the first time or
+        after it changes
+
+        Parameters:
+        path: The stylesheet to load
+        """
+        modified_time = cls.modified_time(path)
+        with cls.lock:
+            entry = cls.entries.get(path)
+            if entry is not None and entry[0] == modified_time:
+                return entry[1]
+        with open(path, 'r') as css_file:
+            stylesheet = cls.minify(css_file.read())
+        with cls.lock:
+            cls.entries[path] = (modified_time, stylesheet)
+        return stylesheet
+
+    @classmethod
+    def stylesheet(cls, *paths):
+        """
+        Returns the combined, minified stylesheets, reusing one string
+        object for as long as none of them change
+        """
+        loaded = tuple(cls.load(path) for path in paths)
+        with cls.lock:
+            entry = cls.combined.get(paths)
+            if entry is None or entry[0] != loaded:
+                entry = (loaded, ''.join(loaded))
+                cls.combined[paths] = entry
+            return entry[1]
+
+    @classmethod
+    def rules(cls, *paths):
+        """Returns the parsed rule table for the combined stylesheets"""
+        return CssInliner.for_stylesheet(cls.stylesheet(*paths)).rules
+
+    @classmethod
+    def clear(cls):
+        """Forgets everything that's been loaded"""
+        with cls.lock:
+            cls.entries.clear()
+            cls.combined.clear()
@@ -0,0 +1,176 @@
+"""This file provides a cache of lexed token streams"""
+
+from array import array
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+
+
+class TokenStream(object):
+    """
+    This class holds a lexer's tokens without copying their text: each
+    token is an index into a palette of token types and the offset it ends
+    at in the text the lexer saw. The few values that aren't slices of that
+    text, like ones a filter rewrote, are kept as they are
+
+    Usage:
+        stream = TokenStream.encode(text, lexer.get_tokens(blob))
+        formatter.format(stream.tokens(text), outfile)
+
+    A stream costs a few bytes per token on top of the text, where the
+    lexer's own (token type, value) tuples and strings run to several
+    times the text's size
+    """
+
+    __slots__ = ('types', 'codes', 'ends', 'values')
+
+    def __init__(self, types, codes, ends, values):
+        """
+        Parameters:
+        types: The distinct token types, in order of first use
+        codes: An array of indices into types, one per token
+        ends: An array of the offsets each token ends at
+        values: {token index: value} for values that aren't slices
+        """
+        self.types = types
+        self.codes = codes
+        self.ends = ends
+        self.values = values
+
+    @classmethod
+    def record(cls, text, tokens, finished):
+        """
+        Passes tokens through while packing them, so the formatter can
+        consume them as the lexer yields them. Nothing is recorded if tokens
+        stop early
+
+        Parameters:
+        text: The text the lexer saw, after its own preprocessing
+        tokens: An iterable of (token type, value)
+        finished: Called with the TokenStream once tokens run out
+        """
+        palette = dict()
+        types = []
+        codes = array('H')
+        ends = array('I' if len(text) < 2 ** 32 else 'L')
+        values = dict()
+        position = 0
+        for token_type, value in tokens:
+            code = palette.get(token_type)
+            if code is None:
+                code = palette[token_type] = len(types)
+                types.append(token_type)
+            if text.startswith(value, position):
+                position += len(value)
+            else:
+                values[len(codes)] = value
+            codes.append(code)
+            ends.append(position)
+            yield token_type, value
+        if len(types) <= 256:
+            codes = array('B', codes)
+        finished(cls(tuple(types), codes, ends, values))
+
+    @classmethod
+    def encode(cls, text, tokens):
+        """
+        Packs tokens lexed from text
+
+        Parameters:
+        text: The text the lexer saw, after its own preprocessing
+        tokens: An iterable of (token type, value)
+        """
+        streams = []
+        for _ in cls.record(text, tokens, streams.append):
+            pass
+        return streams[0]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def size(self):
+        """Approximates the stream's footprint in bytes"""
+        return (
+            self.codes.itemsize * len(self.codes)
+            + self.ends.itemsize * len(self.ends)
+            + sum(len(value) for value in self.values.values())
+        )
+
+    def tokens(self, text):
+        """
+        Yields (token type, value) like the lexer did
+
+        Parameters:
+        text: The same text the stream was encoded from
+        """
+        types = self.types
+        values = self.values
+        start = 0
+        for index, (code, end) in enumerate(zip(self.codes, self.ends)):
+            if index in values:
+                yield types[code], values[index]
+            else:
+                yield types[code], text[start:end]
+            start = end
+
+
+class TokenCache(object):
+    """
+    This class keeps recently lexed token streams in memory, so a blob
+    rendered again with different decoration options (linenos, title,
+    inline_css, the header) is only formatted
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024):
+        """
+        Parameters:
+        max_size: The most bytes of token streams to hold at once
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    @staticmethod
+    def key_for(lexer, text, git_blob_hash=None):
+        """
+        Identifies a lexer's run over text
+
+        Parameters:
+        lexer: The lexer instance; its class and options are keyed
+        text: The text passed to the lexer
+        git_blob_hash: The hash of text when it's a whole git blob; text is
+            hashed when this is None
+        """
+        if git_blob_hash is None:
+            git_blob_hash = sha1(
+                text.encode('utf-8', 'surrogatepass')
+            ).hexdigest()
+        lexer_class = type(lexer)
+        return (
+            git_blob_hash,
+            '%s.%s' % (lexer_class.__module__, lexer_class.__name__),
+            repr(sorted(lexer.options.items())),
+        )
+
+    def get(self, key):
+        """Returns the TokenStream stored under key, or None"""
+        with self.lock:
+            stream = self.entries.pop(key, None)
+            if stream is not None:
+                self.entries[key] = stream
+            return stream
+
+    def set(self, key, stream):
+        """Stores stream under key, evicting the least recently used"""
+        size = stream.size()
+        if size > self.max_size:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).size()
+            self.entries[key] = stream
+            self.size += size
+            while self.size > self.max_size:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size()
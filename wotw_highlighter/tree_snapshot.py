@@ -0,0 +1,276 @@
+"""This file provides a class to render every file of a git tree at once"""
+
+from io import open as io_open
+from json import dumps
+from os import makedirs
+from os.path import dirname, isdir, join, splitext
+
+from wotw_highlighter.__version__ import __version__
+from wotw_highlighter.block import Block, PreloadedBlock, render_loaded_group
+from wotw_highlighter.block_loader import BlockLoader
+from wotw_highlighter.block_observer import observed
+from wotw_highlighter.block_options import BlockOptions
+
+
+class TreeSnapshot(object):
+    """
+    This class renders every file under a git ref into a directory of HTML
+    fragments described by a manifest. The ref is resolved and the tree
+    listed once, every blob streams through one batch reader, and files
+    sharing an extension render together on a process pool so each worker
+    reuses its lexers and stylesheets
+
+    Usage:
+        snapshot = TreeSnapshot('v2.3.0', blob_working_directory='/repo')
+        manifest = snapshot.write('/srv/source/v2.3.0')
+    """
+
+    BINARY_SNIFF_LENGTH = 8000
+    CHUNK_BYTES = 256 * 1024
+    FRAGMENT_SUFFIX = '.html'
+    MANIFEST_NAME = 'manifest.json'
+    STYLESHEET_NAME = 'styles.css'
+
+    def __init__(self, git_ref_name, max_workers=None, executor=None, **kwargs):
+        """
+        Parameters:
+        git_ref_name: The ref, tag, or hash to render
+        max_workers: The size of the pool to create if executor is None
+        executor: An existing concurrent.futures executor to reuse
+        kwargs: Block options shared by every file, e.g. git_backend,
+            blob_working_directory, inline_css, or render_cache
+        """
+        for option in ('raw', 'blob', 'blob_path', 'outfile'):
+            if kwargs.get(option) is not None:
+                raise ValueError(
+                    '%s is chosen per file in a snapshot'
+                    % (
+                        option,
+                    )
+                )
+        self.git_ref_name = git_ref_name
+        self.max_workers = max_workers
+        self.executor = executor
+        self.options = BlockOptions(**kwargs).full_options()
+        self.options['git_ref_name'] = git_ref_name
+        if self.options['git_backend'] not in BlockLoader.GIT_BACKENDS:
+            raise ValueError(
+                "'%s' is not a git backend; use one of %s"
+                % (
+                    self.options['git_backend'],
+                    ', '.join(sorted(BlockLoader.GIT_BACKENDS)),
+                )
+            )
+
+    def git_repository(self):
+        """Returns the shared git backend for the snapshot's repository"""
+        return BlockLoader.GIT_BACKENDS[
+            self.options['git_backend']
+        ].for_repository(self.options['blob_working_directory'])
+
+    def list_files(self, repository):
+        """
+        Resolves the ref and lists its tree
+
+        Returns (ref hash, [(path, blob hash)], [skipped entries])
+        """
+        resolved = repository.ref_cache.object_info(
+            self.git_ref_name,
+            repository.object_info
+        )
+        entries = None if resolved is None else repository.list_tree(
+            resolved[0]
+        )
+        if entries is None:
+            raise ValueError(
+                "'%s' is not a valid git ref in %s"
+                % (
+                    self.git_ref_name,
+                    self.options['blob_working_directory'],
+                )
+            )
+        files = []
+        skipped = []
+        for mode, object_type, object_hash, path in entries:
+            if 'blob' != object_type:
+                skipped.append(self.skipped_entry(path, object_hash, 'submodule'))
+            elif '120000' == mode:
+                skipped.append(self.skipped_entry(path, object_hash, 'symlink'))
+            else:
+                files.append((path, object_hash))
+        return resolved[0], files, skipped
+
+    @staticmethod
+    def skipped_entry(path, git_blob_hash, reason):
+        """Describes a file the snapshot doesn't render"""
+        return {
+            'git_blob_hash': git_blob_hash,
+            'path': path,
+            'reason': reason,
+        }
+
+    def prepare(self, path, git_blob_hash, contents):
+        """
+        Builds the block for one file and checks the render cache
+
+        Returns the block, or the reason the file is skipped
+        """
+        if not contents:
+            return 'empty'
+        if b'\0' in contents[:self.BINARY_SNIFF_LENGTH]:
+            return 'binary'
+        options = dict(self.options)
+        options['blob'] = contents.decode(BlockLoader.BLOB_ENCODING, 'replace')
+        options['blob_path'] = path
+        options['git_blob_hash'] = git_blob_hash
+        block = PreloadedBlock.for_context(BlockOptions(**options).context)
+        block.compile()
+        return block
+
+    def fragment_name(self, path):
+        """Where path's fragment lives, relative to the output directory"""
+        return path + self.FRAGMENT_SUFFIX
+
+    def write_text(self, directory, name, text):
+        """Writes text to name under directory, creating parents as needed"""
+        path = join(directory, name)
+        parent = dirname(path)
+        if not isdir(parent):
+            makedirs(parent)
+        with io_open(path, 'w', encoding='utf-8') as output_file:
+            output_file.write(text)
+
+    def write(self, directory):
+        """
+        Renders every file into directory and writes the manifest
+
+        Returns the manifest: the ref and its hash, the shared stylesheet (if
+        styles aren't inlined), and the fragment written for each file or
+        the reason it was skipped, in tree order
+        """
+        with observed(self.options['observer'], 'snapshot') as details:
+            repository = self.git_repository()
+            git_ref_hash, files, skipped = self.list_files(repository)
+            written = self.render_files(repository, files, directory)
+            stylesheet = written.pop(None, None)
+            manifest = {
+                'files': [],
+                'git_ref_hash': git_ref_hash,
+                'git_ref_name': self.git_ref_name,
+                'skipped': skipped,
+                'stylesheet': None,
+                'version': __version__,
+            }
+            if stylesheet and not self.options['inline_css']:
+                self.write_text(directory, self.STYLESHEET_NAME, stylesheet)
+                manifest['stylesheet'] = self.STYLESHEET_NAME
+            for path, git_blob_hash in files:
+                entry = written[path]
+                if isinstance(entry, dict):
+                    manifest['files'].append(entry)
+                else:
+                    skipped.append(
+                        self.skipped_entry(path, git_blob_hash, entry)
+                    )
+            skipped.sort(key=lambda entry: entry['path'])
+            self.write_text(
+                directory,
+                self.MANIFEST_NAME,
+                u'%s\n' % (dumps(manifest, indent=2, sort_keys=True))
+            )
+            details['files'] = len(manifest['files'])
+        return manifest
+
+    def render_files(self, repository, files, directory):
+        """
+        Streams blobs into chunks and renders them as they fill, keeping a
+        bounded number in flight
+
+        Returns {path: manifest entry or skip reason}, with the first
+        stylesheet seen under None
+        """
+        written = dict()
+        by_extension = sorted(
+            files,
+            key=lambda item: (splitext(item[0])[1], item[0])
+        )
+        owned_executor = self.executor is None
+        executor = self.executor
+        if owned_executor:
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(self.max_workers)
+        in_flight = []
+        try:
+            chunk = []
+            chunk_bytes = 0
+            chunk_extension = None
+            blobs = repository.read_objects(
+                [git_blob_hash for _, git_blob_hash in by_extension]
+            )
+            for index, git_object in enumerate(blobs):
+                path, git_blob_hash = by_extension[index]
+                if git_object is None:
+                    written[path] = 'missing'
+                    continue
+                block = self.prepare(path, git_blob_hash, git_object[2])
+                if not isinstance(block, Block):
+                    written[path] = block
+                    continue
+                if block.cache_hit:
+                    self.record(directory, written, path, block)
+                    continue
+                extension = splitext(path)[1]
+                if chunk and (
+                        extension != chunk_extension
+                        or chunk_bytes >= self.CHUNK_BYTES
+                ):
+                    in_flight.append(self.submit(executor, chunk))
+                    self.drain(directory, written, in_flight, False)
+                    chunk, chunk_bytes = [], 0
+                chunk.append((path, block))
+                chunk_bytes += len(git_object[2])
+                chunk_extension = extension
+            if chunk:
+                in_flight.append(self.submit(executor, chunk))
+            self.drain(directory, written, in_flight, True)
+        finally:
+            if owned_executor:
+                executor.shutdown()
+        return written
+
+    @staticmethod
+    def submit(executor, chunk):
+        """Sends a chunk of prepared blocks to a worker"""
+        return chunk, executor.submit(
+            render_loaded_group,
+            [(path, block.worker_options()) for path, block in chunk]
+        )
+
+    def drain(self, directory, written, in_flight, finish):
+        """
+        Writes out finished chunks; waits for all of them if finish, or
+        until few enough are running otherwise
+        """
+        limit = 0 if finish else 2 * (self.max_workers or 8)
+        while in_flight and (len(in_flight) > limit or in_flight[0][1].done()):
+            chunk, future = in_flight.pop(0)
+            results = dict()
+            Block.collect_group(chunk, future, results)
+            for path, block in chunk:
+                if results[path].error is not None:
+                    written[path] = '%s' % (results[path].error)
+                else:
+                    self.record(directory, written, path, block)
+
+    def record(self, directory, written, path, block):
+        """Writes a rendered block's fragment and remembers its entry"""
+        if None not in written and block.highlighted_blob_styles:
+            written[None] = block.highlighted_blob_styles
+        fragment = self.fragment_name(path)
+        self.write_text(directory, fragment, block.highlighted_blob)
+        written[path] = {
+            'fragment': fragment,
+            'git_blob_hash': block.git_blob_hash,
+            'path': path,
+            'size': len(block.blob),
+        }